@@ -1,16 +1,20 @@
 import os
 import numpy as np
 from .dataprocessing import get_sample, get_permarray_FF, get_pot_data_FF
+from .quality import valid_sample_indices
 from tqdm import tqdm
 
 
-def init_train_data(l_path: str, h0: float = 1.0):
-    num_samples = len(os.listdir(l_path + "data/"))
+def init_train_data(l_path: str, h0: float = 1.0, qa: bool = False):
+    if qa:
+        indices = valid_sample_indices(l_path)
+    else:
+        indices = range(len(os.listdir(l_path + "data/")))
 
     perm_array = list()
     potentials = list()
 
-    for idx in tqdm(range(num_samples)):
+    for idx in tqdm(indices):
         perm_array.append(get_permarray_FF(l_path, idx, h0))
         potentials.append(get_pot_data_FF(l_path, idx))
 
@@ -0,0 +1,362 @@
+import os
+import time
+from datetime import datetime
+from typing import Tuple, Union
+
+import numpy as np
+from sciopy import (
+    SystemMessageCallback_usb_hs,
+    connect_COM_port,
+    connect_COM_port_usb_hs,
+    set_measurement_config_usb_hs,
+)
+from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup
+from tqdm import tqdm
+
+from .classes import (
+    BallAnomaly,
+    Ender5Stat,
+    MeasurementInformation,
+    TankProperties32x2,
+)
+from .ender5 import init_ender5, move_ender_to_coordinate, read_temperature
+from .journal import (
+    append_journal_entry,
+    get_coordinates_path,
+    get_resume_state,
+    init_journal,
+)
+from .online import OnlineReconstructor
+from .sciospec import SciospecSupervisor
+from .tracing import NullTracer, Tracer, get_trace_path
+from .voxel_util import read_json_file
+
+
+def save_sample(
+    f_path: str,
+    data: np.ndarray,
+    ball: BallAnomaly,
+    ssms: ScioSpecMeasurementSetup,
+    tank: TankProperties32x2,
+    documentation: MeasurementInformation,
+    sync: bool = True,
+) -> None:
+    """
+    Save a single sample as .npz file.
+    The file is written to a temporary file first and renamed afterwards, so an
+    interrupted measurement never leaves a truncated sample behind.
+
+    Parameters
+    ----------
+    f_path : str
+        file path of the sample
+    data : np.ndarray
+        single burst of SingleFrames
+    ball : BallAnomaly
+        anomaly property dataclass
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    tank : TankProperties32x2
+        tank properties dataclass
+    documentation : MeasurementInformation
+        documentation dataclass
+    sync : bool, optional
+        sync the file to the disk before the rename, by default True
+    """
+    tmp_path = f_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(
+            file,
+            data=data,
+            anomaly=ball,
+            config=ssms,
+            tank=tank,
+            documentation=documentation,
+        )
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(tmp_path, f_path)
+
+
+def adaptive_settle(
+    supervisor: SciospecSupervisor,
+    threshold: float = 1e-3,
+    max_time: float = 10.0,
+    tracer: Tracer = NullTracer(),
+) -> Tuple[float, float]:
+    """
+    Wait until the saline motion after a movement has settled.
+    Single burst probe measurements are taken until the relative change of the
+    absolute potentials of two successive probes is below the threshold. The
+    probes are retried and recovered by the supervisor, the burst count of the
+    measurement is restored afterwards, also if the probes fail.
+
+    Parameters
+    ----------
+    supervisor : SciospecSupervisor
+        watchdog of the sciospec connection
+    threshold : float, optional
+        relative change of successive probes, by default 1e-3
+    max_time : float, optional
+        maximum settle time [s], by default 10.0
+    tracer : Tracer, optional
+        records the timing of each probe, by default NullTracer()
+
+    Returns
+    -------
+    Tuple[float, float]
+        settle time [s], relative change of the last two probes
+    """
+    supervisor.set_burst_count(1)
+    try:
+        t_start = time.perf_counter()
+        previous = None
+        change = np.inf
+        while True:
+            with tracer.span("probe"):
+                potential = np.abs(supervisor.probe(tracer)[0]).flatten()
+            if previous is not None:
+                change = np.linalg.norm(potential - previous) / np.linalg.norm(previous)
+            settle_time = time.perf_counter() - t_start
+            if change < threshold or settle_time >= max_time:
+                break
+            previous = potential
+    finally:
+        supervisor.set_burst_count(supervisor.ssms.burst_count)
+    return settle_time, float(change)
+
+
+def measurement_loop(
+    COM_Ender,
+    enderstat: Ender5Stat,
+    COM_Sciospec,
+    ssms: ScioSpecMeasurementSetup,
+    s_path: str,
+    coordinates: np.ndarray,
+    ball: BallAnomaly,
+    tank: TankProperties32x2,
+    documentation: MeasurementInformation,
+    settle_time: float = 3.0,
+    trace: bool = True,
+    settle_threshold: Union[None, float] = None,
+    online: Union[None, OnlineReconstructor] = None,
+    supervisor: Union[None, SciospecSupervisor] = None,
+):
+    """
+    Measure all coordinates and save every burst as a single sample.
+    Each finished coordinate is recorded in the progress journal. Coordinates that
+    are already recorded in the journal are skipped and the sample numbering is
+    continued, so calling this function again resumes an interrupted measurement.
+    The duration of every stage is recorded in the 'trace.jsonl', use
+    `summarize_trace` for a breakdown per stage and per coordinate.
+    With a `settle_threshold` the fixed settle time is replaced by
+    `adaptive_settle`, the chosen settle time is recorded in the journal.
+    With an `online` reconstructor the bursts of each coordinate are reconstructed
+    in the background, the loop stops early if the reconstructor requests an abort.
+    Failed Sciospec measurements are retried by the `SciospecSupervisor`, its
+    failure and downtime counters are written into the 'info.json'.
+
+    Parameters
+    ----------
+    COM_Ender : _type_
+        serial connection to 3d printer
+    enderstat : Ender5Stat
+        ender 5 dataclass
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    s_path : str
+        save path
+    coordinates : np.ndarray
+        computed absolute measurement coordinates [mm]
+    ball : BallAnomaly
+        anomaly property dataclass
+    tank : TankProperties32x2
+        tank properties dataclass
+    documentation : MeasurementInformation
+        documentation dataclass
+    settle_time : float, optional
+        waiting time after each movement [s], maximum waiting time if
+        `settle_threshold` is set, by default 3.0
+    trace : bool, optional
+        write the timing trace, by default True
+    settle_threshold : Union[None, float], optional
+        relative potential change for the adaptive settle time, by default None
+    online : Union[None, OnlineReconstructor], optional
+        started online reconstructor, by default None
+    supervisor : Union[None, SciospecSupervisor], optional
+        watchdog of the sciospec connection, by default a SciospecSupervisor
+        of `COM_Sciospec`
+
+    Returns
+    -------
+    _type_
+        serial connection to sciospec eit device, may be renewed during the loop
+    """
+    init_journal(s_path, coordinates)
+    finished, samples_counter = get_resume_state(s_path)
+    # remove leftovers of an interrupted sample write
+    for f_name in os.listdir(s_path):
+        if f_name.endswith(".tmp"):
+            os.remove(s_path + f_name)
+    tracer = Tracer(get_trace_path(s_path) if trace else None)
+    if supervisor is None:
+        supervisor = SciospecSupervisor(COM_Sciospec, ssms)
+    if supervisor.info_path is None:
+        supervisor.info_path = s_path[:-5] + "info.json"
+
+    try:
+        for coordinate_idx, XYZ in enumerate(tqdm(coordinates)):
+            if coordinate_idx in finished:
+                continue
+            tracer.tags["coordinate_idx"] = coordinate_idx
+            # update ball position
+            ball.x, ball.y, ball.z = XYZ
+            # move to position
+            with tracer.span("move"):
+                move_ender_to_coordinate(COM_Ender, XYZ, enderstat, print_msg=False)
+            with tracer.span("settle"):
+                if settle_threshold is None:
+                    time.sleep(settle_time)
+                    settled, change = settle_time, None
+                else:
+                    settled, change = adaptive_settle(
+                        supervisor, settle_threshold, settle_time, tracer
+                    )
+            # update documentation
+            with tracer.span("temperature"):
+                documentation.temperature = read_temperature(COM_Ender)
+            current_time = datetime.now()
+            documentation.timestamp = current_time.strftime("%d_%m_%Y_%Hh_%Mm")
+            # measurement
+            sciospec_data = supervisor.measure(tracer)
+
+            files = list()
+            with tracer.span("serialization"):
+                for data in sciospec_data:
+                    # update documentation timestamp
+                    current_time = datetime.now()
+                    documentation.timestamp = current_time.strftime("%d_%m_%Y_%Hh_%Mm")
+                    f_name = "sample_{0:06d}.npz".format(samples_counter)
+                    save_sample(s_path + f_name, data, ball, ssms, tank, documentation)
+                    files.append(f_name)
+                    samples_counter += 1
+            with tracer.span("system_message"):
+                SystemMessageCallback_usb_hs(supervisor.COM_Sciospec, prnt_msg=False)
+
+            append_journal_entry(
+                s_path,
+                {
+                    "coordinate_idx": coordinate_idx,
+                    "coordinate": np.asarray(XYZ).tolist(),
+                    "files": files,
+                    "samples_counter": samples_counter,
+                    "settle_time": settled,
+                    "settle_change": change,
+                    "motion_speed": enderstat.motion_speed,
+                    "timestamp": datetime.now().strftime("%d_%m_%Y_%Hh_%Mm_%Ss"),
+                },
+            )
+            if online is not None:
+                online.submit(coordinate_idx, XYZ, sciospec_data)
+                if online.abort_requested:
+                    print(
+                        f"Abort after coordinate {coordinate_idx}, rolling "
+                        f"reconstruction error {online.rolling_error:.1f} mm."
+                    )
+                    break
+    finally:
+        tracer.close()
+        supervisor.save_stats()
+    return supervisor.COM_Sciospec
+
+
+def resume_measurement(
+    s_path: str,
+    port: str = "COM4",
+    baudrate: int = 115200,
+    motion_speed: int = 1500,
+    documentation: MeasurementInformation = None,
+    settle_time: float = 3.0,
+    settle_threshold: Union[None, float] = None,
+):
+    """
+    Resume an interrupted measurement from its progress journal.
+    Both devices are reconnected, the Ender 5 is re-homed and the measurement
+    continues at the first unfinished coordinate.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the interrupted measurement (".../data/")
+    port : str, optional
+        com port of the Ender 5, by default "COM4"
+    baudrate : int, optional
+        baud rate of the Ender 5, by default 115200
+    motion_speed : int, optional
+        motion speed after homing, by default 1500
+    documentation : MeasurementInformation, optional
+        documentation dataclass, by default the one of the last saved sample
+    settle_time : float, optional
+        waiting time after each movement [s], by default 3.0
+    settle_threshold : Union[None, float], optional
+        relative potential change for the adaptive settle time, by default None
+
+    Returns
+    -------
+    tuple
+        serial connection to 3d printer, serial connection to sciospec eit device,
+        ender 5 dataclass
+    """
+    info = read_json_file(s_path[:-5] + "info.json")
+    ssms = ScioSpecMeasurementSetup(**info["ScioSpecMeasurementSetup"])
+    tank = TankProperties32x2(**info["TankProperties32x2"])
+    ball = BallAnomaly(**info["BallAnomaly"])
+    coordinates = np.load(get_coordinates_path(s_path))
+    finished, samples_counter = get_resume_state(s_path)
+
+    if documentation is None:
+        if samples_counter == 0:
+            raise ValueError("No saved sample found, please pass the documentation.")
+        last = np.load(
+            s_path + "sample_{0:06d}.npz".format(samples_counter - 1),
+            allow_pickle=True,
+        )
+        documentation = last["documentation"].tolist()
+
+    print(
+        f"Resume measurement: {len(finished)}/{coordinates.shape[0]} coordinates "
+        f"finished, continue with sample {samples_counter}."
+    )
+    COM_Ender = connect_COM_port(port=port, baudrate=baudrate)
+    COM_Sciospec = connect_COM_port_usb_hs()
+
+    enderstat = Ender5Stat(
+        abs_x_pos=None,
+        abs_y_pos=None,
+        abs_z_pos=None,
+        tank_architecture=TankProperties32x2(),
+        motion_speed=180,
+    )
+    init_ender5(COM_Ender, enderstat)
+    enderstat.motion_speed = motion_speed
+
+    set_measurement_config_usb_hs(COM_Sciospec, ssms)
+    SystemMessageCallback_usb_hs(COM_Sciospec, prnt_msg=False)
+
+    COM_Sciospec = measurement_loop(
+        COM_Ender,
+        enderstat,
+        COM_Sciospec,
+        ssms,
+        s_path,
+        coordinates,
+        ball,
+        tank,
+        documentation,
+        settle_time=settle_time,
+        settle_threshold=settle_threshold,
+    )
+    return COM_Ender, COM_Sciospec, enderstat
@@ -0,0 +1,200 @@
+import glob
+import os
+from typing import Union
+
+import numpy as np
+
+from .dataprocessing import load_run, load_samples
+from .quality import valid_sample_indices
+
+
+def get_aggregation_path(l_path: str) -> str:
+    """
+    Path of the burst aggregated data, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        aggregation path
+    """
+    return l_path + "aggregated.npz"
+
+
+def _aggregation_files(l_path: str, indices: np.ndarray) -> tuple:
+    files = np.array(["sample_{0:06d}.npz".format(idx) for idx in indices])
+    mtimes = np.array([os.path.getmtime(l_path + "data/" + file) for file in files])
+    return files, mtimes
+
+
+def aggregate_bursts(
+    l_path: str,
+    median: bool = True,
+    qa: bool = False,
+    run: Union[None, dict] = None,
+    save: bool = True,
+) -> dict:
+    """
+    Collapse the bursts of every coordinate into a single sample.
+    The bursts are grouped by the ball position, the mean and the standard
+    deviation of the complex potentials (and optionally the median of the real and
+    imaginary part) are stored per coordinate. The sample indices of the bursts
+    are kept, so the single bursts stay available. The sample file names,
+    modification times and the `qa` flag are saved with the result, see
+    `AggregatedRun`.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    median : bool, optional
+        compute the robust median, by default True
+    qa : bool, optional
+        only aggregate samples that passed `quality_check`, by default False
+    run : Union[None, dict], optional
+        already loaded run, see `load_run`, by default None
+    save : bool, optional
+        save the result as 'aggregated.npz', by default True
+
+    Returns
+    -------
+    dict
+        "coordinates" (n_coord, 3), "mean" complex (n_coord, n_potentials), "std"
+        (n_coord, n_potentials), "median" complex (n_coord, n_potentials),
+        "n_bursts", mean "temperatures" and "times", "sample_indices"
+        (n_coord, max_bursts) padded with -1
+    """
+    if run is None:
+        run = load_run(l_path, valid_sample_indices(l_path) if qa else None)
+    coordinates, first, inverse = np.unique(
+        run["coordinates"], axis=0, return_index=True, return_inverse=True
+    )
+    inverse = inverse.ravel()
+    # keep the measurement order of the coordinates
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.shape[0])
+    coordinates, inverse = coordinates[order], rank[inverse]
+
+    n_coord = coordinates.shape[0]
+    n_bursts = np.bincount(inverse, minlength=n_coord)
+    potentials = run["potentials"]
+    mean = np.zeros((n_coord, potentials.shape[1]), dtype=complex)
+    np.add.at(mean, inverse, potentials)
+    mean /= n_bursts[:, None]
+    var = np.zeros((n_coord, potentials.shape[1]))
+    np.add.at(var, inverse, np.abs(potentials - mean[inverse]) ** 2)
+    aggregated = {
+        "coordinates": coordinates,
+        "mean": mean,
+        "std": np.sqrt(var / n_bursts[:, None]),
+        "n_bursts": n_bursts,
+        "temperatures": np.bincount(inverse, run["temperatures"], n_coord) / n_bursts,
+        "times": np.bincount(inverse, run["times"], n_coord) / n_bursts,
+    }
+
+    sample_indices = np.full((n_coord, np.max(n_bursts)), -1)
+    burst_rank = np.zeros(inverse.shape[0], dtype=int)
+    counter = np.zeros(n_coord, dtype=int)
+    for idx, group in enumerate(inverse):
+        burst_rank[idx] = counter[group]
+        counter[group] += 1
+    sample_indices[inverse, burst_rank] = run["indices"]
+    aggregated["sample_indices"] = sample_indices
+
+    if median:
+        aggregated["median"] = np.zeros_like(mean)
+        for group in range(n_coord):
+            members = potentials[inverse == group]
+            aggregated["median"][group] = np.median(
+                members.real, axis=0
+            ) + 1j * np.median(members.imag, axis=0)
+
+    if save:
+        files, mtimes = _aggregation_files(l_path, run["indices"])
+        path = get_aggregation_path(l_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, files=files, mtimes=mtimes, qa=qa, **aggregated)
+        os.replace(tmp_path, path)
+    return aggregated
+
+
+class AggregatedRun:
+    """
+    Burst aggregated measurement with lazy access to the single bursts.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    aggregate : bool, optional
+        run `aggregate_bursts` if no aggregated data exists, if sample files were
+        added, removed or modified since, or if `qa` differs, by default True
+    qa : bool, optional
+        only aggregate samples that passed `quality_check`, by default False
+    """
+
+    def __init__(self, l_path: str, aggregate: bool = True, qa: bool = False):
+        self.l_path = l_path
+        path = get_aggregation_path(l_path)
+        if aggregate and not self._is_current(path, qa):
+            aggregate_bursts(l_path, qa=qa)
+        self.data = np.load(path)
+
+    def _is_current(self, path: str, qa: bool) -> bool:
+        if not os.path.isfile(path):
+            return False
+        data = np.load(path)
+        if "files" not in data or bool(data["qa"]) != qa:
+            return False
+        if qa:
+            indices = valid_sample_indices(self.l_path)
+        else:
+            indices = np.arange(len(glob.glob(self.l_path + "data/sample_*.npz")))
+        try:
+            files, mtimes = _aggregation_files(self.l_path, indices)
+        except OSError:
+            return False
+        return np.array_equal(data["files"], files) and np.array_equal(
+            data["mtimes"], mtimes
+        )
+
+    def __len__(self) -> int:
+        return self.data["coordinates"].shape[0]
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.data[key]
+
+    @property
+    def noise(self) -> np.ndarray:
+        """Burst to burst standard deviation of every coordinate and channel."""
+        return self.data["std"]
+
+    def burst_indices(self, coordinate_idx: int) -> np.ndarray:
+        indices = self.data["sample_indices"][coordinate_idx]
+        return indices[indices >= 0]
+
+    def bursts(self, coordinate_idx: int) -> np.ndarray:
+        """
+        Load the single bursts of a coordinate.
+
+        Parameters
+        ----------
+        coordinate_idx : int
+            index of the aggregated coordinate
+
+        Returns
+        -------
+        np.ndarray
+            complex potentials (n_bursts, n_potentials)
+        """
+        paths = [
+            self.l_path + "data/sample_{0:06d}.npz".format(idx)
+            for idx in self.burst_indices(coordinate_idx)
+        ]
+        return load_samples(paths)["potentials"]
@@ -0,0 +1,235 @@
+import glob
+import os
+from typing import Tuple, Union
+
+import numpy as np
+
+from .dataprocessing import load_samples
+
+
+def get_baseline_path(l_path: str) -> str:
+    """
+    Path of the cached empty tank baseline, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        baseline path
+    """
+    return l_path + "baseline.npz"
+
+
+def _read_potentials(paths: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    samples = load_samples(paths)
+    return np.abs(samples["potentials"]), samples["times"], samples["temperatures"]
+
+
+def _empty_tank_paths(l_path: str, skip_before: int) -> Tuple[np.ndarray, np.ndarray]:
+    before = np.sort(glob.glob(l_path + "empty_tank/before_*.npz"))
+    after = np.sort(glob.glob(l_path + "empty_tank/after_*.npz"))
+    if before.shape[0] > skip_before:
+        before = before[skip_before:]
+    return before, after
+
+
+def compute_baseline(l_path: str, skip_before: int = 1) -> dict:
+    """
+    Compute the before and after empty tank baselines and store them in the
+    'baseline.npz' of the measurement.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    skip_before : int, optional
+        number of discarded first before bursts, by default 1
+
+    Returns
+    -------
+    dict
+        mean absolute potential, unix time and temperature of the before and after
+        measurement, their mean and the used file names and modification times
+    """
+    before, after = _empty_tank_paths(l_path, skip_before)
+    if before.shape[0] == 0 and after.shape[0] == 0:
+        raise FileNotFoundError(f"No empty tank measurement found at: {l_path}")
+
+    baseline = dict()
+    for name, paths in (("before", before), ("after", after)):
+        if paths.shape[0] == 0:
+            continue
+        potentials, times, temperatures = _read_potentials(paths)
+        baseline[name] = np.mean(potentials, axis=0)
+        baseline[f"{name}_time"] = np.mean(times)
+        baseline[f"{name}_temperature"] = np.mean(temperatures)
+    # a single measurement is used as constant baseline
+    for name, other in (("before", "after"), ("after", "before")):
+        if name not in baseline:
+            for key in ("", "_time", "_temperature"):
+                baseline[name + key] = baseline[other + key]
+    baseline["mean"] = np.mean([baseline["before"], baseline["after"]], axis=0)
+    paths = np.concatenate([before, after])
+    baseline["files"] = np.array([os.path.basename(path) for path in paths])
+    baseline["mtimes"] = np.array([os.path.getmtime(path) for path in paths])
+
+    b_path = get_baseline_path(l_path)
+    tmp_path = b_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(file, **baseline)
+    os.replace(tmp_path, b_path)
+    return baseline
+
+
+def load_baseline(l_path: str, skip_before: int = 1) -> dict:
+    """
+    Load the cached baseline of a measurement. It is (re)computed if it does not
+    exist or if empty tank files were added, removed or modified since.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    skip_before : int, optional
+        number of discarded first before bursts, by default 1
+
+    Returns
+    -------
+    dict
+        baseline, see `compute_baseline`
+    """
+    b_path = get_baseline_path(l_path)
+    if os.path.isfile(b_path):
+        baseline = dict(np.load(b_path))
+        paths = np.concatenate(_empty_tank_paths(l_path, skip_before))
+        files = np.array([os.path.basename(path) for path in paths])
+        mtimes = np.array([os.path.getmtime(path) for path in paths])
+        if (
+            "mtimes" in baseline
+            and np.array_equal(baseline["files"], files)
+            and np.array_equal(baseline["mtimes"], mtimes)
+        ):
+            return baseline
+    return compute_baseline(l_path, skip_before)
+
+
+def interpolate_baseline(
+    baseline: dict,
+    times: Union[None, np.ndarray] = None,
+    temperatures: Union[None, np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Interpolate the baseline of each sample between the before and the after
+    measurement, either by the measurement time or by the temperature. Values
+    outside the range are clipped to the before or after baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        baseline, see `compute_baseline`
+    times : Union[None, np.ndarray], optional
+        unix times of the samples [s], by default None
+    temperatures : Union[None, np.ndarray], optional
+        temperatures of the samples [°C], by default None
+
+    Returns
+    -------
+    np.ndarray
+        baseline of each sample with shape (n_samples, n_potentials)
+    """
+    if times is not None:
+        x, x_0, x_1 = np.asarray(times), baseline["before_time"], baseline["after_time"]
+    elif temperatures is not None:
+        x = np.asarray(temperatures)
+        x_0, x_1 = baseline["before_temperature"], baseline["after_temperature"]
+    else:
+        raise ValueError("Pass the times or the temperatures of the samples.")
+    if x_1 == x_0:
+        weight = np.zeros(x.shape[0])
+    else:
+        weight = np.clip((x - x_0) / (x_1 - x_0), 0, 1)
+    weight = weight[:, None]
+    return (1 - weight) * baseline["before"] + weight * baseline["after"]
+
+
+def subtract_baseline(
+    potentials: np.ndarray,
+    baseline: dict,
+    times: Union[None, np.ndarray] = None,
+    temperatures: Union[None, np.ndarray] = None,
+    mode: str = "time",
+) -> np.ndarray:
+    """
+    Subtract the empty tank baseline from a batch of potential vectors.
+
+    Parameters
+    ----------
+    potentials : np.ndarray
+        potential vectors with shape (n_samples, n_potentials), complex or absolute
+    baseline : dict
+        baseline, see `compute_baseline`
+    times : Union[None, np.ndarray], optional
+        unix times of the samples [s], required for mode "time", by default None
+    temperatures : Union[None, np.ndarray], optional
+        temperatures of the samples [°C], required for mode "temperature",
+        by default None
+    mode : str, optional {'mean', 'time', 'temperature'}
+        constant mean baseline or interpolation, by default "time"
+
+    Returns
+    -------
+    np.ndarray
+        absolute potentials minus the baseline
+    """
+    potentials = np.abs(potentials)
+    if mode == "mean":
+        return potentials - baseline["mean"]
+    if mode == "time":
+        return potentials - interpolate_baseline(baseline, times=times)
+    if mode == "temperature":
+        return potentials - interpolate_baseline(baseline, temperatures=temperatures)
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+def load_baselined_potentials(
+    l_path: str,
+    indices: Union[None, np.ndarray] = None,
+    mode: str = "time",
+    skip_before: int = 1,
+) -> np.ndarray:
+    """
+    Load the potential vectors of the samples of a measurement and subtract the
+    cached empty tank baseline.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    indices : Union[None, np.ndarray], optional
+        sample indices, by default all samples
+    mode : str, optional {'mean', 'time', 'temperature'}
+        constant mean baseline or interpolation, by default "time"
+    skip_before : int, optional
+        number of discarded first before bursts, by default 1
+
+    Returns
+    -------
+    np.ndarray
+        absolute potentials minus the baseline with shape (n_samples, n_potentials)
+    """
+    if indices is None:
+        indices = np.arange(len(glob.glob(l_path + "data/sample_*.npz")))
+    potentials, times, temperatures = _read_potentials(
+        [l_path + "data/sample_{0:06d}.npz".format(idx) for idx in indices]
+    )
+    return subtract_baseline(
+        potentials,
+        load_baseline(l_path, skip_before),
+        times=times,
+        temperatures=temperatures,
+        mode=mode,
+    )
@@ -0,0 +1,506 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Tuple, Union
+
+import numpy as np
+
+from .classes import BallAnomaly, TankProperties32x2
+from .dataprocessing import (
+    get_excitation_stages,
+    get_measured_potential,
+    get_sample,
+    parse_npzdata_in_csv,
+    prepare_csv_conv,
+    write_top_csv_row,
+)
+from .functions import compute_hitbox, create_meas_coordinates, create_mesh, set_perm
+from .synthetic import generate_measurement_directory
+from .voxel_util import gen_voxel_ball_data, scale_realworld_to_intdomain
+
+BENCHMARKS = dict()
+
+
+class SkipBenchmark(Exception):
+    """A benchmark can not run in this environment, e.g. a missing dependency."""
+
+
+def benchmark(name: str) -> Callable:
+    """
+    Register a benchmark. The decorated setup function gets the fixture dict and
+    returns the timed callable and the number of items it processes per call.
+
+    Parameters
+    ----------
+    name : str
+        unique benchmark name
+
+    Returns
+    -------
+    Callable
+        decorator
+    """
+
+    def register(setup: Callable) -> Callable:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def write_fixture_run(
+    l_path: str,
+    n_coordinates: int = 16,
+    burst_count: int = 2,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Write a small synthetic measurement directory, shaped like a real run
+    (64 electrodes, four channel groups), see `generate_measurement_directory`.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory, created if it does not exist
+    n_coordinates : int, optional
+        number of ball positions, by default 16
+    burst_count : int, optional
+        samples per position, by default 2
+    seed : int, optional
+        random seed of the noise, by default 0
+
+    Returns
+    -------
+    np.ndarray
+        ball positions (n_coordinates, 3) [mm]
+    """
+    tank = TankProperties32x2()
+    ball = BallAnomaly(x=0, y=0, z=50, d=40, perm=1, material="acryl-glass")
+    with contextlib.redirect_stdout(io.StringIO()):
+        coordinates = create_meas_coordinates(
+            compute_hitbox(tank, ball, safety_tolerance=0), 6, 6, 4
+        )[:n_coordinates]
+        return generate_measurement_directory(
+            l_path,
+            burst_count=burst_count,
+            ball=ball,
+            tank=tank,
+            coordinates=coordinates,
+            seed=seed,
+            n_workers=1,
+        )
+
+
+@benchmark("get_sample")
+def _bench_get_sample(fixture: dict) -> tuple:
+    def load():
+        for idx in range(fixture["n_samples"]):
+            get_sample(fixture["l_path"], idx)
+
+    return load, fixture["n_samples"]
+
+
+@benchmark("get_measured_potential")
+def _bench_get_measured_potential(fixture: dict) -> tuple:
+    return lambda: get_measured_potential(fixture["tmp"]), 1
+
+
+@benchmark("get_excitation_stages")
+def _bench_get_excitation_stages(fixture: dict) -> tuple:
+    return lambda: get_excitation_stages(fixture["tmp"]), 1
+
+
+@benchmark("parse_npzdata_in_csv")
+def _bench_parse_npzdata_in_csv(fixture: dict) -> tuple:
+    def parse():
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            conv_info = prepare_csv_conv(fixture["l_path"])
+            write_top_csv_row(
+                conv_info,
+                fixture["tmp"]["config"].tolist(),
+                fixture["tmp"]["anomaly"].tolist(),
+            )
+            parse_npzdata_in_csv(conv_info)
+        shutil.rmtree(conv_info.s_path)
+
+    return parse, fixture["n_samples"]
+
+
+def _register_mesh_benchmarks(h0: float) -> None:
+    @benchmark(f"create_mesh[h0={h0}]")
+    def _bench_create_mesh(fixture: dict) -> tuple:
+        return lambda: create_mesh(TankProperties32x2(), h0), 1
+
+    @benchmark(f"set_perm[h0={h0}]")
+    def _bench_set_perm(fixture: dict) -> tuple:
+        mesh = create_mesh(TankProperties32x2(), h0)
+        ball = BallAnomaly(x=10, y=-20, z=60, d=40, perm=10, material="acryl-glass")
+        return lambda: set_perm(mesh, ball), 1
+
+
+for _h0 in (0.1, 0.25, 0.5):
+    _register_mesh_benchmarks(_h0)
+
+
+@benchmark("gen_voxel_ball_data")
+def _bench_gen_voxel_ball_data(fixture: dict) -> tuple:
+    return lambda: gen_voxel_ball_data(64), 64
+
+
+@benchmark("scale_realworld_to_intdomain")
+def _bench_scale_realworld_to_intdomain(fixture: dict) -> tuple:
+    coordinates = fixture["coordinates"]
+    hitbox = fixture["hitbox"]
+
+    def scale():
+        for x, y, z in coordinates:
+            scale_realworld_to_intdomain([y, x, z], hitbox)
+
+    return scale, coordinates.shape[0]
+
+
+def _vae(fixture: dict):
+    try:
+        import tensorflow as tf
+    except ImportError:
+        raise SkipBenchmark("tensorflow is not installed")
+    from .vae_model import vae_model
+
+    if "vae" not in fixture:
+        tf.random.set_seed(0)
+        fixture["vae"] = vae_model()
+        fixture["vae"].compile(optimizer=tf.keras.optimizers.Adam())
+    return fixture["vae"]
+
+
+@benchmark("vae_train_step")
+def _bench_vae_train_step(fixture: dict) -> tuple:
+    vae = _vae(fixture)
+    batch = gen_voxel_ball_data(32).astype(np.float32)
+    return lambda: vae.train_on_batch(batch), batch.shape[0]
+
+
+@benchmark("vae_decoder_inference")
+def _bench_vae_decoder_inference(fixture: dict) -> tuple:
+    vae = _vae(fixture)
+    latent = np.random.default_rng(0).normal(size=(256, vae.decoder.input_shape[1]))
+    latent = latent.astype(np.float32)
+    return lambda: vae.decoder(latent, training=False), latent.shape[0]
+
+
+# heavy dependencies and the modules that must not import them at load time
+HEAVY_MODULES = (
+    "matplotlib",
+    "PIL",
+    "pandas",
+    "pyeit",
+    "sciopy",
+    "skimage",
+    "sklearn",
+    "tensorflow",
+)
+LAZY_IMPORTS = {
+    "aggregation": HEAVY_MODULES,
+    "baseline": HEAVY_MODULES,
+    "dataprocessing": HEAVY_MODULES,
+    "features": HEAVY_MODULES,
+    "functions": HEAVY_MODULES,
+    "journal": HEAVY_MODULES,
+    "knn_index": HEAVY_MODULES,
+    "linear_model": HEAVY_MODULES,
+    "ML_example": HEAVY_MODULES,
+    "online": HEAVY_MODULES,
+    "potential_stats": HEAVY_MODULES,
+    "quality": HEAVY_MODULES,
+    "retrain": HEAVY_MODULES,
+    "tracing": HEAVY_MODULES,
+    "visualization": ("skimage", "sklearn", "tensorflow"),
+}
+
+
+def import_module_fresh(module: str) -> Tuple[float, list]:
+    """
+    Import a module of this package in a new interpreter.
+
+    Parameters
+    ----------
+    module : str
+        module name without the package, e.g. "dataprocessing"
+
+    Returns
+    -------
+    Tuple[float, list]
+        import time [s], imported top level packages out of `HEAVY_MODULES`
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    code = (
+        "import json, sys, time\n"
+        "t_start = time.perf_counter()\n"
+        f"import {__package__}.{module}\n"
+        "duration = time.perf_counter() - t_start\n"
+        f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "print(json.dumps([duration, heavy]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(package_dir),
+        check=True,
+    )
+    duration, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return duration, heavy
+
+
+def check_lazy_imports(
+    modules: Union[None, list] = None, repeat: int = 3, print_report: bool = True
+) -> dict:
+    """
+    Import time of the modules and the heavy dependencies they load, each in a new
+    interpreter. A module fails if it imports a package of `LAZY_IMPORTS` at load
+    time instead of inside the function that needs it.
+
+    Parameters
+    ----------
+    modules : Union[None, list], optional
+        module names, by default all of `LAZY_IMPORTS`
+    repeat : int, optional
+        imports per module, by default 3
+    print_report : bool, optional
+        print the results, by default True
+
+    Returns
+    -------
+    dict
+        per module the median import time "seconds", the "heavy" imported
+        packages and whether it "passed"
+    """
+    results = dict()
+    for module in LAZY_IMPORTS if modules is None else modules:
+        durations = list()
+        for _ in range(repeat):
+            duration, heavy = import_module_fresh(module)
+            durations.append(duration)
+        forbidden = [name for name in heavy if name in LAZY_IMPORTS.get(module, ())]
+        results[module] = {
+            "seconds": float(np.median(durations)),
+            "heavy": heavy,
+            "passed": not forbidden,
+        }
+    if print_report:
+        for module, result in results.items():
+            status = (
+                "ok" if result["passed"] else "imports " + ", ".join(result["heavy"])
+            )
+            print(f"{module:<36} {result['seconds'] * 1e3:10.1f} ms  {status}")
+    return results
+
+
+def _register_import_benchmark(module: str) -> None:
+    @benchmark(f"import[{module}]")
+    def _bench_import(fixture: dict) -> tuple:
+        return lambda: import_module_fresh(module), 1
+
+
+for _module in LAZY_IMPORTS:
+    _register_import_benchmark(_module)
+
+
+def time_function(function: Callable, repeat: int = 5, warmup: int = 1) -> dict:
+    """
+    Time a callable.
+
+    Parameters
+    ----------
+    function : Callable
+        timed callable without arguments
+    repeat : int, optional
+        number of timed calls, by default 5
+    warmup : int, optional
+        untimed calls before, by default 1
+
+    Returns
+    -------
+    dict
+        "median", "min", "mean" and "std" of the call durations [s]
+    """
+    for _ in range(warmup):
+        function()
+    durations = list()
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - t_start)
+    return {
+        "median": float(np.median(durations)),
+        "min": float(np.min(durations)),
+        "mean": float(np.mean(durations)),
+        "std": float(np.std(durations)),
+        "repeat": repeat,
+    }
+
+
+def environment_info() -> dict:
+    """
+    Commit and environment of a benchmark run.
+
+    Returns
+    -------
+    dict
+        git commit, python, numpy, platform and the cpu count
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().strftime("%d_%m_%Y_%Hh_%Mm_%Ss"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(
+    s_path: Union[None, str] = "benchmarks/",
+    select: Union[None, list] = None,
+    repeat: int = 5,
+    n_coordinates: int = 16,
+    burst_count: int = 2,
+    print_report: bool = True,
+) -> dict:
+    """
+    Run the registered benchmarks on a simulated fixture run and save the results
+    as 'benchmark_<commit>_<timestamp>.json'.
+
+    Parameters
+    ----------
+    s_path : Union[None, str], optional
+        result directory, None to not save, by default "benchmarks/"
+    select : Union[None, list], optional
+        names of the benchmarks to run, a name matches all parametrizations
+        (e.g. "create_mesh"), by default all
+    repeat : int, optional
+        timed calls per benchmark, by default 5
+    n_coordinates : int, optional
+        ball positions of the fixture run, by default 16
+    burst_count : int, optional
+        samples per position of the fixture run, by default 2
+    print_report : bool, optional
+        print the results, by default True
+
+    Returns
+    -------
+    dict
+        "environment" and per benchmark the timing, the number of items and the
+        items per second, or the reason it was skipped
+    """
+    names = [
+        name
+        for name in BENCHMARKS
+        if select is None or name in select or name.split("[")[0] in select
+    ]
+    tmp_dir = tempfile.mkdtemp(prefix="eit_benchmark_")
+    try:
+        l_path = tmp_dir + "/"
+        coordinates = write_fixture_run(l_path, n_coordinates, burst_count)
+        tmp, _ = get_sample(l_path, 0)
+        fixture = {
+            "l_path": l_path,
+            "n_samples": n_coordinates * burst_count,
+            "tmp": tmp,
+            "coordinates": coordinates,
+            "hitbox": compute_hitbox(
+                TankProperties32x2(), tmp["anomaly"].tolist(), safety_tolerance=0
+            ),
+        }
+        results = {"environment": environment_info(), "benchmarks": dict()}
+        for name in names:
+            try:
+                function, n_items = BENCHMARKS[name](fixture)
+                result = time_function(function, repeat)
+            except SkipBenchmark as skip:
+                results["benchmarks"][name] = {"skipped": str(skip)}
+                continue
+            result["items"] = n_items
+            result["items_per_second"] = n_items / result["median"]
+            results["benchmarks"][name] = result
+        # the VAE benchmarks depend on the tensorflow version, it is only known
+        # once they have imported it
+        tf = sys.modules.get("tensorflow")
+        results["environment"]["tensorflow"] = getattr(tf, "__version__", None)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if s_path is not None:
+        os.makedirs(s_path, exist_ok=True)
+        env = results["environment"]
+        commit = (env["commit"] or "nocommit")[:8]
+        with open(f"{s_path}benchmark_{commit}_{env['timestamp']}.json", "w") as file:
+            json.dump(results, file, indent=4)
+    if print_report:
+        for name, result in results["benchmarks"].items():
+            if "skipped" in result:
+                print(f"{name:<36} skipped: {result['skipped']}")
+            else:
+                print(
+                    f"{name:<36} {result['median'] * 1e3:10.2f} ms "
+                    f"{result['items_per_second']:12.1f} items/s"
+                )
+    return results
+
+
+def compare_benchmarks(
+    baseline: Union[str, dict], current: Union[str, dict], print_report: bool = True
+) -> dict:
+    """
+    Compare two benchmark results, e.g. of two commits.
+
+    Parameters
+    ----------
+    baseline : Union[str, dict]
+        path or result of the reference run
+    current : Union[str, dict]
+        path or result of the compared run
+    print_report : bool, optional
+        print the comparison, by default True
+
+    Returns
+    -------
+    dict
+        per common benchmark the speedup, the median duration of the baseline
+        divided by the one of the current run
+    """
+    runs = list()
+    for run in (baseline, current):
+        if isinstance(run, str):
+            with open(run, "r") as file:
+                run = json.load(file)
+        runs.append(run["benchmarks"])
+    speedup = dict()
+    for name, result in runs[1].items():
+        reference = runs[0].get(name, {})
+        if "median" in result and "median" in reference:
+            speedup[name] = reference["median"] / result["median"]
+    if print_report:
+        for name, factor in speedup.items():
+            print(f"{name:<36} {factor:6.2f}x")
+    return speedup
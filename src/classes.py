@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Union
+from typing import Callable, Union
 import numpy as np
 
 
@@ -133,3 +133,35 @@ class CSVConvertInfo:
     s_path: str
     s_csv: str
     n_samples: int
+
+
+@dataclass
+class MeasurementRig:
+    """
+    name           := rig name
+    COM_Ender      := serial connection to 3d printer
+    COM_Sciospec   := serial connection to sciospec eit device
+    enderstat      := ender 5 dataclass
+    ssms           := sciospec configuration dataclass
+    s_path         := save path of the measurement data (".../data/")
+    coordinates    := absolute measurement coordinates [mm]
+    ball           := anomaly property dataclass
+    tank           := tank properties dataclass
+    documentation  := documentation dataclass
+    sciospec_url   := ftdi url of the sciospec device of this rig
+    connect        := returns a new sciospec connection of this rig, by default
+                      connect_COM_port_usb_hs(sciospec_url)
+    """
+
+    name: str
+    COM_Ender: object
+    COM_Sciospec: object
+    enderstat: Ender5Stat
+    ssms: object
+    s_path: str
+    coordinates: np.ndarray
+    ball: BallAnomaly
+    tank: TankProperties32x2
+    documentation: MeasurementInformation
+    sciospec_url: str = "ftdi://ftdi:232h/1"
+    connect: Union[None, Callable] = None
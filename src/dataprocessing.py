@@ -1,19 +1,29 @@
 import json
 import os
-import matplotlib.pyplot as plt
+from datetime import datetime
 import numpy as np
-from matplotlib import ticker
-from .classes import PyEIT3DMesh, TankProperties32x2, BallAnomaly, CSVConvertInfo
+from .classes import (
+    PyEIT3DMesh,
+    TankProperties32x2,
+    BallAnomaly,
+    CSVConvertInfo,
+    MeasurementInformation,
+)
 import csv
-from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup, SingleFrame
 import shutil
 from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from typing import Union
+from typing import TYPE_CHECKING, Union
 from .functions import create_mesh, set_perm
+from .profiling import profile_module
 
 import glob
-from PIL import Image
+
+# matplotlib, PIL and sciopy are imported by the functions that need them, so
+# loading and converting samples does not import the plotting stack
+if TYPE_CHECKING:
+    from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup, SingleFrame
 
 
 def get_sample(l_path: str, idx: int) -> Union[np.lib.npyio.NpzFile, dict]:
@@ -42,11 +52,17 @@ def get_sample(l_path: str, idx: int) -> Union[np.lib.npyio.NpzFile, dict]:
 
 
 def temperature_history(
-    l_path, plot: bool = True, save_plot: bool = False, nbins: int = 10
+    l_path,
+    plot: bool = True,
+    save_plot: bool = False,
+    nbins: int = 10,
+    from_log: bool = False,
 ) -> np.ndarray:
     """
     Collects all temperature information of a measurement.
     You can plot and save the plottet result to the measurement directory.
+    With `from_log` the full resolution 'temperature_log.csv' of the
+    `TemperatureSampler` is used instead of the temperatures of the samples.
 
     Parameters
     ----------
@@ -58,6 +74,8 @@ def temperature_history(
         save the plot to the l_path directory, by default False
     nbins : int, optional
         maximum number of x ticks, by default 10
+    from_log : bool, optional
+        read the 'temperature_log.csv' of the measurement, by default False
 
     Returns
     -------
@@ -66,17 +84,26 @@ def temperature_history(
     """
     temp_hist = list()
     time_hist = list()
-    for idx in range(len(os.listdir(l_path + "data/"))):
-        tmp, _ = get_sample(l_path, idx)
-        temp_hist.append(tmp["documentation"].tolist().temperature[0])
-        time_hist.append(
-            ":".join(tmp["documentation"].tolist().timestamp.split("_")[3:])
-            .replace("h", "")
-            .replace("m", "")
-        )
-    title = ".".join(tmp["documentation"].tolist().timestamp.split("_")[:3])
+    if from_log:
+        log = np.loadtxt(l_path + "temperature_log.csv", delimiter=",", ndmin=2)
+        temp_hist = log[:, 1]
+        time_hist = [datetime.fromtimestamp(t).strftime("%H:%M") for t in log[:, 0]]
+        title = datetime.fromtimestamp(log[0, 0]).strftime("%d.%m.%Y")
+    else:
+        for idx in range(len(os.listdir(l_path + "data/"))):
+            tmp, _ = get_sample(l_path, idx)
+            temp_hist.append(tmp["documentation"].tolist().temperature[0])
+            time_hist.append(
+                ":".join(tmp["documentation"].tolist().timestamp.split("_")[3:])
+                .replace("h", "")
+                .replace("m", "")
+            )
+        title = ".".join(tmp["documentation"].tolist().timestamp.split("_")[:3])
     temp_hist = np.array(temp_hist)
     if plot:
+        import matplotlib.pyplot as plt
+        from matplotlib import ticker
+
         # Auto Locator
         ax = plt.subplot(111)
         # plt.figure(figsize=(6, 4))
@@ -84,7 +111,16 @@ def temperature_history(
         t2 = "=".join(l_path.split("_")[3:5])[:-1]
         plt.title("measurement: " + t1 + ", " + t2 + "mm, " + title)
         plt.grid()
-        ax.plot(time_hist, temp_hist)
+        if from_log:
+            # several readings per minute, so label the reading index
+            ax.plot(temp_hist)
+            ax.xaxis.set_major_formatter(
+                ticker.FuncFormatter(
+                    lambda x, _: time_hist[int(np.clip(x, 0, len(time_hist) - 1))]
+                )
+            )
+        else:
+            ax.plot(time_hist, temp_hist)
         ax.xaxis.set_major_locator(ticker.AutoLocator())
         ax.xaxis.set_minor_locator(ticker.AutoMinorLocator())
         ax.set_xlabel("Timestamp in hh:mm")
@@ -154,6 +190,8 @@ def get_trajectory(
         traj_xyz[idx, 2] = tmp["anomaly"].tolist().z
 
     if plot_traj:
+        import matplotlib.pyplot as plt
+
         fig = plt.figure()
         ax = fig.add_subplot(111, projection="3d")
         zyl_pnts = 50
@@ -210,13 +248,35 @@ def get_measured_potential(
     np.ndarray
         complex potential data
     """
-    ssms = tmp["config"].tolist()
+    return get_frames_potential(tmp["data"], tmp["config"].tolist(), shape_type)
+
+
+def get_frames_potential(
+    frames: np.ndarray, ssms: "ScioSpecMeasurementSetup", shape_type="matrix"
+) -> np.ndarray:
+    """
+    Read the complex potential data of the SingleFrames of a single burst.
+
+    Parameters
+    ----------
+    frames : np.ndarray
+        SingleFrames of a single burst
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    shape_type : str, optional {'matrix', 'vector'}
+        shape of the data, by default "matrix"
+
+    Returns
+    -------
+    np.ndarray
+        complex potential data
+    """
     ch_n = ssms.n_el // len(ssms.channel_group)
     pot_array = list()
 
     ch_group_srtng = np.zeros((len(ssms.channel_group), ch_n), dtype=complex)
     channel_switch = 0
-    for frame in tmp["data"]:
+    for frame in frames:
         frame_tmp_dict = frame.__dict__
         group = frame_tmp_dict["channel_group"]
         for ch in range(ch_n):
@@ -290,7 +350,7 @@ def get_BallAnomaly_properties(tmp: np.lib.npyio.NpzFile) -> BallAnomaly:
     return tmp["anomaly"].tolist()
 
 
-def get_config(tmp: np.lib.npyio.NpzFile) -> ScioSpecMeasurementSetup:
+def get_config(tmp: np.lib.npyio.NpzFile) -> "ScioSpecMeasurementSetup":
     """
     Get the measurement configuration.
 
@@ -307,7 +367,7 @@ def get_config(tmp: np.lib.npyio.NpzFile) -> ScioSpecMeasurementSetup:
     return tmp["config"].tolist()
 
 
-def get_SingleFrame_exc_stage(dataframe: SingleFrame) -> np.ndarray:
+def get_SingleFrame_exc_stage(dataframe: "SingleFrame") -> np.ndarray:
     """
     Get the excitation electrodes from a single dataframe.
 
@@ -347,6 +407,129 @@ def get_excitation_stages(tmp: np.lib.npyio.NpzFile) -> np.array:
     return exc_stgs
 
 
+def documentation_time(documentation: MeasurementInformation) -> float:
+    """
+    Unix time of the documentation timestamp.
+
+    Parameters
+    ----------
+    documentation : MeasurementInformation
+        documentation dataclass
+
+    Returns
+    -------
+    float
+        unix time [s]
+    """
+    return datetime.strptime(documentation.timestamp, "%d_%m_%Y_%Hh_%Mm").timestamp()
+
+
+def documentation_temperature(documentation: MeasurementInformation) -> float:
+    """
+    Temperature of the documentation, saved as value or as (value, unit).
+
+    Parameters
+    ----------
+    documentation : MeasurementInformation
+        documentation dataclass
+
+    Returns
+    -------
+    float
+        temperature [°C]
+    """
+    temperature = documentation.temperature
+    if isinstance(temperature, (tuple, list)):
+        temperature = temperature[0]
+    return float(temperature)
+
+
+def load_samples(paths: list) -> dict:
+    """
+    Load potentials and metadata of several sample files into arrays.
+
+    Parameters
+    ----------
+    paths : list
+        sample files
+
+    Returns
+    -------
+    dict
+        "potentials" complex vectors (n, n_el * n_el), NaN padded if frames are
+        missing, "coordinates" ball positions (n, 3) [mm], "temperatures" [°C],
+        "times" unix times [s], "group_counts" frames per configured channel group
+        (n, n_groups)
+    """
+    potentials, coordinates, temperatures, times, group_counts = [], [], [], [], []
+    for path in paths:
+        tmp = np.load(path, allow_pickle=True)
+        ssms = tmp["config"].tolist()
+        ball = tmp["anomaly"].tolist()
+        documentation = tmp["documentation"].tolist()
+        # every access of an npz entry unpickles it again
+        frames = tmp["data"]
+        pot = np.full(ssms.n_el * ssms.n_el, np.nan, dtype=complex)
+        vector = get_frames_potential(frames, ssms, "vector")
+        pot[: vector.shape[0]] = vector[: pot.shape[0]]
+        potentials.append(pot)
+        coordinates.append([ball.x, ball.y, ball.z])
+        temperatures.append(documentation_temperature(documentation))
+        times.append(documentation_time(documentation))
+        groups = [frame.channel_group for frame in frames]
+        group_counts.append([groups.count(grp) for grp in ssms.channel_group])
+    return {
+        "potentials": np.array(potentials),
+        "coordinates": np.array(coordinates, dtype=float),
+        "temperatures": np.array(temperatures),
+        "times": np.array(times),
+        "group_counts": np.array(group_counts),
+    }
+
+
+def load_run(
+    l_path: str,
+    indices: Union[None, np.ndarray] = None,
+    n_workers: Union[None, int] = 1,
+    chunk_size: int = 64,
+) -> dict:
+    """
+    Load potentials and metadata of the samples of a measurement into arrays.
+    With several workers the samples are read in chunks by a process pool.
+
+    Parameters
+    ----------
+    l_path : str
+        load path
+    indices : Union[None, np.ndarray], optional
+        sample indices, by default all samples
+    n_workers : Union[None, int], optional
+        number of processes, None for os.cpu_count(), by default 1
+    chunk_size : int, optional
+        samples per process pool job, by default 64
+
+    Returns
+    -------
+    dict
+        see `load_samples`, with the additional "indices"
+    """
+    if indices is None:
+        indices = np.arange(len(glob.glob(l_path + "data/sample_*.npz")))
+    paths = [l_path + "data/sample_{0:06d}.npz".format(idx) for idx in indices]
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers == 1 or len(paths) <= chunk_size:
+        run = load_samples(tqdm(paths))
+    else:
+        chunks = [
+            paths[idx : idx + chunk_size] for idx in range(0, len(paths), chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            parts = list(tqdm(executor.map(load_samples, chunks), total=len(chunks)))
+        run = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    run["indices"] = np.asarray(indices)
+    return run
+
+
 def prepare_csv_conv(l_path: str) -> CSVConvertInfo:
     s_path = l_path[:-1] + "_csv/"
     try:
@@ -374,7 +557,7 @@ def prepare_csv_conv(l_path: str) -> CSVConvertInfo:
 
 
 def write_top_csv_row(
-    conv_info: CSVConvertInfo, config: ScioSpecMeasurementSetup, anomaly: BallAnomaly
+    conv_info: CSVConvertInfo, config: "ScioSpecMeasurementSetup", anomaly: BallAnomaly
 ) -> None:
     """
     Creates the top row titles of the columns.
@@ -498,6 +681,82 @@ def get_pot_data_FF(l_path: str, idx: int) -> np.ndarray:
     return np.abs(pot_data)
 
 
+def _inj_pattern_figure(
+    tank: TankProperties32x2,
+    elev: int,
+    azim: int,
+    n_el_per_channel: int,
+    dpi: int,
+) -> tuple:
+    """
+    Static part of the injection pattern figure: tank border, channel groups and
+    legend. The injection line is returned empty and only its data changes per
+    frame.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    zyl_pnts = 50
+    theta = np.linspace(0, 2 * np.pi, zyl_pnts)
+    z = np.linspace(tank.T_bz[0], tank.T_bz[1], zyl_pnts)
+    Z, Theta = np.meshgrid(z, theta)
+    X = tank.T_r * np.cos(Theta)
+    Y = tank.T_r * np.sin(Theta)
+    phi_ypos = np.linspace(0, np.pi, n_el_per_channel, endpoint=False)
+    phi_yneg = np.linspace(np.pi, 2 * np.pi, n_el_per_channel, endpoint=False)
+    phi_chgps = np.concatenate([phi_ypos, phi_yneg, phi_ypos, phi_yneg])
+    X_chgps = tank.T_r * np.cos(phi_chgps)
+    Y_chgps = tank.T_r * np.sin(phi_chgps)
+    Z_chgps = np.repeat(
+        [tank.E_zr1, tank.E_zr1, tank.E_zr2, tank.E_zr2], n_el_per_channel
+    )
+
+    fig = Figure(dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111, projection="3d")
+    # phantom-tank border
+    ax.plot_surface(X, Y, Z, color="C7", alpha=0.1)
+    # plot channel groups
+    for grp, (c, label) in enumerate(
+        zip([2, 4, 0, 3], ["ch.gr. 1", "ch.gr. 3", "ch.gr. 2", "ch.gr. 4"])
+    ):
+        sl = slice(grp * n_el_per_channel, (grp + 1) * n_el_per_channel)
+        ax.scatter(X_chgps[sl], Y_chgps[sl], Z_chgps[sl], color=f"C{c}", label=label)
+    (line,) = ax.plot([], [], [], "--", c="black")
+
+    ax.set_xlim([tank.T_bx[0], tank.T_bx[1]])
+    ax.set_ylim([tank.T_by[0], tank.T_by[1]])
+    ax.set_zlim([tank.T_bz[0], tank.T_bz[1]])
+    ax.set_xlabel("x pos [mm]")
+    ax.set_ylabel("y pos [mm]")
+    ax.set_zlabel("z pos [mm]")
+    ax.view_init(elev=elev, azim=azim)
+    ax.legend(loc="best", bbox_to_anchor=(0.57, 0.3, 0.5, 0.5))
+    fig.tight_layout()
+    return canvas, ax, line, np.stack([X_chgps, Y_chgps, Z_chgps], axis=1)
+
+
+def _render_inj_frames(args: tuple) -> list:
+    """
+    Render the injection pattern frames of the electrode pairs into RGB arrays.
+    The static background is drawn once and restored for every frame, only the
+    injection line is drawn on top of it.
+    """
+    inj_electrodes, tank, elev, azim, n_el_per_channel, dpi = args
+    canvas, ax, line, electrodes = _inj_pattern_figure(
+        tank, elev, azim, n_el_per_channel, dpi
+    )
+    canvas.draw()
+    background = canvas.copy_from_bbox(canvas.figure.bbox)
+    frames = list()
+    for i1, i2 in inj_electrodes:
+        canvas.restore_region(background)
+        line.set_data_3d(*electrodes[[i1, i2]].T)
+        ax.draw_artist(line)
+        frames.append(np.asarray(canvas.buffer_rgba())[..., :3].copy())
+    return frames
+
+
 def gif_inj_stages(
     tmp: np.lib.npyio.NpzFile,
     tank=TankProperties32x2(),
@@ -505,9 +764,17 @@ def gif_inj_stages(
     azim: int = 10,
     n_el_per_channel: int = 16,
     duration: int = 100,
-) -> None:
+    gif_path: str = "inj_pattern.gif",
+    dpi: int = 250,
+    n_workers: Union[None, int] = None,
+    frames_per_worker: int = 64,
+) -> str:
     """
     Generates a .gif for injection pattern visualization.
+    The static figure is drawn once and only the injection line is drawn per
+    frame. The frames are rendered in memory and split across worker processes
+    in chunks of at least `frames_per_worker` frames. The .gif is written in one
+    pass.
 
     Parameters
     ----------
@@ -522,121 +789,53 @@ def gif_inj_stages(
     n_el_per_channel : int, optional
         electrodes per channel, by default 16
     duration : int, optional
-        gig duration, by default 100
-    """
-
-    def make_gif(gif_dir):
-        frames = [Image.open(image) for image in np.sort(glob.glob(f"{gif_dir}/*.png"))]
-        frame_one = frames[0]
-        frame_one.save(
-            "inj_pattern.gif",
-            format="GIF",
-            append_images=frames,
-            save_all=True,
-            duration=duration,
-            loop=0,
-        )
-
-    zyl_pnts = 50
-    theta = np.linspace(0, 2 * np.pi, zyl_pnts)
-    z = np.linspace(tank.T_bz[0], tank.T_bz[1], zyl_pnts)
-    Z, Theta = np.meshgrid(z, theta)
-    X = tank.T_r * np.cos(Theta)
-    Y = tank.T_r * np.sin(Theta)
-    phi_ypos = np.linspace(0, np.pi, n_el_per_channel, endpoint=False)
-    phi_yneg = np.linspace(np.pi, 2 * np.pi, n_el_per_channel, endpoint=False)
-    Z_r1 = tank.E_zr1
-    Z_r2 = tank.E_zr2
-    r = tank.T_r
-
-    X_chgps = np.concatenate(
-        [
-            tank.T_r * np.cos(phi_ypos),
-            tank.T_r * np.cos(phi_yneg),
-            tank.T_r * np.cos(phi_ypos),
-            tank.T_r * np.cos(phi_yneg),
-        ]
-    )
-    Y_chgps = np.concatenate(
-        [
-            tank.T_r * np.sin(phi_ypos),
-            tank.T_r * np.sin(phi_yneg),
-            tank.T_r * np.sin(phi_ypos),
-            tank.T_r * np.sin(phi_yneg),
-        ]
-    )
-    Z_chgps = np.concatenate(
-        [
-            np.repeat(Z_r1, n_el_per_channel),
-            np.repeat(Z_r1, n_el_per_channel),
-            np.repeat(Z_r2, n_el_per_channel),
-            np.repeat(Z_r2, n_el_per_channel),
-        ]
-    )
-    chgps_c = np.concatenate(
-        [[f"C{c}" for _ in range(n_el_per_channel)] for c in [2, 4, 0, 3]]
-    )
-
-    os.mkdir("tmp_gif_dir")
+        frame duration [ms], by default 100
+    gif_path : str, optional
+        save path of the .gif, by default "inj_pattern.gif"
+    dpi : int, optional
+        resolution of the frames, by default 250
+    n_workers : Union[None, int], optional
+        maximum number of processes, by default os.cpu_count()
+    frames_per_worker : int, optional
+        minimum number of frames per process, by default 64
 
+    Returns
+    -------
+    str
+        save path of the .gif
+    """
     inj_electrodes = np.unique(get_excitation_stages(tmp), axis=0) - 1
-    img_num = 0
-    for i1, i2 in inj_electrodes:
-        fig = plt.figure()
-        ax = fig.add_subplot(111, projection="3d")
-        # phantom-tank border
-        ax.plot_surface(X, Y, Z, color="C7", alpha=0.1)
-        # plot channel groups
-        ax.scatter(
-            tank.T_r * np.cos(phi_ypos),
-            tank.T_r * np.sin(phi_ypos),
-            np.repeat(Z_r1, n_el_per_channel),
-            color=chgps_c[:16],
-            label="ch.gr. 1",
-        )
-        ax.scatter(
-            tank.T_r * np.cos(phi_yneg),
-            tank.T_r * np.sin(phi_yneg),
-            np.repeat(Z_r1, n_el_per_channel),
-            color=chgps_c[16:32],
-            label="ch.gr. 3",
-        )
-        ax.scatter(
-            tank.T_r * np.cos(phi_ypos),
-            tank.T_r * np.sin(phi_ypos),
-            np.repeat(Z_r2, n_el_per_channel),
-            color=chgps_c[32:48],
-            label="ch.gr. 2",
-        )
-        ax.scatter(
-            tank.T_r * np.cos(phi_yneg),
-            tank.T_r * np.sin(phi_yneg),
-            np.repeat(Z_r2, n_el_per_channel),
-            color=chgps_c[48:64],
-            label="ch.gr. 4",
-        )
-        ax.plot(
-            [X_chgps[i1], X_chgps[i2]],
-            [Y_chgps[i1], Y_chgps[i2]],
-            [Z_chgps[i1], Z_chgps[i2]],
-            "--",
-            c="black",
-        )
-
-        ax.set_xlim([tank.T_bx[0], tank.T_bx[1]])
-        ax.set_ylim([tank.T_by[0], tank.T_by[1]])
-        ax.set_zlim([tank.T_bz[0], tank.T_bz[1]])
-
-        ax.set_xlabel("x pos [mm]")
-        ax.set_ylabel("y pos [mm]")
-        ax.set_zlabel("z pos [mm]")
-        ax.view_init(elev=elev, azim=azim)
-        plt.legend(loc="best", bbox_to_anchor=(0.57, 0.3, 0.5, 0.5))
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    n_chunks = max(1, min(n_workers, len(inj_electrodes) // frames_per_worker))
+    chunks = [
+        (chunk, tank, elev, azim, n_el_per_channel, dpi)
+        for chunk in np.array_split(inj_electrodes, n_chunks)
+    ]
+    if n_chunks == 1:
+        frames = _render_inj_frames(chunks[0])
+    else:
+        with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+            frames = list(chain.from_iterable(executor.map(_render_inj_frames, chunks)))
+
+    from PIL import Image
+
+    # the frames only differ by the injection line, one shared palette avoids a
+    # quantization per frame in the encoder
+    palette = Image.fromarray(frames[0]).quantize(colors=255)
+    images = [
+        Image.fromarray(frame).quantize(palette=palette, dither=Image.Dither.NONE)
+        for frame in frames
+    ]
+    images[0].save(
+        gif_path,
+        format="GIF",
+        append_images=images[1:],
+        save_all=True,
+        duration=duration,
+        loop=0,
+        optimize=False,
+    )
+    return gif_path
 
-        plt.tight_layout()
-        plt.savefig("tmp_gif_dir/img_{0:04d}.png".format(img_num), dpi=250)
-        img_num += 1
-        plt.close()
 
-    make_gif("tmp_gif_dir/")
-    shutil.rmtree(r"tmp_gif_dir", ignore_errors=True)
+profile_module(globals())
@@ -3,9 +3,21 @@ try:
 except ImportError:
     print("Could not import module: serial")
 
+import queue
+import re
+import threading
 import time
+from collections import deque
+from typing import Tuple, Union
+
 import numpy as np
 from .classes import Ender5Stat
+from .profiling import profile_module
+
+
+def _sleep(ser, seconds: float) -> None:
+    # simulated connections (`SimulatedEnder5`) scale the fixed waiting times
+    time.sleep(seconds * getattr(ser, "time_scale", 1.0))
 
 
 def command(ser, command: str, print_msg: bool = False) -> None:
@@ -22,7 +34,7 @@ def command(ser, command: str, print_msg: bool = False) -> None:
         print log, by default True
     """
     ser.write(str.encode(command))
-    time.sleep(1)
+    _sleep(ser, 1)
     while True:
         line = ser.readline()
         if print_msg:
@@ -109,9 +121,171 @@ def turn_off_fan(ser) -> None:
     command(ser, "M106 S0\r\n")
 
 
-def read_temperature(ser) -> float:
+def parse_bed_temperature(line: bytes) -> Union[None, float]:
+    """
+    Parse the bed temperature of a Marlin temperature report, e.g.
+    b"ok T:25.00 /0.00 B:21.30 /0.00 @:0 B@:0\n".
+
+    Parameters
+    ----------
+    line : bytes
+        single line of the serial connection
+
+    Returns
+    -------
+    Union[None, float]
+        bed temperature [°C], None if the line is no temperature report
+    """
+    match = re.search(r"\bB:\s*(-?\d+(?:\.\d+)?)", line.decode(errors="ignore"))
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+class TemperatureSampler:
+    """
+    Wrapper of the Ender 5 serial connection with a background temperature poller.
+
+    The Ender 5 auto-reports its temperatures (M155) and a background thread keeps
+    the bed temperatures in a timestamped ring buffer. All other lines are
+    forwarded to `readline()`, so the sampler can be passed as `ser` to every
+    function of this module. `read_temperature()` then returns the nearest cached
+    reading without touching the serial line.
+
+    Parameters
+    ----------
+    ser
+        serial connection
+    interval : int, optional
+        auto-report interval [s], by default 1
+    maxlen : int, optional
+        size of the ring buffer, by default 3600
+    log_path : Union[None, str], optional
+        append every reading to this .csv file, by default None
+    """
+
+    def __init__(
+        self,
+        ser,
+        interval: int = 1,
+        maxlen: int = 3600,
+        log_path: Union[None, str] = None,
+    ):
+        self.ser = ser
+        self.interval = interval
+        self.log_path = log_path
+        self.samples = deque(maxlen=maxlen)
+        self._lines = queue.Queue()
+        self._lock = threading.Lock()
+        self._first_sample = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def timeout(self):
+        return self.ser.timeout
+
+    @property
+    def time_scale(self) -> float:
+        return getattr(self.ser, "time_scale", 1.0)
+
+    def start(self, print_msg: bool = False):
+        """Start the background thread and the auto-report of the Ender 5."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        command(self, f"M155 S{self.interval}\r\n", print_msg=print_msg)
+        return self
+
+    def stop(self, print_msg: bool = False) -> None:
+        """
+        Stop the auto-report and the background thread. Afterwards the serial
+        connection is used directly by `ser`.
+        """
+        if self._thread is None:
+            return
+        command(self, "M155 S0\r\n", print_msg=print_msg)
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _log(self, t: float, temp: float) -> None:
+        # the log is only opened per reading, no open file blocks the renaming
+        # of the measurement directory
+        try:
+            with open(self.log_path, "a") as log:
+                log.write(f"{t:.3f},{temp}\n")
+        except OSError:
+            print(f"Temperature log stopped, could not write: {self.log_path}")
+            self.log_path = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            line = self.ser.readline()
+            if not line:
+                continue
+            temp = parse_bed_temperature(line)
+            if temp is not None:
+                t = time.time()
+                with self._lock:
+                    self.samples.append((t, temp))
+                self._first_sample.set()
+                if self.log_path is not None:
+                    self._log(t, temp)
+                # pure auto-reports are no answer to a command
+                if not line.lstrip().startswith(b"ok"):
+                    continue
+            self._lines.put(line)
+
+    def write(self, data: bytes) -> int:
+        return self.ser.write(data)
+
+    def readline(self) -> bytes:
+        try:
+            return self._lines.get(timeout=self.timeout)
+        except queue.Empty:
+            return b""
+
+    def history(self) -> np.ndarray:
+        """
+        All buffered readings.
+
+        Returns
+        -------
+        np.ndarray
+            unix timestamps [s] and bed temperatures [°C] with shape (n, 2)
+        """
+        with self._lock:
+            return np.array(self.samples).reshape(-1, 2)
+
+    def nearest(self, t: Union[None, float] = None) -> Tuple[float, float]:
+        """
+        Get the buffered reading that is nearest to a given time.
+
+        Parameters
+        ----------
+        t : Union[None, float], optional
+            unix timestamp [s], by default now
+
+        Returns
+        -------
+        Tuple[float, float]
+            unix timestamp [s], bed temperature [°C]
+        """
+        if not self._first_sample.wait(timeout=2 * self.interval + 1):
+            raise TimeoutError("No temperature report received from the Ender 5.")
+        if t is None:
+            t = time.time()
+        hist = self.history()
+        t_near, temp = hist[np.argmin(np.abs(hist[:, 0] - t))]
+        return t_near, temp
+
+
+def read_temperature(ser) -> Tuple[float, str]:
     """
-    Read the bed temperature of the Ender 5
+    Read the bed temperature of the Ender 5.
+    If `ser` is a running `TemperatureSampler`, the nearest buffered reading is
+    returned without touching the serial line.
 
     Parameters
     ----------
@@ -123,11 +297,19 @@ def read_temperature(ser) -> float:
     tuple
         temperature [°C]
     """
+    if isinstance(ser, TemperatureSampler):
+        _, temp = ser.nearest()
+        return (float(temp), "°C")
     ser.write(str.encode(f"M105\r\n"))
-    time.sleep(1)
-    line = ser.readline()
-    temp = float(str(line).split("B:")[1].split(" ")[0])
-    return (temp, "°C")
+    # skip interleaved lines like an 'ok' of a previous command
+    for _ in range(10):
+        line = ser.readline()
+        temp = parse_bed_temperature(line)
+        if temp is not None:
+            return (temp, "°C")
+        if not line:
+            break
+    raise TimeoutError("No temperature report received from the Ender 5.")
 
 
 def move_to_absolute_x_y_z(ser, enderstat: Ender5Stat, print_msg: bool = False) -> None:
@@ -186,8 +368,10 @@ def move_ender_to_coordinate(
     enderstat.abs_y_pos = x_y_offset + y_ender
     enderstat.abs_z_pos = z_ender
     move_to_absolute_x_y_z(ser, enderstat, print_msg)
-    time.sleep(
-        int(np.ceil((distance / enderstat.motion_speed) * 100) + 4)
-    )  # 4 seconds tolerance
+    # 4 seconds tolerance
+    _sleep(ser, int(np.ceil((distance / enderstat.motion_speed) * 100) + 4))
     if print_msg:
         print(enderstat)
+
+
+profile_module(globals())
@@ -0,0 +1,366 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+import numpy as np
+
+from .dataprocessing import get_excitation_stages, load_samples
+from .potential_stats import load_potential_stats
+from .quality import valid_sample_indices
+
+
+def get_features_path(l_path: str) -> str:
+    """
+    Path of the reduced potential features, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        features path
+    """
+    return l_path + "features.npz"
+
+
+def excitation_rows(tmp: np.lib.npyio.NpzFile) -> np.ndarray:
+    """
+    Injecting and ground electrode of every row of the potential matrix, see
+    `get_measured_potential`.
+
+    Parameters
+    ----------
+    tmp : np.lib.npyio.NpzFile
+        measurement file
+
+    Returns
+    -------
+    np.ndarray
+        excitation electrodes (n_exc, 2), starting with 1
+    """
+    n_groups = len(tmp["config"].tolist().channel_group)
+    return get_excitation_stages(tmp)[::n_groups]
+
+
+def channel_mask(exc_stages: np.ndarray, n_el: int) -> np.ndarray:
+    """
+    Structural channel selection of the potential matrix. The channels of the
+    injecting and the ground electrode of every excitation are dropped, they show
+    the drive voltage and the contact impedance instead of the saline. An
+    excitation of an electrode pair that was already excited in reverse order is
+    dropped as well, by reciprocity it only flips the sign of the potentials.
+
+    Parameters
+    ----------
+    exc_stages : np.ndarray
+        excitation electrodes (n_exc, 2), starting with 1, see `excitation_rows`
+    n_el : int
+        number of electrodes
+
+    Returns
+    -------
+    np.ndarray
+        kept channels (n_exc, n_el)
+    """
+    exc_stages = np.asarray(exc_stages, dtype=int)
+    mask = np.ones((exc_stages.shape[0], n_el), dtype=bool)
+    rows = np.arange(exc_stages.shape[0])
+    mask[rows, exc_stages[:, 0] - 1] = False
+    mask[rows, exc_stages[:, 1] - 1] = False
+    seen = set()
+    for row, pair in enumerate(exc_stages):
+        key = tuple(sorted(pair))
+        if key in seen:
+            mask[row] = False
+        seen.add(key)
+    return mask
+
+
+class PotentialFeatures:
+    """
+    Reduced |φ| features for the mapper. The structurally redundant channels of
+    `channel_mask` and the near-constant channels are dropped, the remaining
+    channels are standardized and projected onto an incremental PCA basis.
+
+    Parameters
+    ----------
+    n_components : int, optional
+        number of principal components, by default 256
+    min_relative_std : float, optional
+        channels with a standard deviation below this fraction of the median
+        channel standard deviation are dropped, by default 1e-2
+    """
+
+    def __init__(self, n_components: int = 256, min_relative_std: float = 1e-2):
+        self.n_components = n_components
+        self.min_relative_std = min_relative_std
+        self.mask = None
+        self.mean = None
+        self.scale = None
+        self.components = None
+        self.explained_variance_ratio = None
+
+    @property
+    def n_channels(self) -> int:
+        return int(np.sum(self.mask))
+
+    def select(
+        self, exc_stages: np.ndarray, n_el: int, mean: np.ndarray, std: np.ndarray
+    ) -> None:
+        """
+        Select the channels and set the standardization.
+
+        Parameters
+        ----------
+        exc_stages : np.ndarray
+            excitation electrodes (n_exc, 2), see `excitation_rows`
+        n_el : int
+            number of electrodes
+        mean : np.ndarray
+            mean |φ| of every channel (n_exc * n_el,)
+        std : np.ndarray
+            standard deviation of |φ| of every channel (n_exc * n_el,)
+        """
+        mask = channel_mask(exc_stages, n_el).ravel()
+        mask &= std > self.min_relative_std * np.median(std[mask])
+        self.mask = mask
+        self.mean = mean[mask].astype(np.float32)
+        self.scale = std[mask].astype(np.float32)
+
+    def standardize(self, abs_potentials: np.ndarray) -> np.ndarray:
+        """
+        Selected and standardized channels.
+
+        Parameters
+        ----------
+        abs_potentials : np.ndarray
+            absolute potentials (n_potentials,) or (n_samples, n_potentials)
+
+        Returns
+        -------
+        np.ndarray
+            standardized channels (n_samples, n_channels)
+        """
+        phi = np.atleast_2d(abs_potentials)[:, self.mask]
+        return ((phi - self.mean) / self.scale).astype(np.float32)
+
+    def transform(self, abs_potentials: np.ndarray) -> np.ndarray:
+        """
+        Features of one or several potential vectors.
+
+        Parameters
+        ----------
+        abs_potentials : np.ndarray
+            absolute potentials (n_potentials,) or (n_samples, n_potentials),
+            e.g. `get_pot_data_FF`
+
+        Returns
+        -------
+        np.ndarray
+            features (n_samples, n_components)
+        """
+        return self.standardize(abs_potentials) @ self.components
+
+    def save(self, path: str, **arrays) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(
+                file,
+                n_components=self.n_components,
+                min_relative_std=self.min_relative_std,
+                mask=self.mask,
+                mean=self.mean,
+                scale=self.scale,
+                components=self.components,
+                explained_variance_ratio=self.explained_variance_ratio,
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PotentialFeatures":
+        data = np.load(path)
+        features = cls(int(data["n_components"]), float(data["min_relative_std"]))
+        for key in ("mask", "mean", "scale", "components", "explained_variance_ratio"):
+            setattr(features, key, data[key])
+        return features
+
+
+def _standardized_chunk(args: tuple) -> tuple:
+    paths, features = args
+    samples = load_samples(paths)
+    return features.standardize(np.abs(samples["potentials"])), samples["coordinates"]
+
+
+def _chunks(paths: np.ndarray, chunk_size: int) -> list:
+    # IncrementalPCA needs at least n_components samples per batch, so a short
+    # last chunk is merged into the previous one
+    chunks = [paths[idx : idx + chunk_size] for idx in range(0, len(paths), chunk_size)]
+    if len(chunks) > 1 and len(chunks[-1]) < chunk_size:
+        chunks[-2] = np.concatenate([chunks[-2], chunks.pop()])
+    return chunks
+
+
+def compute_features(
+    l_path: str,
+    n_components: int = 256,
+    min_relative_std: float = 1e-2,
+    qa: bool = False,
+    n_workers: Union[None, int] = None,
+    chunk_size: int = 512,
+    max_memory: float = 2e9,
+    save: bool = True,
+) -> dict:
+    """
+    Fit the feature reduction on all samples of a measurement and project them.
+    The channel statistics come from `load_potential_stats`, the PCA basis is
+    fitted with `sklearn.decomposition.IncrementalPCA` on chunks of samples that
+    are read by a process pool. The standardized chunks are kept for the
+    projection if they fit into `max_memory`, otherwise the samples are read a
+    second time.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    n_components : int, optional
+        number of principal components, by default 256
+    min_relative_std : float, optional
+        relative standard deviation of near-constant channels, by default 1e-2
+    qa : bool, optional
+        only use samples that passed `quality_check`, by default False
+    n_workers : Union[None, int], optional
+        number of processes, 1 reads in this process, by default os.cpu_count()
+    chunk_size : int, optional
+        samples per PCA batch, at least `n_components`, by default 512
+    max_memory : float, optional
+        bytes of the kept standardized chunks, by default 2e9
+    save : bool, optional
+        save the result as 'features.npz', by default True
+
+    Returns
+    -------
+    dict
+        "features" (n_samples, n_components), "coordinates" (n_samples, 3) [mm],
+        "indices" sample indices, "files" sample file names and the fitted
+        "reduction" `PotentialFeatures`
+    """
+    from sklearn.decomposition import IncrementalPCA
+
+    if qa:
+        indices = valid_sample_indices(l_path)
+    else:
+        indices = np.arange(len(glob.glob(l_path + "data/sample_*.npz")))
+    if len(indices) == 0:
+        raise FileNotFoundError(f"No samples found at: {l_path}data/")
+    paths = np.array(
+        [l_path + "data/sample_{0:06d}.npz".format(idx) for idx in indices]
+    )
+
+    tmp = np.load(paths[0], allow_pickle=True)
+    stats = load_potential_stats(l_path, n_workers=n_workers)
+    reduction = PotentialFeatures(n_components, min_relative_std)
+    reduction.select(
+        excitation_rows(tmp),
+        tmp["config"].tolist().n_el,
+        stats.abs.mean,
+        stats.abs.std,
+    )
+    n_components = min(n_components, reduction.n_channels, len(paths))
+    chunks = _chunks(paths, max(chunk_size, n_components))
+
+    def read_chunks():
+        jobs = [(chunk, reduction) for chunk in chunks]
+        if n_workers == 1:
+            yield from map(_standardized_chunk, jobs)
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                yield from executor.map(_standardized_chunk, jobs)
+
+    keep = len(paths) * reduction.n_channels * 4 <= max_memory
+    kept = list()
+    pca = IncrementalPCA(n_components)
+    for standardized, coords in read_chunks():
+        pca.partial_fit(standardized)
+        if keep:
+            kept.append((standardized, coords))
+    reduction.components = np.ascontiguousarray(pca.components_.T, dtype=np.float32)
+    reduction.explained_variance_ratio = pca.explained_variance_ratio_
+
+    features, coordinates = list(), list()
+    for standardized, coords in kept if keep else read_chunks():
+        features.append(standardized @ reduction.components)
+        coordinates.append(coords)
+    result = {
+        "features": np.concatenate(features),
+        "coordinates": np.concatenate(coordinates),
+        "indices": np.asarray(indices),
+        "files": np.array([os.path.basename(path) for path in paths]),
+        "reduction": reduction,
+    }
+    if save:
+        reduction.save(
+            get_features_path(l_path),
+            mtimes=np.array([os.path.getmtime(path) for path in paths]),
+            **{key: value for key, value in result.items() if key != "reduction"},
+        )
+    return result
+
+
+def load_features(l_path: str, qa: bool = False, **kwargs) -> dict:
+    """
+    Load the cached features of a measurement. They are (re)computed if they do
+    not exist, if sample files were added, removed or modified since, or if
+    `n_components` or `min_relative_std` differ.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    qa : bool, optional
+        only use samples that passed `quality_check`, by default False
+    kwargs
+        arguments of `compute_features`
+
+    Returns
+    -------
+    dict
+        features, see `compute_features`
+    """
+    path = get_features_path(l_path)
+    if os.path.isfile(path):
+        data = np.load(path)
+        if qa:
+            indices = valid_sample_indices(l_path)
+        else:
+            indices = np.arange(len(glob.glob(l_path + "data/sample_*.npz")))
+        files = np.array(["sample_{0:06d}.npz".format(idx) for idx in indices])
+        try:
+            mtimes = np.array(
+                [os.path.getmtime(l_path + "data/" + file) for file in files]
+            )
+        except OSError:
+            mtimes = None
+        n_components = kwargs.get("n_components", int(data["n_components"]))
+        min_relative_std = kwargs.get(
+            "min_relative_std", float(data["min_relative_std"])
+        )
+        if (
+            "mtimes" in data
+            and mtimes is not None
+            and np.array_equal(data["files"], files)
+            and np.array_equal(data["mtimes"], mtimes)
+            and n_components == data["n_components"]
+            and min_relative_std == data["min_relative_std"]
+        ):
+            result = {
+                key: data[key]
+                for key in ("features", "coordinates", "indices", "files")
+            }
+            result["reduction"] = PotentialFeatures.load(path)
+            return result
+    return compute_features(l_path, qa=qa, **kwargs)
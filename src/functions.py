@@ -1,4 +1,4 @@
-from typing import Union, Tuple
+from typing import TYPE_CHECKING, Union, Tuple
 from .classes import (
     TankProperties32x2,
     BallAnomaly,
@@ -11,11 +11,12 @@ import numpy as np
 import json
 import time
 from .ender5 import move_to_absolute_x_y_z, read_temperature
-from .sciospec import sciospec_measurement
+from .profiling import profile_module
 import os
 from datetime import datetime
-from sciopy import SystemMessageCallback_usb_hs
-from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup
+
+if TYPE_CHECKING:
+    from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup
 
 
 def compute_hitbox(
@@ -146,7 +147,7 @@ def create_measurement_directory(
 def save_parameters_to_json_file(
     s_path: str,
     f_name: str,
-    ssms: ScioSpecMeasurementSetup,
+    ssms: "ScioSpecMeasurementSetup",
     tank: TankProperties32x2,
     ball: BallAnomaly,
     hitbox: HitBox,
@@ -292,7 +293,7 @@ def set_perm(
 
 
 def rename_savedir(
-    s_path: str, ball: BallAnomaly, ssms: ScioSpecMeasurementSetup
+    s_path: str, ball: BallAnomaly, ssms: "ScioSpecMeasurementSetup"
 ) -> None:
     """
     Rename the timestamp save directory to material, injection and size of the
@@ -327,7 +328,7 @@ def empty_tank_measurement(
     COM_Ender,
     enderstat: Ender5Stat,
     COM_Sciospec,
-    ssms: ScioSpecMeasurementSetup,
+    ssms: "ScioSpecMeasurementSetup",
     s_path: str,
     ball: BallAnomaly,
     documentation: MeasurementInformation,
@@ -361,6 +362,9 @@ def empty_tank_measurement(
     if enderstat.abs_z_pos + ball.d <= documentation.saline_height[0]:
         print("Move object out of the saline")
         return
+    from sciopy import SystemMessageCallback_usb_hs
+
+    from .sciospec import sciospec_measurement
 
     samples_counter = 0
     documentation.temperature = read_temperature(COM_Ender)
@@ -385,3 +389,6 @@ def empty_tank_measurement(
         )
         samples_counter += 1
     SystemMessageCallback_usb_hs(COM_Sciospec, prnt_msg=False)
+
+
+profile_module(globals())
@@ -0,0 +1,146 @@
+import json
+import os
+from typing import Tuple
+
+import numpy as np
+
+
+def get_journal_path(s_path: str) -> str:
+    """
+    Path of the progress journal, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+
+    Returns
+    -------
+    str
+        journal path
+    """
+    return s_path[:-5] + "journal.jsonl"
+
+
+def get_coordinates_path(s_path: str) -> str:
+    """
+    Path of the stored measurement coordinates, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+
+    Returns
+    -------
+    str
+        coordinates path
+    """
+    return s_path[:-5] + "coordinates.npy"
+
+
+def init_journal(s_path: str, coordinates: np.ndarray) -> None:
+    """
+    Prepare the journal and store the planned coordinates of a measurement, if not
+    already done. A resumed measurement has to use the same coordinates as the
+    initial one.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+    coordinates : np.ndarray
+        computed absolute measurement coordinates [mm]
+    """
+    # cut off a torn last line of an interrupted journal write
+    j_path = get_journal_path(s_path)
+    if os.path.isfile(j_path):
+        with open(j_path, "rb+") as file:
+            content = file.read()
+            if content and not content.endswith(b"\n"):
+                file.truncate(content.rfind(b"\n") + 1)
+
+    c_path = get_coordinates_path(s_path)
+    if os.path.isfile(c_path):
+        if not np.array_equal(np.load(c_path), coordinates):
+            raise ValueError(
+                f"Coordinates differ from the journaled coordinates at: {c_path}"
+            )
+        return
+    tmp_path = c_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        np.save(file, coordinates)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, c_path)
+
+
+def append_journal_entry(s_path: str, entry: dict) -> None:
+    """
+    Append a single entry to the journal.
+    The entry is written as one line and synced to the disk before returning.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+    entry : dict
+        json serializable journal entry
+    """
+    line = json.dumps(entry) + "\n"
+    with open(get_journal_path(s_path), "a") as file:
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def read_journal(s_path: str) -> list:
+    """
+    Read all complete journal entries.
+    A torn last line of an interrupted write is ignored.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+
+    Returns
+    -------
+    list
+        journal entries
+    """
+    j_path = get_journal_path(s_path)
+    if not os.path.isfile(j_path):
+        return list()
+    entries = list()
+    with open(j_path, "r") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return entries
+
+
+def get_resume_state(s_path: str) -> Tuple[set, int]:
+    """
+    Get the finished coordinates and the next sample number of a measurement.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+
+    Returns
+    -------
+    Tuple[set, int]
+        finished coordinate indices, next sample number
+    """
+    finished = set()
+    samples_counter = 0
+    for entry in read_journal(s_path):
+        finished.add(entry["coordinate_idx"])
+        samples_counter = max(samples_counter, entry["samples_counter"])
+    return finished, samples_counter
@@ -0,0 +1,376 @@
+import time
+from typing import Tuple, Union
+
+import numpy as np
+
+
+def get_knn_index_path(l_path: str) -> str:
+    """
+    Path of the nearest neighbour index, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        index path
+    """
+    return l_path + "knn_index.npz"
+
+
+def aggregate_coordinates(
+    phi: np.ndarray, coordinates: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean potentials of the bursts measured at the same coordinate.
+
+    Parameters
+    ----------
+    phi : np.ndarray
+        absolute potentials (n_samples, n_potentials)
+    coordinates : np.ndarray
+        ball positions (n_samples, 3) [mm]
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        mean potentials (n_coord, n_potentials), unique ball positions
+        (n_coord, 3) [mm]
+    """
+    unique, inverse = np.unique(
+        np.asarray(coordinates, dtype=float), axis=0, return_inverse=True
+    )
+    inverse = inverse.ravel()
+    mean = np.zeros((unique.shape[0], phi.shape[1]))
+    np.add.at(mean, inverse, phi)
+    mean /= np.bincount(inverse, minlength=unique.shape[0])[:, None]
+    return mean, unique
+
+
+def idw_positions(
+    dist: np.ndarray, neighbours: np.ndarray, coordinates: np.ndarray
+) -> np.ndarray:
+    """
+    Inverse distance weighted mean of the coordinates of the nearest neighbours.
+
+    Parameters
+    ----------
+    dist : np.ndarray
+        neighbour distances (n_samples, k)
+    neighbours : np.ndarray
+        neighbour indices (n_samples, k)
+    coordinates : np.ndarray
+        ball positions of the neighbours (n_train, 3) [mm]
+
+    Returns
+    -------
+    np.ndarray
+        interpolated positions (n_samples, 3) [mm]
+    """
+    weights = 1 / np.maximum(dist, 1e-12)
+    weights /= np.sum(weights, axis=1, keepdims=True)
+    return np.einsum("nk,nkc->nc", weights, coordinates[neighbours])
+
+
+class PotentialIndex:
+    """
+    Nearest neighbour index of measured potential vectors for the localization of
+    the ball.
+
+    The potentials are standardized per channel and reduced with a randomized PCA
+    to `n_components` dimensions, the reduced vectors are searched with a
+    `sklearn.neighbors.BallTree`. The bursts of every coordinate are averaged
+    before, so the `k` nearest entries of a query are `k` distinct coordinates
+    instead of the bursts of a single one. The position of a query is the inverse
+    distance weighted mean of these coordinates, see `idw_positions`.
+
+    Parameters
+    ----------
+    n_components : int, optional
+        number of principal components, by default 32
+    leaf_size : int, optional
+        leaf size of the ball tree, by default 40
+    """
+
+    def __init__(self, n_components: int = 32, leaf_size: int = 40):
+        self.n_components = n_components
+        self.leaf_size = leaf_size
+        self.mean = None
+        self.scale = None
+        self.components = None
+        self.reduced = None
+        self.coordinates = None
+        self.tree = None
+
+    def transform(self, phi: np.ndarray) -> np.ndarray:
+        """
+        Standardize and reduce potential vectors.
+
+        Parameters
+        ----------
+        phi : np.ndarray
+            absolute potentials (n_samples, n_potentials)
+
+        Returns
+        -------
+        np.ndarray
+            reduced vectors (n_samples, n_components)
+        """
+        return ((np.atleast_2d(phi) - self.mean) / self.scale) @ self.components
+
+    def _build_tree(self) -> None:
+        from sklearn.neighbors import BallTree
+
+        self.tree = BallTree(self.reduced, leaf_size=self.leaf_size)
+
+    def fit(self, phi: np.ndarray, coordinates: np.ndarray):
+        """
+        Build the index of the burst averaged potentials of every coordinate.
+
+        Parameters
+        ----------
+        phi : np.ndarray
+            absolute potentials (n_samples, n_potentials)
+        coordinates : np.ndarray
+            ball positions (n_samples, 3) [mm]
+
+        Returns
+        -------
+        PotentialIndex
+            fitted index
+        """
+        phi, coordinates = aggregate_coordinates(phi, coordinates)
+        self.mean = np.mean(phi, axis=0)
+        std = np.std(phi, axis=0)
+        self.scale = np.where(std > 0, std, 1)
+        from sklearn.utils.extmath import randomized_svd
+
+        standardized = (phi - self.mean) / self.scale
+        _, _, vt = randomized_svd(standardized, self.n_components, random_state=0)
+        self.components = np.ascontiguousarray(vt[: self.n_components].T)
+        self.reduced = standardized @ self.components
+        self.coordinates = coordinates
+        self._build_tree()
+        return self
+
+    def query(self, phi: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Localize the ball of one or several potential vectors.
+
+        Parameters
+        ----------
+        phi : np.ndarray
+            absolute potentials (n_potentials,) or (n_samples, n_potentials)
+        k : int, optional
+            number of neighbours, by default 5
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            interpolated positions (n_samples, 3) [mm], neighbour indices into
+            `coordinates` (n_samples, k)
+        """
+        dist, neighbours = self.tree.query(self.transform(phi), k=k)
+        return idw_positions(dist, neighbours, self.coordinates), neighbours
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            n_components=self.n_components,
+            leaf_size=self.leaf_size,
+            mean=self.mean,
+            scale=self.scale,
+            components=self.components,
+            reduced=self.reduced,
+            coordinates=self.coordinates,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PotentialIndex":
+        data = np.load(path)
+        index = cls(int(data["n_components"]), int(data["leaf_size"]))
+        for key in ("mean", "scale", "components", "reduced", "coordinates"):
+            setattr(index, key, data[key])
+        index._build_tree()
+        return index
+
+
+def build_knn_index(
+    l_path: str,
+    phi: np.ndarray,
+    coordinates: np.ndarray,
+    n_components: int = 32,
+    save: bool = True,
+) -> PotentialIndex:
+    """
+    Build the nearest neighbour index of a measurement and save it as
+    'knn_index.npz'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    phi : np.ndarray
+        absolute potentials (n_samples, n_potentials), e.g.
+        `load_baselined_potentials`
+    coordinates : np.ndarray
+        ball positions (n_samples, 3) [mm]
+    n_components : int, optional
+        number of principal components, by default 32
+    save : bool, optional
+        save the index, by default True
+
+    Returns
+    -------
+    PotentialIndex
+        fitted index
+    """
+    index = PotentialIndex(n_components).fit(phi, coordinates)
+    if save:
+        index.save(get_knn_index_path(l_path))
+    return index
+
+
+def load_knn_index(l_path: str) -> PotentialIndex:
+    """
+    Load the nearest neighbour index of a measurement.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    PotentialIndex
+        fitted index
+    """
+    return PotentialIndex.load(get_knn_index_path(l_path))
+
+
+def exact_neighbours(
+    train: np.ndarray, query: np.ndarray, k: int = 5, chunk_size: int = 256
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Brute force nearest neighbours in the full potential space.
+
+    Parameters
+    ----------
+    train : np.ndarray
+        standardized training vectors (n_train, n_potentials)
+    query : np.ndarray
+        standardized query vectors (n_query, n_potentials)
+    k : int, optional
+        number of neighbours, by default 5
+    chunk_size : int, optional
+        queries per distance matrix, by default 256
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        neighbour distances and indices (n_query, k), sorted by distance
+    """
+    sq_train = np.sum(train**2, axis=1)
+    distances, neighbours = list(), list()
+    for start in range(0, query.shape[0], chunk_size):
+        chunk = query[start : start + chunk_size]
+        dist = sq_train[None, :] - 2 * chunk @ train.T
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        nearest_dist = np.take_along_axis(dist, nearest, axis=1)
+        order = np.argsort(nearest_dist, axis=1)
+        nearest_dist = np.take_along_axis(nearest_dist, order, axis=1)
+        nearest_dist += np.sum(chunk**2, axis=1, keepdims=True)
+        distances.append(np.sqrt(np.maximum(nearest_dist, 0)))
+        neighbours.append(np.take_along_axis(nearest, order, axis=1))
+    return np.concatenate(distances), np.concatenate(neighbours)
+
+
+def benchmark_index(
+    phi_train: np.ndarray,
+    coordinates: np.ndarray,
+    phi_query: np.ndarray,
+    k: int = 5,
+    n_components: Union[int, list] = [8, 16, 32, 64],
+    coordinates_query: Union[None, np.ndarray] = None,
+    print_report: bool = True,
+) -> dict:
+    """
+    Compare the batch query throughput and the recall of `PotentialIndex` with an
+    exact brute force search in the full potential space. Both searches run on
+    the burst averaged coordinates and localize with `idw_positions`.
+
+    Parameters
+    ----------
+    phi_train : np.ndarray
+        absolute potentials of the index (n_train, n_potentials)
+    coordinates : np.ndarray
+        ball positions of the index (n_train, 3) [mm]
+    phi_query : np.ndarray
+        absolute potentials of the queries (n_query, n_potentials)
+    k : int, optional
+        number of neighbours, by default 5
+    n_components : Union[int, list], optional
+        principal components to compare, by default [8, 16, 32, 64]
+    coordinates_query : Union[None, np.ndarray], optional
+        true ball positions of the queries (n_query, 3) [mm] to report the median
+        localization error, by default None
+    print_report : bool, optional
+        print the results, by default True
+
+    Returns
+    -------
+    dict
+        queries per second of the exact search and per number of components the
+        queries per second, the recall@k, the build time [s] and the median
+        localization error [mm]
+    """
+    phi_coord, unique = aggregate_coordinates(phi_train, coordinates)
+    mean = np.mean(phi_coord, axis=0)
+    std = np.std(phi_coord, axis=0)
+    scale = np.where(std > 0, std, 1)
+    train = (phi_coord - mean) / scale
+    query = (phi_query - mean) / scale
+    t_start = time.perf_counter()
+    exact_dist, exact = exact_neighbours(train, query, k)
+    exact_qps = query.shape[0] / (time.perf_counter() - t_start)
+
+    def median_error(positions: np.ndarray) -> float:
+        if coordinates_query is None:
+            return np.nan
+        return float(np.median(np.linalg.norm(positions - coordinates_query, axis=1)))
+
+    results = {
+        "exact_qps": exact_qps,
+        "exact_error": median_error(idw_positions(exact_dist, exact, unique)),
+        "index": dict(),
+    }
+    for n_comp in np.atleast_1d(n_components):
+        t_start = time.perf_counter()
+        index = PotentialIndex(int(n_comp)).fit(phi_train, coordinates)
+        build_time = time.perf_counter() - t_start
+        t_start = time.perf_counter()
+        positions, neighbours = index.query(phi_query, k)
+        qps = query.shape[0] / (time.perf_counter() - t_start)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(neighbours, exact)])
+        results["index"][int(n_comp)] = {
+            "qps": qps,
+            "recall": float(recall),
+            "build_time": build_time,
+            "error": median_error(positions),
+        }
+
+    if print_report:
+        print(
+            f"exact search: {exact_qps:.0f} queries/s, "
+            f"error {results['exact_error']:.1f} mm"
+        )
+        for n_comp, res in results["index"].items():
+            print(
+                f"{n_comp:>4} components: {res['qps']:.0f} queries/s, "
+                f"recall@{k} {res['recall']:.3f}, build {res['build_time']:.2f} s, "
+                f"error {res['error']:.1f} mm"
+            )
+    return results
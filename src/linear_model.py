@@ -0,0 +1,251 @@
+import os
+from dataclasses import replace
+from typing import Union
+
+import numpy as np
+
+from .classes import BallAnomaly, HitBox, TankProperties32x2
+from .functions import create_mesh, set_perm
+from .voxel_util import scale_realworld_to_intdomain, voxel_ball
+
+
+def get_linear_model_path(l_path: str) -> str:
+    """
+    Path of the linear sensitivity model, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        model path
+    """
+    return l_path + "linear_model.npz"
+
+
+def voxel_targets(coordinates: np.ndarray, hitbox: HitBox, d: int = 4) -> np.ndarray:
+    """
+    Flattened voxel balls of the ball positions, like the VAE training data.
+
+    Parameters
+    ----------
+    coordinates : np.ndarray
+        ball positions (n, 3) as (x, y, z) [mm]
+    hitbox : HitBox
+        hitbox of the measurement
+    d : int, optional
+        voxel ball size, by default 4
+
+    Returns
+    -------
+    np.ndarray
+        voxels with shape (n, 32**3)
+    """
+    gamma = list()
+    for x, y, z in coordinates:
+        x0, y0, z0 = scale_realworld_to_intdomain([y, x, z], hitbox, d=d)
+        gamma.append(voxel_ball(y0, x0, z0, d=d).flatten())
+    return np.array(gamma, dtype=float)
+
+
+def mesh_targets(
+    coordinates: np.ndarray,
+    ball: BallAnomaly,
+    tank: TankProperties32x2 = TankProperties32x2(),
+    h0: float = 0.1,
+) -> np.ndarray:
+    """
+    Node permittivities of the `PyEIT3DMesh` for the ball positions.
+
+    Parameters
+    ----------
+    coordinates : np.ndarray
+        ball positions (n, 3) as (x, y, z) [mm]
+    ball : BallAnomaly
+        anomaly property dataclass, its position is not changed
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    h0 : float, optional
+        points per millimeter, by default 0.1
+
+    Returns
+    -------
+    np.ndarray
+        node permittivities with shape (n, n_nodes)
+    """
+    mesh = create_mesh(tank, h0)
+    gamma = list()
+    for x, y, z in coordinates:
+        moved = replace(ball, x=x, y=y, z=z)
+        gamma.append(set_perm(mesh, moved).perm_array.copy())
+    return np.array(gamma)
+
+
+class LinearSensitivityModel:
+    """
+    Regularized linear map from the baseline subtracted potentials to voxel or
+    node permittivities, fitted on measured pairs.
+
+    The centered potentials are decomposed with a SVD. The inverse is regularized
+    by truncation to `rank` singular values and Tikhonov filter factors
+    s / (s**2 + lam). The factorization is stored as `components` (n_potentials,
+    rank) and `coefficients` (rank, n_outputs), so a reconstruction is two small
+    matrix products instead of a dense (n_potentials, n_outputs) matrix. The
+    factors are stored in single precision. The targets can also be the ball
+    coordinates (n_samples, 3) for a direct linear localization.
+
+    Parameters
+    ----------
+    rank : Union[None, int], optional
+        number of singular values, by default all
+    alpha : float, optional
+        Tikhonov parameter relative to the largest squared singular value,
+        by default 1e-3
+    """
+
+    def __init__(self, rank: Union[None, int] = None, alpha: float = 1e-3):
+        self.rank = rank
+        self.alpha = alpha
+        self.phi_mean = None
+        self.gamma_mean = None
+        self.components = None
+        self.coefficients = None
+        self.singular_values = None
+
+    def fit(self, phi: np.ndarray, gamma: np.ndarray):
+        """
+        Fit the model.
+
+        Parameters
+        ----------
+        phi : np.ndarray
+            baseline subtracted absolute potentials (n_samples, n_potentials)
+        gamma : np.ndarray
+            permittivities (n_samples, n_outputs)
+
+        Returns
+        -------
+        LinearSensitivityModel
+            fitted model
+        """
+        self.phi_mean = np.mean(phi, axis=0)
+        self.gamma_mean = np.mean(gamma, axis=0)
+        u, s, vt = np.linalg.svd(phi - self.phi_mean, full_matrices=False)
+        rank = s.shape[0] if self.rank is None else min(self.rank, s.shape[0])
+        u, s, vt = u[:, :rank], s[:rank], vt[:rank]
+        lam = self.alpha * s[0] ** 2
+        filter_factors = s / (s**2 + lam)
+        self.singular_values = s
+        self.components = np.ascontiguousarray(vt.T, dtype=np.float32)
+        self.coefficients = (
+            filter_factors[:, None] * (u.T @ (gamma - self.gamma_mean))
+        ).astype(np.float32)
+        self.phi_mean = self.phi_mean.astype(np.float32)
+        self.gamma_mean = self.gamma_mean.astype(np.float32)
+        return self
+
+    def reconstruct(self, phi: np.ndarray) -> np.ndarray:
+        """
+        Reconstruct the permittivities of one or several potential vectors.
+
+        Parameters
+        ----------
+        phi : np.ndarray
+            baseline subtracted absolute potentials (n_potentials,) or
+            (n_samples, n_potentials)
+
+        Returns
+        -------
+        np.ndarray
+            permittivities (n_outputs,) or (n_samples, n_outputs)
+        """
+        scores = (np.asarray(phi, dtype=np.float32) - self.phi_mean) @ self.components
+        return scores @ self.coefficients + self.gamma_mean
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            rank=self.components.shape[1],
+            alpha=self.alpha,
+            phi_mean=self.phi_mean,
+            gamma_mean=self.gamma_mean,
+            components=self.components,
+            coefficients=self.coefficients,
+            singular_values=self.singular_values,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearSensitivityModel":
+        data = np.load(path)
+        model = cls(int(data["rank"]), float(data["alpha"]))
+        for key in (
+            "phi_mean",
+            "gamma_mean",
+            "components",
+            "coefficients",
+            "singular_values",
+        ):
+            setattr(model, key, data[key])
+        return model
+
+
+def fit_linear_model(
+    l_path: str,
+    phi: np.ndarray,
+    gamma: np.ndarray,
+    rank: Union[None, int] = 64,
+    alpha: float = 1e-3,
+    save: bool = True,
+) -> LinearSensitivityModel:
+    """
+    Fit a linear sensitivity model on the samples of a measurement and save it as
+    'linear_model.npz'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    phi : np.ndarray
+        baseline subtracted absolute potentials (n_samples, n_potentials),
+        e.g. `load_baselined_potentials`
+    gamma : np.ndarray
+        permittivities (n_samples, n_outputs), e.g. `voxel_targets`
+    rank : Union[None, int], optional
+        number of singular values, by default 64
+    alpha : float, optional
+        relative Tikhonov parameter, by default 1e-3
+    save : bool, optional
+        save the model, by default True
+
+    Returns
+    -------
+    LinearSensitivityModel
+        fitted model
+    """
+    model = LinearSensitivityModel(rank, alpha).fit(phi, gamma)
+    if save:
+        model.save(get_linear_model_path(l_path))
+    return model
+
+
+def load_linear_model(l_path: str) -> LinearSensitivityModel:
+    """
+    Load the linear sensitivity model of a measurement.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    LinearSensitivityModel
+        fitted model
+    """
+    path = get_linear_model_path(l_path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No linear model found at: {path}")
+    return LinearSensitivityModel.load(path)
@@ -0,0 +1,315 @@
+import json
+import os
+import time
+from datetime import datetime
+from typing import Union
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from .classes import TankProperties32x2
+from .dataprocessing import documentation_temperature, get_measured_potential
+from .journal import get_coordinates_path, get_journal_path
+
+
+class JournalTail:
+    """
+    Incremental reader of the progress journal of an active measurement.
+    Only the bytes appended since the last poll are read, a torn last line is
+    kept until it is complete.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    """
+
+    def __init__(self, l_path: str):
+        self.path = get_journal_path(l_path + "data/")
+        self.offset = 0
+        self.buffer = b""
+
+    def poll(self) -> list:
+        """
+        Read the new complete journal entries.
+
+        Returns
+        -------
+        list
+            new journal entries
+        """
+        try:
+            if os.path.getsize(self.path) <= self.offset:
+                return list()
+        except FileNotFoundError:
+            return list()
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            content = file.read()
+        self.offset += len(content)
+        lines = (self.buffer + content).split(b"\n")
+        self.buffer = lines.pop()
+        entries = list()
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return entries
+
+
+def journal_time(entry: dict) -> float:
+    """
+    Unix time of a journal entry.
+
+    Parameters
+    ----------
+    entry : dict
+        journal entry
+
+    Returns
+    -------
+    float
+        unix time [s]
+    """
+    return datetime.strptime(entry["timestamp"], "%d_%m_%Y_%Hh_%Mm_%Ss").timestamp()
+
+
+class LiveMonitor:
+    """
+    Live dashboard of an active measurement. It tails the progress journal and
+    shows the measured and the current ball position, the |φ| matrix of the
+    latest sample, the temperature trend and the measured samples per hour.
+
+    The static parts are drawn once, the changing artists are animated and blitted
+    onto the cached background. The figure is only updated if new entries were
+    journaled, at most `refresh_rate` times per second. Only a change of the
+    temperature axis limits causes a full redraw.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    refresh_rate : float, optional
+        maximum number of updates per second, by default 1.0
+    rate_window : int, optional
+        journal entries for the samples per hour, by default 20
+    elev : int, optional
+        elevation angle of the position plot, by default 20
+    azim : int, optional
+        azimut angle of the position plot, by default 10
+    """
+
+    def __init__(
+        self,
+        l_path: str,
+        tank: TankProperties32x2 = TankProperties32x2(),
+        refresh_rate: float = 1.0,
+        rate_window: int = 20,
+        elev: int = 20,
+        azim: int = 10,
+    ):
+        self.l_path = l_path
+        self.tank = tank
+        self.refresh_rate = refresh_rate
+        self.rate_window = rate_window
+        self.tail = JournalTail(l_path)
+        self.entries = list()
+        self.times = list()
+        self.temperatures = list()
+        self.background = None
+        self._build_figure(elev, azim)
+
+    def _build_figure(self, elev: int, azim: int) -> None:
+        tank = self.tank
+        self.fig = plt.figure(figsize=(10, 8))
+        self.ax_pos = self.fig.add_subplot(221, projection="3d")
+        self.ax_phi = self.fig.add_subplot(222)
+        self.ax_temp = self.fig.add_subplot(212)
+
+        # position view, see `plot_meas_coords`
+        zyl_pnts = 50
+        theta = np.linspace(0, 2 * np.pi, zyl_pnts)
+        z = np.linspace(tank.T_bz[0], tank.T_bz[1], zyl_pnts)
+        Z, Theta = np.meshgrid(z, theta)
+        self.ax_pos.plot_surface(
+            tank.T_r * np.cos(Theta), tank.T_r * np.sin(Theta), Z, color="C7", alpha=0.2
+        )
+        c_path = get_coordinates_path(self.l_path + "data/")
+        if os.path.isfile(c_path):
+            coordinates = np.load(c_path)
+            self.ax_pos.scatter(
+                coordinates[:, 0],
+                -coordinates[:, 1],
+                coordinates[:, 2],
+                c="b",
+                marker="o",
+                alpha=0.05,
+            )
+        (self.measured,) = self.ax_pos.plot([], [], [], "o", c="b", alpha=0.3)
+        (self.current,) = self.ax_pos.plot([], [], [], "o", c="r")
+        self.ax_pos.set_xlim([tank.T_bx[0], tank.T_bx[1]])
+        self.ax_pos.set_ylim([tank.T_by[0], tank.T_by[1]])
+        self.ax_pos.set_zlim([tank.T_bz[0], tank.T_bz[1]])
+        self.ax_pos.set_xlabel("x pos (mm)")
+        self.ax_pos.set_ylabel("y pos (mm)")
+        self.ax_pos.set_zlabel("z pos (mm)")
+        self.ax_pos.view_init(elev=elev, azim=azim)
+
+        self.image = self.ax_phi.imshow(np.zeros((1, 1)), cmap="viridis")
+        self.ax_phi.set_xlabel("channel")
+        self.ax_phi.set_ylabel("excitation")
+        self.phi_title = self.ax_phi.set_title("|φ|")
+
+        (self.temp_line,) = self.ax_temp.plot([], [], "o-", ms=2)
+        self.ax_temp.set_xlabel("time (h)")
+        self.ax_temp.set_ylabel("temperature (°C)")
+        self.ax_temp.set_xlim([0, 1])
+        self.ax_temp.set_ylim([20, 21])
+        self.ax_temp.grid()
+
+        self.status = self.fig.text(0.02, 0.97, "waiting for samples", va="top")
+        self.animated = [
+            self.measured,
+            self.current,
+            self.image,
+            self.phi_title,
+            self.temp_line,
+            self.status,
+        ]
+        for artist in self.animated:
+            artist.set_animated(True)
+        self.fig.tight_layout(rect=(0, 0, 1, 0.95))
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event) -> None:
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self) -> None:
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+
+    def _load_latest(self, entry: dict) -> None:
+        tmp = np.load(self.l_path + "data/" + entry["files"][-1], allow_pickle=True)
+        phi = np.abs(get_measured_potential(tmp, shape_type="matrix"))
+        if phi.shape != self.image.get_array().shape:
+            extent = (-0.5, phi.shape[1] - 0.5, phi.shape[0] - 0.5, -0.5)
+            self.image.set_extent(extent)
+            self.ax_phi.set_xlim(extent[:2])
+            self.ax_phi.set_ylim(extent[2:])
+            self.background = None
+        self.image.set_data(phi)
+        self.image.set_clim(np.min(phi), np.max(phi))
+        self.phi_title.set_text(f"|φ| {entry['files'][-1]}")
+        self.times.append(journal_time(entry))
+        self.temperatures.append(
+            documentation_temperature(tmp["documentation"].tolist())
+        )
+
+    def samples_per_hour(self) -> float:
+        """Measured samples per hour of the last `rate_window` journal entries."""
+        window = self.entries[-self.rate_window :]
+        if len(window) < 2:
+            return np.nan
+        duration = journal_time(window[-1]) - journal_time(window[0])
+        n_samples = window[-1]["samples_counter"] - window[0]["samples_counter"]
+        return 3600 * n_samples / duration if duration > 0 else np.nan
+
+    def update(self) -> bool:
+        """
+        Read the new journal entries and update the figure.
+
+        Returns
+        -------
+        bool
+            the figure changed
+        """
+        new_entries = self.tail.poll()
+        if not new_entries:
+            return False
+        self.entries.extend(new_entries)
+        self._load_latest(new_entries[-1])
+
+        coordinates = np.array([entry["coordinate"] for entry in self.entries])
+        self.measured.set_data_3d(
+            coordinates[:, 0], -coordinates[:, 1], coordinates[:, 2]
+        )
+        self.current.set_data_3d(
+            coordinates[-1:, 0], -coordinates[-1:, 1], coordinates[-1:, 2]
+        )
+        hours = (np.array(self.times) - self.times[0]) / 3600
+        self.temp_line.set_data(hours, self.temperatures)
+        self.status.set_text(
+            f"coordinate {self.entries[-1]['coordinate_idx']}, "
+            f"{self.entries[-1]['samples_counter']} samples, "
+            f"{self.samples_per_hour():.0f} samples/h"
+        )
+
+        # grow the limits in steps, only then the background is redrawn
+        x_max = self.ax_temp.get_xlim()[1]
+        y_min, y_max = self.ax_temp.get_ylim()
+        temp_min, temp_max = np.min(self.temperatures), np.max(self.temperatures)
+        if hours[-1] > x_max or temp_min < y_min or temp_max > y_max:
+            self.ax_temp.set_xlim([0, max(x_max, 2 * hours[-1])])
+            self.ax_temp.set_ylim(
+                [min(y_min, np.floor(temp_min)), max(y_max, np.ceil(temp_max))]
+            )
+            self.background = None
+
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self._draw_animated()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+        return True
+
+    def run(self, duration: Union[None, float] = None) -> None:
+        """
+        Update the dashboard until the window is closed or `duration` passed.
+
+        Parameters
+        ----------
+        duration : Union[None, float], optional
+            monitoring time [s], by default until the window is closed
+        """
+        plt.show(block=False)
+        self.fig.canvas.draw()
+        t_start = time.monotonic()
+        while plt.fignum_exists(self.fig.number):
+            t_tick = time.monotonic()
+            if duration is not None and t_tick - t_start > duration:
+                break
+            self.update()
+            wait = max(1 / self.refresh_rate - (time.monotonic() - t_tick), 0.01)
+            try:
+                self.fig.canvas.start_event_loop(wait)
+            except NotImplementedError:
+                time.sleep(wait)
+
+
+def live_monitor(l_path: str, **kwargs) -> LiveMonitor:
+    """
+    Open the live dashboard of an active measurement, it runs until the window is
+    closed.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    kwargs
+        arguments of `LiveMonitor`
+
+    Returns
+    -------
+    LiveMonitor
+        dashboard
+    """
+    monitor = LiveMonitor(l_path, **kwargs)
+    monitor.run()
+    return monitor
@@ -0,0 +1,315 @@
+import json
+import queue
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Tuple, Union
+
+import numpy as np
+
+from .classes import HitBox
+from .dataprocessing import get_frames_potential
+from .voxel_util import scale_intdomain_to_realworld
+
+if TYPE_CHECKING:
+    from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup
+
+
+def get_online_path(s_path: str) -> str:
+    """
+    Path of the online reconstruction log, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+
+    Returns
+    -------
+    str
+        online reconstruction log path
+    """
+    return s_path[:-5] + "online.jsonl"
+
+
+def load_reconstruction_models(
+    mapper_path: str = "models/mapper.keras", vae_path: str = "models/vae_beta.keras"
+) -> Tuple:
+    """
+    Load the trained mapper and the decoder of the VAE.
+    TensorFlow is imported on the first call only.
+
+    Parameters
+    ----------
+    mapper_path : str, optional
+        saved mapper model, by default "models/mapper.keras"
+    vae_path : str, optional
+        saved VAE model, by default "models/vae_beta.keras"
+
+    Returns
+    -------
+    Tuple
+        mapper, decoder
+    """
+    import tensorflow as tf
+
+    mapper = tf.keras.models.load_model(mapper_path)
+    vae = tf.keras.models.load_model(vae_path)
+    return mapper, vae.decoder
+
+
+def voxel_center(voxels: np.ndarray, threshold: float = 0.5) -> Union[None, np.ndarray]:
+    """
+    Center of mass of the voxels above the threshold.
+
+    Parameters
+    ----------
+    voxels : np.ndarray
+        predicted voxel matrix (32, 32, 32)
+    threshold : float, optional
+        minimum voxel value, by default 0.5
+
+    Returns
+    -------
+    Union[None, np.ndarray]
+        voxel indices of the center, None if no voxel is above the threshold
+    """
+    weights = np.where(voxels > threshold, voxels, 0)
+    if np.sum(weights) == 0:
+        return None
+    indices = np.indices(voxels.shape).reshape(3, -1)
+    return indices @ weights.flatten() / np.sum(weights)
+
+
+class OnlineReconstructor:
+    """
+    Reconstructs the ball position in a background thread during the acquisition.
+
+    The measurement loop submits the bursts of each coordinate. The worker thread
+    subtracts the empty tank baseline, predicts the voxels with the mapper and the
+    VAE decoder and writes the predicted ball center next to the commanded one into
+    the 'online.jsonl'. The mean error of the last `window` coordinates is kept as
+    rolling error. If it exceeds `abort_error`, `abort_requested` is set and the
+    measurement loop stops after the current coordinate, so the run can be checked
+    and resumed later. A coordinate whose reconstruction raises is recorded in
+    `failures` and reported by the next `submit` and by `summary`.
+
+    Parameters
+    ----------
+    mapper
+        model that maps the potential vector to the latent space, e.g. keras model
+    decoder
+        model that maps the latent space to the voxels, e.g. keras model
+    baseline : np.ndarray
+        absolute empty tank potential vector, e.g. `load_baseline(l_path)["mean"]`
+    hitbox : HitBox
+        hitbox of the measurement, used for the voxel scaling
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    d : int, optional
+        voxel ball size of the training data, by default 4
+    window : int, optional
+        number of coordinates of the rolling error, by default 20
+    abort_error : Union[None, float], optional
+        rolling error [mm] that requests an abort, by default None
+    log_path : Union[None, str], optional
+        reconstruction log, by default None
+    """
+
+    def __init__(
+        self,
+        mapper,
+        decoder,
+        baseline: np.ndarray,
+        hitbox: HitBox,
+        ssms: "ScioSpecMeasurementSetup",
+        d: int = 4,
+        window: int = 20,
+        abort_error: Union[None, float] = None,
+        log_path: Union[None, str] = None,
+    ):
+        self.mapper = mapper
+        self.decoder = decoder
+        self.baseline = baseline
+        self.hitbox = hitbox
+        self.ssms = ssms
+        self.d = d
+        self.window = window
+        self.abort_error = abort_error
+        self.log_path = log_path
+        self.errors = deque(maxlen=window)
+        self.results = list()
+        self.failures = list()
+        self._reported = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        """
+        Process all submitted coordinates and stop the background thread.
+
+        Returns
+        -------
+        dict
+            see `summary`
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._report_failures()
+        summary = self.summary()
+        if summary["failed"]:
+            print(
+                f"Online reconstruction failed for {summary['failed']} of "
+                f"{summary['failed'] + summary['reconstructed']} coordinates."
+            )
+        return summary
+
+    def summary(self) -> dict:
+        """
+        Outcome of the online reconstruction so far.
+
+        Returns
+        -------
+        dict
+            number of "reconstructed" and "failed" coordinates, the
+            "rolling_error" [mm] and the "last_failure"
+        """
+        with self._lock:
+            return {
+                "reconstructed": len(self.results),
+                "failed": len(self.failures),
+                "rolling_error": float(np.mean(self.errors)) if self.errors else None,
+                "last_failure": self.failures[-1]["failure"] if self.failures else None,
+            }
+
+    def _report_failures(self) -> None:
+        with self._lock:
+            failures = self.failures[self._reported :]
+            self._reported = len(self.failures)
+        for failure in failures:
+            print(
+                f"Online reconstruction of coordinate {failure['coordinate_idx']} "
+                f"failed: {failure['failure']}"
+            )
+
+    def submit(self, coordinate_idx: int, coordinate: np.ndarray, bursts) -> None:
+        """
+        Queue the bursts of a coordinate, returns immediately.
+
+        Parameters
+        ----------
+        coordinate_idx : int
+            coordinate index
+        coordinate : np.ndarray
+            commanded ball position [mm]
+        bursts
+            SingleFrames of all bursts of the coordinate
+        """
+        self._report_failures()
+        self._queue.put((coordinate_idx, np.asarray(coordinate, dtype=float), bursts))
+
+    @property
+    def abort_requested(self) -> bool:
+        return self._abort.is_set()
+
+    @property
+    def rolling_error(self) -> float:
+        with self._lock:
+            if not self.errors:
+                return np.nan
+            return float(np.mean(self.errors))
+
+    def reconstruct(self, potentials: np.ndarray) -> np.ndarray:
+        """
+        Predict the ball centers of potential vectors.
+
+        Parameters
+        ----------
+        potentials : np.ndarray
+            complex potential vectors (n, n_exc * n_el)
+
+        Returns
+        -------
+        np.ndarray
+            ball centers [mm] (n, 3), NaN if no ball is predicted
+        """
+        phi = np.abs(potentials) - self.baseline
+        latent = self.mapper.predict(phi, verbose=0)
+        voxels = np.clip(self.decoder.predict(latent, verbose=0), 0, 1)
+        centers = np.full((phi.shape[0], 3), np.nan)
+        for idx, voxel in enumerate(voxels.reshape(phi.shape[0], 32, 32, 32)):
+            center = voxel_center(voxel)
+            if center is None:
+                continue
+            # voxel axes are (x, y, z), the scaling expects (y, x, z)
+            y_r, x_r, z_r = scale_intdomain_to_realworld(
+                (center[1], center[0], center[2]), self.hitbox, d=self.d
+            )
+            centers[idx] = x_r, y_r, z_r
+        return centers
+
+    def _process(self, item: tuple, log) -> None:
+        coordinate_idx, coordinate, bursts = item
+        potentials = np.array(
+            [get_frames_potential(frm, self.ssms, "vector") for frm in bursts]
+        )
+        centers = self.reconstruct(potentials)
+        if np.all(np.isnan(centers)):
+            center = np.full(3, np.nan)
+        else:
+            center = np.nanmean(centers, axis=0)
+        error = float(np.linalg.norm(center - coordinate))
+        result = {
+            "coordinate_idx": coordinate_idx,
+            "coordinate": coordinate.tolist(),
+            "predicted": [None if np.isnan(c) else float(c) for c in center],
+            "error": None if np.isnan(error) else error,
+        }
+        with self._lock:
+            self.results.append(result)
+            if not np.isnan(error):
+                self.errors.append(error)
+            rolling = float(np.mean(self.errors)) if self.errors else np.nan
+        result["rolling_error"] = None if np.isnan(rolling) else rolling
+        if log is not None:
+            log.write(json.dumps(result) + "\n")
+            log.flush()
+        if (
+            self.abort_error is not None
+            and len(self.errors) == self.window
+            and rolling > self.abort_error
+        ):
+            self._abort.set()
+
+    def _run(self) -> None:
+        log = open(self.log_path, "a") if self.log_path is not None else None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                try:
+                    self._process(item, log)
+                except Exception as error:
+                    # a failed coordinate must not stop the worker, it is
+                    # reported by `submit` and `summary`
+                    failure = {
+                        "coordinate_idx": item[0],
+                        "coordinate": item[1].tolist(),
+                        "failure": repr(error),
+                    }
+                    with self._lock:
+                        self.failures.append(failure)
+                    if log is not None:
+                        log.write(json.dumps(failure) + "\n")
+                        log.flush()
+        finally:
+            if log is not None:
+                log.close()
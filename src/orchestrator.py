@@ -0,0 +1,190 @@
+import asyncio
+import time
+from functools import partial
+from typing import List, Union
+
+from sciopy import connect_COM_port_usb_hs
+
+from .acquisition import measurement_loop
+from .classes import MeasurementRig
+from .journal import get_resume_state
+from .sciospec import SciospecSupervisor
+
+
+def rig_supervisor(rig: MeasurementRig) -> SciospecSupervisor:
+    """
+    Sciospec watchdog of a rig that reconnects to the device of this rig.
+
+    Parameters
+    ----------
+    rig : MeasurementRig
+        measurement rig
+
+    Returns
+    -------
+    SciospecSupervisor
+        supervisor of `rig.COM_Sciospec`, writing into the 'info.json' of the rig
+    """
+    connect = rig.connect
+    if connect is None:
+        connect = partial(connect_COM_port_usb_hs, url=rig.sciospec_url)
+    return SciospecSupervisor(
+        rig.COM_Sciospec,
+        rig.ssms,
+        connect=connect,
+        info_path=rig.s_path[:-5] + "info.json",
+    )
+
+
+async def run_rig(
+    rig: MeasurementRig,
+    settle_time: float = 3.0,
+    settle_threshold: Union[None, float] = None,
+) -> dict:
+    """
+    Run the measurement loop of a single rig in a worker thread. A lost Sciospec
+    connection is recovered on the device of this rig, see `rig_supervisor`.
+
+    Parameters
+    ----------
+    rig : MeasurementRig
+        measurement rig
+    settle_time : float, optional
+        waiting time after each movement [s], by default 3.0
+    settle_threshold : Union[None, float], optional
+        relative potential change for the adaptive settle time, by default None
+
+    Returns
+    -------
+    dict
+        duration [s], measured coordinates and samples of this run
+    """
+    finished, samples_start = get_resume_state(rig.s_path)
+    t_start = time.perf_counter()
+    rig.COM_Sciospec = await asyncio.to_thread(
+        measurement_loop,
+        rig.COM_Ender,
+        rig.enderstat,
+        rig.COM_Sciospec,
+        rig.ssms,
+        rig.s_path,
+        rig.coordinates,
+        rig.ball,
+        rig.tank,
+        rig.documentation,
+        settle_time=settle_time,
+        settle_threshold=settle_threshold,
+        supervisor=rig_supervisor(rig),
+    )
+    duration = time.perf_counter() - t_start
+    finished_end, samples_end = get_resume_state(rig.s_path)
+    return {
+        "duration": duration,
+        "coordinates": len(finished_end) - len(finished),
+        "samples": samples_end - samples_start,
+        "samples_per_hour": (samples_end - samples_start) / duration * 3600,
+    }
+
+
+async def orchestrate(
+    rigs: List[MeasurementRig],
+    settle_time: float = 3.0,
+    settle_threshold: Union[None, float] = None,
+    print_report: bool = True,
+) -> dict:
+    """
+    Run the coordinate lists of several rigs concurrently.
+    The blocking serial communication of every rig runs in its own worker thread,
+    the event loop only waits for the rigs. A failing rig does not stop the other
+    rigs, its exception is reported in the result.
+    Inside a notebook use `await orchestrate(rigs)`, in a script `run_rigs(rigs)`.
+
+    Parameters
+    ----------
+    rigs : List[MeasurementRig]
+        measurement rigs, each with its own save path and journal
+    settle_time : float, optional
+        waiting time after each movement [s], by default 3.0
+    settle_threshold : Union[None, float], optional
+        relative potential change for the adaptive settle time, by default None
+    print_report : bool, optional
+        print the throughput of each rig, by default True
+
+    Returns
+    -------
+    dict
+        results per rig and the aggregate throughput
+    """
+    names = [rig.name for rig in rigs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Rig names are not unique: {names}")
+    s_paths = [rig.s_path for rig in rigs]
+    if len(set(s_paths)) != len(s_paths):
+        raise ValueError(f"Rigs have to use separate save paths: {s_paths}")
+    urls = [rig.sciospec_url for rig in rigs if rig.connect is None]
+    if len(set(urls)) != len(urls):
+        raise ValueError(f"Rigs have to use separate Sciospec devices: {urls}")
+
+    t_start = time.perf_counter()
+    results = await asyncio.gather(
+        *[run_rig(rig, settle_time, settle_threshold) for rig in rigs],
+        return_exceptions=True,
+    )
+    duration = time.perf_counter() - t_start
+
+    per_rig = dict()
+    for rig, result in zip(rigs, results):
+        if isinstance(result, Exception):
+            per_rig[rig.name] = {"error": repr(result)}
+        else:
+            per_rig[rig.name] = result
+    samples = sum(res.get("samples", 0) for res in per_rig.values())
+    summary = {
+        "rigs": per_rig,
+        "duration": duration,
+        "samples": samples,
+        "samples_per_hour": samples / duration * 3600,
+    }
+
+    if print_report:
+        for name, res in per_rig.items():
+            if "error" in res:
+                print(f"{name}: failed with {res['error']}")
+            else:
+                print(
+                    f"{name}: {res['coordinates']} coordinates, {res['samples']} "
+                    f"samples, {res['samples_per_hour']:.0f} samples/h"
+                )
+        print(
+            f"total: {samples} samples in {duration:.1f} s, "
+            f"{summary['samples_per_hour']:.0f} samples/h"
+        )
+    return summary
+
+
+def run_rigs(
+    rigs: List[MeasurementRig],
+    settle_time: float = 3.0,
+    settle_threshold: Union[None, float] = None,
+    print_report: bool = True,
+) -> dict:
+    """
+    Blocking wrapper of `orchestrate` for scripts without a running event loop.
+
+    Parameters
+    ----------
+    rigs : List[MeasurementRig]
+        measurement rigs, each with its own save path and journal
+    settle_time : float, optional
+        waiting time after each movement [s], by default 3.0
+    settle_threshold : Union[None, float], optional
+        relative potential change for the adaptive settle time, by default None
+    print_report : bool, optional
+        print the throughput of each rig, by default True
+
+    Returns
+    -------
+    dict
+        results per rig and the aggregate throughput
+    """
+    return asyncio.run(orchestrate(rigs, settle_time, settle_threshold, print_report))
@@ -0,0 +1,364 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+import numpy as np
+
+from .dataprocessing import get_measured_potential
+
+
+def get_potential_stats_path(l_path: str) -> str:
+    """
+    Path of the persisted potential statistics, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        statistics path
+    """
+    return l_path + "potential_stats.npz"
+
+
+class ChannelStats:
+    """
+    Streaming statistics of every channel of a batch of vectors.
+
+    Mean and variance are updated per batch and merged with the parallel
+    algorithm of Chan et al., min and max are exact. Quantiles are estimated from a
+    fixed-edge histogram per channel, so the memory does not grow with the number
+    of samples and two instances with the same edges can be merged. The counts
+    are 32 bit, which is enough for 4e9 samples. With logarithmic edges the
+    quantiles have a constant relative error.
+
+    Parameters
+    ----------
+    n_channels : int
+        number of channels
+    edges : np.ndarray
+        histogram bin edges, values outside are counted in the outer bins
+    log : bool, optional
+        logarithmic edges, by default False
+    """
+
+    def __init__(self, n_channels: int, edges: np.ndarray, log: bool = False):
+        self.edges = np.asarray(edges, dtype=float)
+        self.log = log
+        self.n = 0
+        self.mean = np.zeros(n_channels)
+        self.m2 = np.zeros(n_channels)
+        self.min = np.full(n_channels, np.inf)
+        self.max = np.full(n_channels, -np.inf)
+        self.hist = np.zeros((n_channels, self.edges.shape[0] - 1), dtype=np.uint32)
+
+    @property
+    def var(self) -> np.ndarray:
+        return self.m2 / self.n if self.n > 0 else np.full(self.mean.shape, np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.var)
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Add a batch of vectors.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            batch with shape (n_samples, n_channels)
+        """
+        values = np.asarray(values, dtype=float)
+        if values.shape[0] == 0:
+            return
+        batch = ChannelStats(values.shape[1], self.edges, self.log)
+        batch.n = values.shape[0]
+        batch.mean = np.mean(values, axis=0)
+        batch.m2 = np.sum((values - batch.mean) ** 2, axis=0)
+        batch.min = np.min(values, axis=0)
+        batch.max = np.max(values, axis=0)
+        bins = np.searchsorted(self.edges, values, side="right") - 1
+        bins = np.clip(bins, 0, self.hist.shape[1] - 1)
+        channels = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+        np.add.at(batch.hist, (channels.ravel(), bins.ravel()), 1)
+        self.merge(batch)
+
+    def merge(self, other: "ChannelStats") -> None:
+        """
+        Merge the statistics of another instance with the same edges.
+
+        Parameters
+        ----------
+        other : ChannelStats
+            statistics of other samples
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Only statistics with the same histogram edges merge.")
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + delta**2 * self.n * other.n / n
+        self.n = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.hist += other.hist
+
+    def quantile(self, q: Union[float, np.ndarray]) -> np.ndarray:
+        """
+        Estimate quantiles of every channel from the histogram.
+
+        Parameters
+        ----------
+        q : Union[float, np.ndarray]
+            quantiles between 0 and 1
+
+        Returns
+        -------
+        np.ndarray
+            quantiles with shape (n_channels,) or (len(q), n_channels)
+        """
+        q = np.atleast_1d(q)
+        cdf = np.cumsum(self.hist, axis=1)
+        result = np.zeros((q.shape[0], self.hist.shape[0]))
+        for idx, qq in enumerate(q):
+            rank = qq * self.n
+            b = np.minimum(np.sum(cdf < rank, axis=1), self.hist.shape[1] - 1)
+            below = np.where(b > 0, cdf[np.arange(cdf.shape[0]), b - 1], 0)
+            count = self.hist[np.arange(cdf.shape[0]), b]
+            frac = np.where(count > 0, (rank - below) / np.maximum(count, 1), 0.5)
+            lo, hi = self.edges[b], self.edges[b + 1]
+            if self.log:
+                value = lo * (hi / lo) ** frac
+            else:
+                value = lo + (hi - lo) * frac
+            result[idx] = np.clip(value, self.min, self.max)
+        return result[0] if result.shape[0] == 1 else result
+
+    def to_dict(self, prefix: str) -> dict:
+        return {
+            f"{prefix}_{key}": np.asarray(getattr(self, key))
+            for key in ("n", "mean", "m2", "min", "max", "hist", "edges", "log")
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, prefix: str) -> "ChannelStats":
+        stats = cls(
+            data[f"{prefix}_mean"].shape[0],
+            data[f"{prefix}_edges"],
+            bool(data[f"{prefix}_log"]),
+        )
+        for key in ("mean", "m2", "min", "max"):
+            setattr(stats, key, np.array(data[f"{prefix}_{key}"]))
+        stats.hist = data[f"{prefix}_hist"].astype(stats.hist.dtype)
+        stats.n = int(data[f"{prefix}_n"])
+        return stats
+
+
+class PotentialStats:
+    """
+    Streaming statistics of the absolute value and the phase of every channel of
+    the potential vectors. Use the same persisted instance for the normalization
+    of the training and the inference data, e.g.
+    `tf.keras.layers.Normalization(mean=stats.abs.mean, variance=stats.abs.var)`.
+
+    Parameters
+    ----------
+    n_channels : int, optional
+        length of the potential vector, by default 4096
+    n_bins : int, optional
+        histogram bins for the quantiles, by default 512
+    abs_range : tuple, optional
+        range of the logarithmic |φ| bins [V], by default (1e-8, 10.0)
+    """
+
+    def __init__(
+        self,
+        n_channels: int = 4096,
+        n_bins: int = 512,
+        abs_range: tuple = (1e-8, 10.0),
+    ):
+        self.abs = ChannelStats(
+            n_channels,
+            np.geomspace(abs_range[0], abs_range[1], n_bins + 1),
+            log=True,
+        )
+        self.phase = ChannelStats(n_channels, np.linspace(-np.pi, np.pi, n_bins + 1))
+
+    @property
+    def n(self) -> int:
+        return self.abs.n
+
+    def update(self, potentials: np.ndarray) -> None:
+        """
+        Add a batch of complex potential vectors.
+
+        Parameters
+        ----------
+        potentials : np.ndarray
+            complex potentials with shape (n_samples, n_channels)
+        """
+        self.abs.update(np.abs(potentials))
+        self.phase.update(np.angle(potentials))
+
+    def merge(self, other: "PotentialStats") -> None:
+        self.abs.merge(other.abs)
+        self.phase.merge(other.phase)
+
+    def normalize(self, abs_potentials: np.ndarray) -> np.ndarray:
+        """
+        Standardize absolute potentials with the mean and standard deviation.
+
+        Parameters
+        ----------
+        abs_potentials : np.ndarray
+            absolute potentials with shape (n_samples, n_channels)
+
+        Returns
+        -------
+        np.ndarray
+            standardized potentials
+        """
+        std = np.where(self.abs.std > 0, self.abs.std, 1)
+        return (abs_potentials - self.abs.mean) / std
+
+    def save(self, path: str, **arrays) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(
+                file,
+                **self.abs.to_dict("abs"),
+                **self.phase.to_dict("phase"),
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PotentialStats":
+        data = np.load(path)
+        stats = cls.__new__(cls)
+        stats.abs = ChannelStats.from_dict(data, "abs")
+        stats.phase = ChannelStats.from_dict(data, "phase")
+        return stats
+
+
+def _stats_of_files(args: tuple) -> PotentialStats:
+    paths, n_channels, n_bins, abs_range, chunk_size = args
+    stats = PotentialStats(n_channels, n_bins, abs_range)
+    for start in range(0, len(paths), chunk_size):
+        potentials = list()
+        for path in paths[start : start + chunk_size]:
+            tmp = np.load(path, allow_pickle=True)
+            potentials.append(get_measured_potential(tmp, shape_type="vector"))
+        stats.update(np.array(potentials))
+    return stats
+
+
+def _sample_files(l_path: str) -> tuple:
+    paths = np.sort(glob.glob(l_path + "data/sample_*.npz"))
+    files = np.array([os.path.basename(path) for path in paths])
+    mtimes = np.array([os.path.getmtime(path) for path in paths])
+    return paths, files, mtimes
+
+
+def compute_potential_stats(
+    l_path: str,
+    n_workers: Union[None, int] = None,
+    chunk_size: int = 64,
+    n_bins: int = 512,
+    abs_range: tuple = (1e-8, 10.0),
+    save: bool = True,
+) -> PotentialStats:
+    """
+    Compute the potential statistics of all samples of a measurement in one pass.
+    The samples are split into one contiguous range per process, every worker
+    reads its range in chunks of `chunk_size` samples and returns the merged
+    statistics of the range, so only `n_workers` histograms are transferred.
+    The range statistics are merged in order. The sample file names and
+    modification times are saved with the statistics, see
+    `load_potential_stats`.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    n_workers : Union[None, int], optional
+        number of processes, 1 reads in this process, by default os.cpu_count()
+    chunk_size : int, optional
+        samples per batch update, by default 64
+    n_bins : int, optional
+        histogram bins for the quantiles, by default 512
+    abs_range : tuple, optional
+        range of the logarithmic |φ| bins [V], by default (1e-8, 10.0)
+    save : bool, optional
+        save the statistics as 'potential_stats.npz', by default True
+
+    Returns
+    -------
+    PotentialStats
+        potential statistics
+    """
+    paths, files, mtimes = _sample_files(l_path)
+    if paths.shape[0] == 0:
+        raise FileNotFoundError(f"No samples found at: {l_path}data/")
+    n_channels = get_measured_potential(
+        np.load(paths[0], allow_pickle=True), shape_type="vector"
+    ).shape[0]
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    n_ranges = max(1, min(n_workers, int(np.ceil(paths.shape[0] / chunk_size))))
+    jobs = [
+        (ranged, n_channels, n_bins, abs_range, chunk_size)
+        for ranged in np.array_split(paths, n_ranges)
+    ]
+    stats = PotentialStats(n_channels, n_bins, abs_range)
+    if n_ranges == 1:
+        stats.merge(_stats_of_files(jobs[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=n_ranges) as executor:
+            for range_stats in executor.map(_stats_of_files, jobs):
+                stats.merge(range_stats)
+    if save:
+        stats.save(get_potential_stats_path(l_path), files=files, mtimes=mtimes)
+    return stats
+
+
+def load_potential_stats(l_path: str, **kwargs) -> PotentialStats:
+    """
+    Load the persisted potential statistics of a measurement. They are
+    (re)computed if they do not exist, if sample files were added, removed or
+    modified since, or if `n_bins` or `abs_range` differ.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    kwargs
+        arguments of `compute_potential_stats`
+
+    Returns
+    -------
+    PotentialStats
+        potential statistics
+    """
+    path = get_potential_stats_path(l_path)
+    if os.path.isfile(path):
+        data = np.load(path)
+        _, files, mtimes = _sample_files(l_path)
+        edges = data["abs_edges"]
+        n_bins = kwargs.get("n_bins", edges.shape[0] - 1)
+        abs_range = kwargs.get("abs_range", (edges[0], edges[-1]))
+        if (
+            "files" in data
+            and np.array_equal(data["files"], files)
+            and np.array_equal(data["mtimes"], mtimes)
+            and n_bins == edges.shape[0] - 1
+            and np.allclose(abs_range, (edges[0], edges[-1]))
+        ):
+            return PotentialStats.load(path)
+    return compute_potential_stats(l_path, **kwargs)
@@ -0,0 +1,144 @@
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Union
+
+PROFILE_ENV = "EIT_PROFILE"
+_setting = os.environ.get(PROFILE_ENV, "")
+PROFILING_ENABLED = _setting.lower() not in ("", "0", "false", "no", "off")
+
+_stats = dict()
+_lock = threading.Lock()
+_atexit_registered = False
+
+
+def _bytes_read() -> Union[None, int]:
+    """Bytes read by this process so far, None where /proc/self/io is missing."""
+    try:
+        with open("/proc/self/io", "rb") as file:
+            for line in file:
+                if line.startswith(b"rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _profiled(func, name: str):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        rchar = _bytes_read()
+        t_start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - t_start
+            n_bytes = _bytes_read() - rchar if rchar is not None else 0
+            with _lock:
+                stats = _stats.setdefault(name, {"durations": list(), "bytes": 0})
+                stats["durations"].append(duration)
+                stats["bytes"] += n_bytes
+
+    return wrapper
+
+
+def profile_module(namespace: dict) -> None:
+    """
+    Wrap the public functions of a module with timing hooks if the environment
+    variable `EIT_PROFILE` is set. Call it at the end of the module with
+    `profile_module(globals())`, so calls inside the module and all later imports
+    of the functions are recorded. Without `EIT_PROFILE` nothing is wrapped.
+
+    `EIT_PROFILE=1` prints the report at exit, any other value (e.g.
+    `EIT_PROFILE=profile.json`) additionally saves it to that path.
+
+    Parameters
+    ----------
+    namespace : dict
+        module globals
+    """
+    global _atexit_registered
+    if not PROFILING_ENABLED:
+        return
+    module = namespace["__name__"]
+    prefix = module.rsplit(".", 1)[-1]
+    for name, obj in list(namespace.items()):
+        if (
+            inspect.isfunction(obj)
+            and obj.__module__ == module
+            and not name.startswith("_")
+        ):
+            namespace[name] = _profiled(obj, f"{prefix}.{name}")
+    if not _atexit_registered:
+        path = None if _setting.lower() in ("1", "true", "yes", "on") else _setting
+        atexit.register(profiling_report, path=path)
+        _atexit_registered = True
+
+
+def profiling_report(path: Union[None, str] = None, print_report: bool = True) -> dict:
+    """
+    Report of the profiled functions, sorted by the cumulative time. The times
+    of nested calls are included in the time of the caller. The bytes are all
+    bytes read by the process during the calls.
+
+    Parameters
+    ----------
+    path : Union[None, str], optional
+        save the report as json, by default None
+    print_report : bool, optional
+        print the report, by default True
+
+    Returns
+    -------
+    dict
+        per function the "calls", the "total_s", the "mean_ms", "p50_ms",
+        "p90_ms", "p99_ms" and "max_ms" wall time and the "bytes_read"
+    """
+    with _lock:
+        snapshot = {
+            name: (sorted(stats["durations"]), stats["bytes"])
+            for name, stats in _stats.items()
+        }
+
+    def percentile(durations: list, q: float) -> float:
+        return 1e3 * durations[min(int(q * len(durations)), len(durations) - 1)]
+
+    report = dict()
+    for name, (durations, n_bytes) in snapshot.items():
+        report[name] = {
+            "calls": len(durations),
+            "total_s": sum(durations),
+            "mean_ms": 1e3 * sum(durations) / len(durations),
+            "p50_ms": percentile(durations, 0.5),
+            "p90_ms": percentile(durations, 0.9),
+            "p99_ms": percentile(durations, 0.99),
+            "max_ms": 1e3 * durations[-1],
+            "bytes_read": n_bytes,
+        }
+    report = dict(sorted(report.items(), key=lambda item: -item[1]["total_s"]))
+
+    if path is not None:
+        with open(path, "w") as file:
+            json.dump(report, file, indent=4)
+    if print_report and report:
+        print(
+            f"{'function':<44}{'calls':>8}{'total s':>10}{'p50 ms':>10}"
+            f"{'p90 ms':>10}{'p99 ms':>10}{'MB read':>10}"
+        )
+        for name, res in report.items():
+            print(
+                f"{name:<44}{res['calls']:>8}{res['total_s']:>10.3f}"
+                f"{res['p50_ms']:>10.2f}{res['p90_ms']:>10.2f}{res['p99_ms']:>10.2f}"
+                f"{res['bytes_read'] / 1e6:>10.2f}"
+            )
+    return report
+
+
+def reset_profiling() -> None:
+    """Clear the recorded calls."""
+    with _lock:
+        _stats.clear()
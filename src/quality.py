@@ -0,0 +1,304 @@
+import os
+from typing import Tuple, Union
+
+import numpy as np
+
+from .dataprocessing import load_run
+
+
+def get_qa_mask_path(l_path: str) -> str:
+    """
+    Path of the quality mask, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    str
+        quality mask path
+    """
+    return l_path + "qa_mask.npz"
+
+
+def robust_outliers(
+    score: np.ndarray, z_threshold: float = 6.0, min_scale: float = 0.0
+) -> np.ndarray:
+    """
+    Flag scores far above the median, measured in median absolute deviations.
+    The scale is floored by `min_scale`, so a score distribution that is tighter
+    than the expected tolerance of the check does not turn small deviations into
+    outliers.
+
+    Parameters
+    ----------
+    score : np.ndarray
+        deviation score of each sample
+    z_threshold : float, optional
+        threshold of the robust z-score, by default 6.0
+    min_scale : float, optional
+        lower bound of the scale, by default 0.0
+
+    Returns
+    -------
+    np.ndarray
+        outlier flags
+    """
+    finite = np.isfinite(score)
+    if not np.any(finite):
+        return ~finite
+    median = np.median(score[finite])
+    mad = 1.4826 * np.median(np.abs(score[finite] - median))
+    mad = max(mad, min_scale, np.finfo(float).eps * max(abs(median), 1.0))
+    return ~finite | ((score - median) / mad > z_threshold)
+
+
+def _coordinate_medians(
+    abs_potentials: np.ndarray, coordinates: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    unique, inverse = np.unique(coordinates, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(unique.shape[0] + 1))
+    median = np.zeros((unique.shape[0], abs_potentials.shape[1]))
+    for group in range(unique.shape[0]):
+        rows = order[bounds[group] : bounds[group + 1]]
+        median[group] = np.nanmedian(abs_potentials[rows], axis=0)
+    return unique, inverse, median
+
+
+def burst_deviation(abs_potentials: np.ndarray, coordinates: np.ndarray) -> np.ndarray:
+    """
+    Relative deviation of each sample from the median of all bursts measured at
+    the same coordinate.
+
+    Parameters
+    ----------
+    abs_potentials : np.ndarray
+        absolute potentials (n_samples, n_potentials)
+    coordinates : np.ndarray
+        ball positions (n_samples, 3)
+
+    Returns
+    -------
+    np.ndarray
+        relative deviation of each sample
+    """
+    _, inverse, median = _coordinate_medians(abs_potentials, coordinates)
+    median = median[inverse]
+    return np.linalg.norm(abs_potentials - median, axis=1) / np.linalg.norm(
+        median, axis=1
+    )
+
+
+def neighbour_deviation(
+    abs_potentials: np.ndarray,
+    coordinates: np.ndarray,
+    k: int = 6,
+    chunk_size: int = 256,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Relative deviation of the burst median of each coordinate from the inverse
+    distance weighted burst medians of the `k` nearest coordinates. The nearest
+    coordinates come from a `scipy.spatial.cKDTree`, the prediction is
+    computed in chunks of `chunk_size` coordinates.
+
+    The deviation is returned together with the relative neighbour contrast,
+    the mean difference between the burst median of a coordinate and the ones
+    of its neighbours. It is the change of the potentials over one grid step
+    and therefore the tolerance that an interpolation of a well measured
+    coordinate can be expected to meet, e.g. at the border of the grid where
+    the prediction extrapolates.
+
+    Parameters
+    ----------
+    abs_potentials : np.ndarray
+        absolute potentials (n_samples, n_potentials)
+    coordinates : np.ndarray
+        ball positions (n_samples, 3)
+    k : int, optional
+        number of neighbours, by default 6
+    chunk_size : int, optional
+        coordinates per chunk, by default 256
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        relative deviation and relative neighbour contrast of each sample, NaN
+        for less than two coordinates
+    """
+    unique, inverse, median = _coordinate_medians(abs_potentials, coordinates)
+    if unique.shape[0] < 2:
+        nan = np.full(abs_potentials.shape[0], np.nan)
+        return nan, nan.copy()
+
+    from scipy.spatial import cKDTree
+
+    k = min(k, unique.shape[0] - 1)
+    dist, neighbours = cKDTree(unique).query(unique, k=k + 1)
+    # the first neighbour is the coordinate itself
+    dist, neighbours = dist[:, 1:], neighbours[:, 1:]
+    weights = 1 / np.maximum(dist, np.finfo(float).eps)
+    weights /= np.sum(weights, axis=1, keepdims=True)
+
+    deviation = np.zeros(unique.shape[0])
+    contrast = np.zeros(unique.shape[0])
+    for start in range(0, unique.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        neighbour_median = median[neighbours[chunk]]
+        prediction = np.einsum("nk,nkp->np", weights[chunk], neighbour_median)
+        norm = np.linalg.norm(prediction, axis=1)
+        deviation[chunk] = np.linalg.norm(median[chunk] - prediction, axis=1) / norm
+        difference = np.linalg.norm(neighbour_median - median[chunk, None, :], axis=2)
+        contrast[chunk] = np.mean(difference, axis=1) / norm
+    return deviation[inverse], contrast[inverse]
+
+
+def quality_check(
+    l_path: str,
+    z_threshold: float = 6.0,
+    k: int = 6,
+    adc_range: float = 1.0,
+    saturation: float = 0.99,
+    temperature_range: tuple = (15.0, 35.0),
+    neighbour_tolerance: float = 1.0,
+    run: Union[None, dict] = None,
+    n_workers: Union[None, int] = None,
+    save: bool = True,
+) -> dict:
+    """
+    Flag glitched samples of a measurement and write the quality mask.
+    A sample is flagged if its potentials deviate from the other bursts of the
+    same coordinate or if its coordinate deviates from the neighbouring
+    coordinates (robust z-score above `z_threshold`), if a channel group is
+    missing, if a channel is close to the ADC range or if the temperature is out
+    of range. The scale of the neighbour z-score is floored by the median
+    neighbour contrast times `neighbour_tolerance`, see `neighbour_deviation`.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+    z_threshold : float, optional
+        threshold of the robust z-scores, by default 6.0
+    k : int, optional
+        number of neighbouring coordinates, by default 6
+    adc_range : float, optional
+        ADC range of the measurement [V], by default 1.0
+    saturation : float, optional
+        fraction of the ADC range that counts as saturated, by default 0.99
+    temperature_range : tuple, optional
+        valid temperature range [°C], by default (15.0, 35.0)
+    neighbour_tolerance : float, optional
+        floor of the neighbour score scale in units of the median neighbour
+        contrast, by default 1.0
+    run : Union[None, dict], optional
+        already loaded run, see `load_run`, by default None
+    n_workers : Union[None, int], optional
+        number of processes that load the run, by default os.cpu_count()
+    save : bool, optional
+        save the mask as 'qa_mask.npz', by default True
+
+    Returns
+    -------
+    dict
+        "valid" mask, the flags and scores of every check and the sample indices
+    """
+    if run is None:
+        run = load_run(l_path, n_workers=n_workers)
+    abs_potentials = np.abs(run["potentials"])
+    # n_el excitations with n_el channels each
+    n_exc = int(np.sqrt(run["potentials"].shape[1]))
+
+    burst_score = burst_deviation(abs_potentials, run["coordinates"])
+    neighbour_score, neighbour_contrast = neighbour_deviation(
+        abs_potentials, run["coordinates"], k
+    )
+    finite = np.isfinite(neighbour_contrast)
+    neighbour_scale = (
+        neighbour_tolerance * np.median(neighbour_contrast[finite])
+        if np.any(finite)
+        else 0.0
+    )
+    qa = {
+        "indices": run["indices"],
+        "burst_score": burst_score,
+        "neighbour_score": neighbour_score,
+        "neighbour_contrast": neighbour_contrast,
+        "burst_outlier": robust_outliers(burst_score, z_threshold),
+        "neighbour_outlier": robust_outliers(
+            neighbour_score, z_threshold, neighbour_scale
+        )
+        & np.isfinite(neighbour_score),
+        "missing_channel_group": np.any(run["group_counts"] < n_exc, axis=1)
+        | np.any(np.isnan(run["potentials"]), axis=1),
+        "saturated": np.any(
+            np.maximum(np.abs(run["potentials"].real), np.abs(run["potentials"].imag))
+            >= saturation * adc_range,
+            axis=1,
+        ),
+        "temperature_out_of_range": ~(
+            (run["temperatures"] >= temperature_range[0])
+            & (run["temperatures"] <= temperature_range[1])
+        ),
+    }
+    flags = [
+        "burst_outlier",
+        "neighbour_outlier",
+        "missing_channel_group",
+        "saturated",
+        "temperature_out_of_range",
+    ]
+    qa["valid"] = ~np.any([qa[key] for key in flags], axis=0)
+
+    if save:
+        path = get_qa_mask_path(l_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **qa)
+        os.replace(tmp_path, path)
+    print(
+        f"{np.sum(~qa['valid'])} of {qa['valid'].shape[0]} samples flagged: "
+        + ", ".join(f"{key} {np.sum(qa[key])}" for key in flags)
+    )
+    return qa
+
+
+def load_qa_mask(l_path: str) -> dict:
+    """
+    Load the quality mask of a measurement.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    dict
+        quality mask, see `quality_check`
+    """
+    return dict(np.load(get_qa_mask_path(l_path)))
+
+
+def valid_sample_indices(l_path: str) -> np.ndarray:
+    """
+    Indices of the samples that passed the quality check. Without a quality mask
+    all samples are returned.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory
+
+    Returns
+    -------
+    np.ndarray
+        valid sample indices
+    """
+    if not os.path.isfile(get_qa_mask_path(l_path)):
+        return np.arange(len(os.listdir(l_path + "data/")))
+    qa = load_qa_mask(l_path)
+    return qa["indices"][qa["valid"]]
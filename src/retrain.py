@@ -0,0 +1,533 @@
+import glob
+import json
+import os
+from datetime import datetime
+from typing import Union
+
+import numpy as np
+
+from .baseline import load_baseline
+from .classes import HitBox
+from .dataprocessing import load_run
+from .linear_model import voxel_targets
+from .quality import valid_sample_indices
+from .voxel_util import read_json_file
+
+
+def get_manifest_path(s_path: str) -> str:
+    """
+    Path of the dataset manifest of a mapper model directory.
+
+    Parameters
+    ----------
+    s_path : str
+        model directory, e.g. "models/mapper/"
+
+    Returns
+    -------
+    str
+        manifest path
+    """
+    return s_path + "manifest.json"
+
+
+def get_mapper_path(s_path: str, version: int) -> str:
+    return s_path + "mapper_v{0:03d}.keras".format(version)
+
+
+def get_normalization_path(s_path: str, version: int) -> str:
+    return s_path + "normalization_v{0:03d}.npz".format(version)
+
+
+def get_dataset_path(s_path: str, run: str) -> str:
+    return s_path + "data/" + run + ".npz"
+
+
+def run_name(l_path: str) -> str:
+    """Name of a measurement in the manifest, the measurement directory name."""
+    return os.path.basename(os.path.normpath(l_path))
+
+
+def load_manifest(s_path: str) -> dict:
+    """
+    Load the dataset manifest of a mapper model directory.
+
+    Parameters
+    ----------
+    s_path : str
+        model directory
+
+    Returns
+    -------
+    dict
+        "runs" per ingested measurement its path, dataset and sample count,
+        "versions" the trained model versions, empty if no model exists
+    """
+    path = get_manifest_path(s_path)
+    if not os.path.isfile(path):
+        return {"runs": dict(), "versions": list()}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def save_manifest(s_path: str, manifest: dict) -> None:
+    path = get_manifest_path(s_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(tmp_path, path)
+
+
+def merge_moments(
+    count: int, mean: np.ndarray, var: np.ndarray, phi: np.ndarray
+) -> tuple:
+    """
+    Update the per channel count, mean and variance with new samples, like a
+    `tf.keras.layers.Normalization` adapted on all samples.
+
+    Parameters
+    ----------
+    count : int
+        number of samples so far
+    mean : np.ndarray
+        mean so far
+    var : np.ndarray
+        population variance so far
+    phi : np.ndarray
+        new samples (n_samples, n_channels)
+
+    Returns
+    -------
+    tuple
+        count, mean and variance of all samples
+    """
+    n_new = phi.shape[0]
+    mean_new = np.mean(phi, axis=0)
+    var_new = np.var(phi, axis=0)
+    if count == 0:
+        return n_new, mean_new, var_new
+    total = count + n_new
+    delta = mean_new - mean
+    mean = mean + delta * n_new / total
+    var = (count * var + n_new * var_new + delta**2 * count * n_new / total) / total
+    return total, mean, var
+
+
+def ingest_run(
+    s_path: str,
+    l_path: str,
+    encoder,
+    d: int = 4,
+    qa: bool = False,
+    batch_size: int = 256,
+) -> dict:
+    """
+    Decode the samples of a measurement that are not in its dataset yet and add
+    them. The dataset holds the baseline subtracted |φ| and the latent vectors of
+    the voxel balls of the ball positions, the mean of the VAE encoder.
+
+    Parameters
+    ----------
+    s_path : str
+        model directory
+    l_path : str
+        measurement directory
+    encoder
+        VAE encoder, e.g. `vae.encoder`
+    d : int, optional
+        voxel ball size of the VAE training data, by default 4
+    qa : bool, optional
+        only use samples that passed `quality_check`, by default False
+    batch_size : int, optional
+        voxel balls per encoder call, by default 256
+
+    Returns
+    -------
+    dict
+        "phi" (n, n_potentials), "latent" (n, latent_dim), "coordinates" (n, 3)
+        [mm] and the sample "indices" of the complete dataset, new samples are
+        appended
+    """
+    path = get_dataset_path(s_path, run_name(l_path))
+    if os.path.isfile(path):
+        dataset = dict(np.load(path))
+    else:
+        dataset = None
+    if qa:
+        indices = valid_sample_indices(l_path)
+    else:
+        indices = np.arange(len(glob.glob(l_path + "data/sample_*.npz")))
+    if dataset is not None:
+        indices = np.setdiff1d(indices, dataset["indices"])
+        if len(indices) == 0:
+            return dataset
+    elif len(indices) == 0:
+        raise FileNotFoundError(f"No samples found at: {l_path}data/")
+
+    run = load_run(l_path, indices)
+    phi = np.abs(run["potentials"]) - load_baseline(l_path)["mean"]
+    hitbox = HitBox(**read_json_file(l_path + "info.json")["HitBox"])
+    latent = list()
+    for start in range(0, len(indices), batch_size):
+        gamma = voxel_targets(run["coordinates"][start : start + batch_size], hitbox, d)
+        z_mean, _, _ = encoder.predict(
+            gamma.reshape(-1, 32, 32, 32, 1).astype(np.float32), verbose=0
+        )
+        latent.append(z_mean)
+    added = {
+        "phi": phi.astype(np.float32),
+        "latent": np.concatenate(latent).astype(np.float32),
+        "coordinates": run["coordinates"],
+        "indices": run["indices"],
+    }
+    if dataset is not None:
+        added = {key: np.concatenate([dataset[key], added[key]]) for key in added}
+
+    os.makedirs(s_path + "data/", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(file, **added)
+    os.replace(tmp_path, path)
+    return added
+
+
+def build_mapper(input_dim: int = 4096, latent_dim: int = 8):
+    """
+    Mapper of the '3d_vae.ipynb', a dense network from the normalized |φ| to the
+    latent space of the VAE.
+
+    Parameters
+    ----------
+    input_dim : int, optional
+        length of the potential vector, by default 4096
+    latent_dim : int, optional
+        latent dimension of the VAE, by default 8
+
+    Returns
+    -------
+    tf.keras.Model
+        mapper
+    """
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    mapper_inputs = layers.Input(shape=(input_dim,))
+    x = layers.Normalization()(mapper_inputs)
+    x = layers.Dense(units=128, activation="relu")(x)
+    x = layers.Dense(units=64, activation="relu")(x)
+    x = layers.Dense(units=32, activation="relu")(x)
+    x = layers.Dense(units=16, activation="relu")(x)
+    x = layers.Dense(latent_dim, activation="linear")(x)
+    return tf.keras.Model(mapper_inputs, x)
+
+
+def _normalization_layer(mapper):
+    import tensorflow as tf
+
+    for layer in mapper.layers:
+        if isinstance(layer, tf.keras.layers.Normalization):
+            return layer
+    raise ValueError("The mapper has no Normalization layer.")
+
+
+def _weight_name(weight) -> str:
+    return weight.name.split("/")[-1].split(":")[0]
+
+
+def get_normalization(mapper) -> tuple:
+    """
+    State of the `Normalization` layer of a mapper, e.g. of a base mapper that
+    was adapted in '3d_vae.ipynb'.
+
+    Parameters
+    ----------
+    mapper
+        keras mapper with an adapted `Normalization` layer
+
+    Returns
+    -------
+    tuple
+        count, per channel mean and variance
+    """
+    layer = _normalization_layer(mapper)
+    values = {_weight_name(weight): weight.numpy() for weight in layer.weights}
+    if not {"mean", "variance", "count"} <= set(values):
+        raise ValueError("The Normalization layer of the mapper is not adapted.")
+    return (
+        int(values["count"]),
+        values["mean"].reshape(-1),
+        values["variance"].reshape(-1),
+    )
+
+
+def set_normalization(mapper, count: int, mean: np.ndarray, var: np.ndarray) -> None:
+    """
+    Overwrite the state of the `Normalization` layer of a mapper, instead of
+    adapting it on all samples again.
+
+    Parameters
+    ----------
+    mapper
+        keras mapper with a `Normalization` layer
+    count : int
+        number of samples
+    mean : np.ndarray
+        per channel mean
+    var : np.ndarray
+        per channel variance
+    """
+    layer = _normalization_layer(mapper)
+    values = {"mean": mean, "variance": var, "count": count}
+    for weight in layer.weights:
+        name = _weight_name(weight)
+        if name in values:
+            weight.assign(np.reshape(values[name], weight.shape))
+    layer.finalize_state()
+
+
+def _concat_datasets(datasets: list, n_potentials: int, latent_dim: int) -> tuple:
+    if not datasets:
+        return np.zeros((0, n_potentials), np.float32), np.zeros((0, latent_dim))
+    phi = np.concatenate([dataset["phi"] for dataset in datasets])
+    latent = np.concatenate([dataset["latent"] for dataset in datasets])
+    return phi, latent
+
+
+def retrain_mapper(
+    s_path: str,
+    runs: list,
+    vae_path: str = "models/vae_beta.keras",
+    base_mapper: Union[None, str] = None,
+    base_runs: Union[None, list] = None,
+    epochs: int = 20,
+    initial_epochs: int = 150,
+    replay_ratio: float = 1.0,
+    batch_size: int = 100,
+    learning_rate: float = 1e-4,
+    validation_split: float = 0.05,
+    d: int = 4,
+    qa: bool = False,
+    seed: int = 0,
+) -> dict:
+    """
+    Incremental warm start training of the mapper. Only the samples that are not
+    in the manifest of `s_path` are decoded, the normalization statistics are
+    updated with them and the previous mapper version is fine-tuned. Every epoch
+    sees all new samples and a fresh random replay sample of the old ones, so
+    the old runs are not forgotten. The model is saved as a new version together
+    with its normalization and the runs it saw.
+
+    Without a previous version the mapper is `base_mapper` (e.g. the mapper of
+    '3d_vae.ipynb') or a new `build_mapper`, which is trained from scratch for
+    `initial_epochs` with the default learning rate. A base mapper keeps the
+    normalization statistics of its `Normalization` layer, and the runs it was
+    trained on have to be passed as `base_runs`. They are ingested as old samples
+    for the replay, without them the fine-tuning would forget the base runs, so
+    they are only optional with `replay_ratio=0`.
+
+    Parameters
+    ----------
+    s_path : str
+        model directory, e.g. "models/mapper/"
+    runs : list
+        measurement directories, ingested ones are skipped
+    vae_path : str, optional
+        saved VAE model, by default "models/vae_beta.keras"
+    base_mapper : Union[None, str], optional
+        saved mapper of the first version, by default a new mapper
+    base_runs : Union[None, list], optional
+        measurement directories the base mapper was trained on, by default None
+    epochs : int, optional
+        fine-tuning epochs, by default 20
+    initial_epochs : int, optional
+        epochs of a new mapper, by default 150
+    replay_ratio : float, optional
+        old samples per new sample and epoch, by default 1.0
+    batch_size : int, optional
+        batch size, by default 100
+    learning_rate : float, optional
+        Adam learning rate of the fine-tuning, by default 1e-4
+    validation_split : float, optional
+        held out fraction of the new samples, by default 0.05
+    d : int, optional
+        voxel ball size of the VAE training data, by default 4
+    qa : bool, optional
+        only use samples that passed `quality_check`, by default False
+    seed : int, optional
+        random seed of the split and the replay, by default 0
+
+    Returns
+    -------
+    dict
+        version record of the manifest, the latest one if there was no new data
+    """
+    import tensorflow as tf
+
+    os.makedirs(s_path, exist_ok=True)
+    manifest = load_manifest(s_path)
+    versions = manifest["versions"]
+    use_base = not versions and base_mapper is not None
+    if use_base and not base_runs and replay_ratio > 0:
+        raise ValueError(
+            "Pass the runs of the base mapper as base_runs for the replay, "
+            "or fine-tune without replay (replay_ratio=0)."
+        )
+    encoder = tf.keras.models.load_model(vae_path).encoder
+    rng = np.random.default_rng(seed)
+
+    def ingest(l_path: str) -> tuple:
+        name = run_name(l_path)
+        known = manifest["runs"].get(name)
+        if known is not None and os.path.abspath(known["l_path"]) != os.path.abspath(
+            l_path
+        ):
+            raise ValueError(f"A different run named {name} is in the manifest.")
+        return name, known, ingest_run(s_path, l_path, encoder, d, qa)
+
+    def register(name: str, l_path: str, dataset: dict) -> None:
+        manifest["runs"][name] = {
+            "l_path": l_path,
+            "dataset": get_dataset_path(s_path, name),
+            "n_samples": int(dataset["phi"].shape[0]),
+        }
+
+    if use_base:
+        # the base runs are old samples, the base mapper has already seen them
+        for l_path in base_runs or []:
+            name, _, dataset = ingest(l_path)
+            register(name, l_path, dataset)
+
+    new_phi, new_latent, new_runs = list(), list(), dict()
+    for l_path in runs:
+        name, known, dataset = ingest(l_path)
+        # samples the manifest does not know, also those of an interrupted call
+        n_new = dataset["phi"].shape[0] - (known["n_samples"] if known else 0)
+        if n_new == 0:
+            continue
+        new_phi.append(dataset["phi"][-n_new:])
+        new_latent.append(dataset["latent"][-n_new:])
+        new_runs[name] = n_new
+        register(name, l_path, dataset)
+    if not new_runs:
+        print("No new samples, the mapper is up to date.")
+        return versions[-1] if versions else dict()
+    phi_new = np.concatenate(new_phi)
+    latent_new = np.concatenate(new_latent)
+
+    # old samples: everything in the manifest before this ingestion
+    old_datasets = list()
+    for name, info in manifest["runs"].items():
+        dataset = np.load(info["dataset"])
+        n_old = info["n_samples"] - new_runs.get(name, 0)
+        if n_old > 0:
+            old_datasets.append(
+                {key: dataset[key][:n_old] for key in ("phi", "latent")}
+            )
+    phi_old, latent_old = _concat_datasets(
+        old_datasets, phi_new.shape[1], latent_new.shape[1]
+    )
+
+    if versions:
+        parent = versions[-1]
+        mapper = tf.keras.models.load_model(get_mapper_path(s_path, parent["version"]))
+        norm = np.load(get_normalization_path(s_path, parent["version"]))
+        count, mean, var = int(norm["count"]), norm["mean"], norm["variance"]
+    else:
+        parent = None
+        if use_base:
+            mapper = tf.keras.models.load_model(base_mapper)
+            count, mean, var = get_normalization(mapper)
+        else:
+            mapper = build_mapper(phi_new.shape[1], latent_new.shape[1])
+            epochs, learning_rate = initial_epochs, 1e-3
+            count, mean, var = 0, None, None
+
+    # hold out a part of the new samples and a fixed part of the old ones
+    order = rng.permutation(phi_new.shape[0])
+    n_val = int(round(validation_split * phi_new.shape[0]))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+    old_order = rng.permutation(phi_old.shape[0])
+    old_val, old_train = old_order[:n_val], old_order[n_val:]
+
+    def mse(phi: np.ndarray, latent: np.ndarray) -> Union[None, float]:
+        if phi.shape[0] == 0:
+            return None
+        return float(np.mean((mapper.predict(phi, verbose=0) - latent) ** 2))
+
+    old_mse_before = mse(phi_old[old_val], latent_old[old_val])
+    count, mean, var = merge_moments(count, mean, var, phi_new)
+    set_normalization(mapper, count, mean, var)
+    mapper.compile(
+        tf.keras.optimizers.Adam(learning_rate),
+        loss=tf.keras.losses.mean_squared_error,
+    )
+    n_replay = min(int(round(replay_ratio * train_idx.shape[0])), old_train.shape[0])
+    loss = list()
+    for _ in range(epochs):
+        replay = rng.choice(old_train, n_replay, replace=False)
+        history = mapper.fit(
+            np.concatenate([phi_new[train_idx], phi_old[replay]]),
+            np.concatenate([latent_new[train_idx], latent_old[replay]]),
+            epochs=1,
+            batch_size=batch_size,
+            shuffle=True,
+            verbose=0,
+        )
+        loss.append(float(history.history["loss"][-1]))
+
+    version = versions[-1]["version"] + 1 if versions else 1
+    mapper.save(get_mapper_path(s_path, version))
+    np.savez(
+        get_normalization_path(s_path, version), count=count, mean=mean, variance=var
+    )
+    record = {
+        "version": version,
+        "parent": parent["version"] if parent is not None else None,
+        "base_mapper": base_mapper if parent is None else parent["base_mapper"],
+        "timestamp": datetime.now().strftime("%d_%m_%Y_%Hh_%Mm_%Ss"),
+        "model": os.path.basename(get_mapper_path(s_path, version)),
+        "normalization": os.path.basename(get_normalization_path(s_path, version)),
+        "runs": {name: info["n_samples"] for name, info in manifest["runs"].items()},
+        "new_samples": new_runs,
+        "train_samples": int(train_idx.shape[0]),
+        "replay_samples_per_epoch": int(n_replay),
+        "epochs": epochs,
+        "learning_rate": learning_rate,
+        "loss": loss,
+        "val_new_mse": mse(phi_new[val_idx], latent_new[val_idx]),
+        "val_old_mse_before": old_mse_before,
+        "val_old_mse": mse(phi_old[old_val], latent_old[old_val]),
+    }
+    versions.append(record)
+    save_manifest(s_path, manifest)
+    print(
+        f"Saved mapper version {version}: {sum(new_runs.values())} new and "
+        f"{n_replay} replayed samples per epoch, loss {loss[-1]:.4f}"
+    )
+    return record
+
+
+def load_mapper(s_path: str, version: Union[None, int] = None):
+    """
+    Load a mapper version of a model directory.
+
+    Parameters
+    ----------
+    s_path : str
+        model directory
+    version : Union[None, int], optional
+        model version, by default the latest
+
+    Returns
+    -------
+    tf.keras.Model
+        mapper
+    """
+    import tensorflow as tf
+
+    versions = load_manifest(s_path)["versions"]
+    if not versions:
+        raise FileNotFoundError(f"No mapper found at: {s_path}")
+    if version is None:
+        version = versions[-1]["version"]
+    return tf.keras.models.load_model(get_mapper_path(s_path, version))
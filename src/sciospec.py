@@ -3,19 +3,605 @@ try:
 except ImportError:
     print("Could not import module: serial")
 
+import json
+import os
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Callable, Tuple, Union
+
+import numpy as np
 from sciopy import (
     StartStopMeasurement_usb_hs,
+    SystemMessageCallback_usb_hs,
+    connect_COM_port_usb_hs,
     del_hex_in_list,
     reshape_full_message_in_bursts,
+    set_measurement_config_usb_hs,
     split_bursts_in_frames,
 )
 
 from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup
 
+from .tracing import NullTracer, Tracer
 
-def sciospec_measurement(COM_Sciospec, ssms: ScioSpecMeasurementSetup) -> None:
-    measurement_data_hex = StartStopMeasurement_usb_hs(COM_Sciospec)
-    measurement_data = del_hex_in_list(measurement_data_hex)
-    split_measurement_data = reshape_full_message_in_bursts(measurement_data, ssms)
-    measurement_data = split_bursts_in_frames(split_measurement_data, ssms)
+# layout of a single 140 byte measurement frame
+FRAME_DTYPE = np.dtype(
+    [
+        ("start_tag", "u1"),
+        ("length", "u1"),
+        ("channel_group", "u1"),
+        ("excitation_stgs", "u1", (2,)),
+        ("frequency_row", "u1", (2,)),
+        ("timestamp", ">u4"),
+        ("channels", ">f4", (16, 2)),
+        ("end_tag", "u1"),
+    ]
+)
+# bytes whose hex notation contains a "1", like sciopy compares the hex strings
+_HEX_CONTAINS_1 = np.array(["1" in format(val, "x") for val in range(256)])
+# command acknowledge system message
+ACK = [0x18, 0x01, 0x83, 0x18]
+
+
+def sciospec_measurement(
+    COM_Sciospec, ssms: ScioSpecMeasurementSetup, tracer: Tracer = NullTracer()
+) -> None:
+    """
+    Start and stop a measurement and parse the received bursts.
+
+    Parameters
+    ----------
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    tracer : Tracer, optional
+        records the timing of each stage, by default NullTracer()
+
+    Returns
+    -------
+    np.ndarray
+        SingleFrames with shape (burst_count, n_frames)
+    """
+    with tracer.span("measurement"):
+        measurement_data_hex = StartStopMeasurement_usb_hs(COM_Sciospec)
+    with tracer.span("hex_strip"):
+        measurement_data = del_hex_in_list(measurement_data_hex)
+    with tracer.span("reshape_bursts"):
+        split_measurement_data = reshape_full_message_in_bursts(measurement_data, ssms)
+    with tracer.span("split_frames"):
+        measurement_data = split_bursts_in_frames(split_measurement_data, ssms)
     return measurement_data
+
+
+def set_burst_count_usb_hs(COM_Sciospec, burst_count: int) -> None:
+    """
+    Set only the burst count of the Sciospec device, the remaining measurement
+    configuration is kept.
+
+    Parameters
+    ----------
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+    burst_count : int
+        number of bursts between the start and stop command
+    """
+    COM_Sciospec.write_data(
+        bytearray([0xB0, 0x03, 0x02, burst_count >> 8, burst_count & 0xFF, 0xB0])
+    )
+
+
+def StartStopMeasurement_raw_usb_hs(COM_Sciospec) -> bytearray:
+    """
+    Start and stop the measurement and return the raw message buffer.
+    Same as `StartStopMeasurement_usb_hs`, without the conversion of every byte
+    into a hex string.
+
+    Parameters
+    ----------
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+
+    Returns
+    -------
+    bytearray
+        message buffer
+    """
+    COM_Sciospec.write_data(bytearray([0xB4, 0x01, 0x01, 0xB4]))
+    received = bytearray()
+    while True:
+        buffer = COM_Sciospec.read_data_bytes(size=1024, attempt=150)
+        if not buffer:
+            break
+        received.extend(buffer)
+    COM_Sciospec.write_data(bytearray([0xB4, 0x01, 0x00, 0xB4]))
+    SystemMessageCallback_usb_hs(COM_Sciospec, prnt_msg=False, ret_hex_int="int")
+    return received
+
+
+def decode_raw_bursts(
+    raw: Union[bytes, bytearray, np.ndarray], ssms: ScioSpecMeasurementSetup
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode a raw message buffer directly into the potential and excitation arrays.
+    The buffer is viewed with a structured dtype instead of parsing every frame
+    into a SingleFrame, the result equals `get_frames_potential` applied to each
+    burst of `sciospec_measurement`.
+    Every "data holdup" message (18 x1 92 18) is removed, also if it follows a
+    byte sequence that starts a holdup itself (e.g. 18 18 11 92 18 after the
+    acknowledge message). sciopy's `length_correction` keeps these messages and
+    fails to split the bursts, see tests/test_sciospec.py.
+
+    Parameters
+    ----------
+    raw : Union[bytes, bytearray, np.ndarray]
+        message buffer of `StartStopMeasurement_raw_usb_hs`
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        complex potentials with shape (burst_count, n_exc, n_el),
+        excitation stages with shape (burst_count, n_exc, 2)
+    """
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    # delete "data holdup" system messages (18 x1 92 18) between the frames
+    if buf.shape[0] >= 4:
+        holdup = (
+            (buf[:-3] == 0x18)
+            & _HEX_CONTAINS_1[buf[1:-2]]
+            & (buf[2:-1] == 0x92)
+            & (buf[3:] == 0x18)
+        )
+        if np.any(holdup):
+            keep = np.ones(buf.shape[0], dtype=bool)
+            for start in np.flatnonzero(holdup):
+                keep[start : start + 4] = False
+            buf = buf[keep]
+    # delete acknowledgement message
+    buf = buf[4:]
+
+    split_length = buf.shape[0] // ssms.burst_count
+    if split_length % FRAME_DTYPE.itemsize != 0:
+        raise ValueError(
+            f"Burst length {split_length} is no multiple of "
+            f"{FRAME_DTYPE.itemsize} byte frames."
+        )
+    frames = (
+        buf[: ssms.burst_count * split_length]
+        .reshape(ssms.burst_count, split_length)
+        .view(FRAME_DTYPE)
+    )
+
+    n_grp = len(ssms.channel_group)
+    ch_n = ssms.n_el // n_grp
+    selected = np.isin(frames["channel_group"], ssms.channel_group)
+    n_exc = np.min(np.sum(selected, axis=1)) // n_grp
+    frames = np.stack([frm[sel][: n_exc * n_grp] for frm, sel in zip(frames, selected)])
+    frames = frames.reshape(ssms.burst_count, n_exc, n_grp)
+
+    channels = frames["channels"][..., :ch_n, :].astype(np.float64)
+    values = channels[..., 0] + 1j * channels[..., 1]
+    potentials = np.zeros((ssms.burst_count, n_exc, n_grp, ch_n), dtype=complex)
+    burst_idx, exc_idx, _ = np.indices(frames.shape)
+    potentials[burst_idx, exc_idx, frames["channel_group"].astype(int) - 1] = values
+    potentials = potentials.reshape(ssms.burst_count, n_exc, n_grp * ch_n)
+    exc_stgs = frames["excitation_stgs"][:, :, 0, :].astype(int)
+    return potentials, exc_stgs
+
+
+def sciospec_measurement_raw(
+    COM_Sciospec, ssms: ScioSpecMeasurementSetup, tracer: Tracer = NullTracer()
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and stop a measurement and decode the bursts with `decode_raw_bursts`.
+
+    Parameters
+    ----------
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    tracer : Tracer, optional
+        records the timing of each stage, by default NullTracer()
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        complex potentials with shape (burst_count, n_exc, n_el),
+        excitation stages with shape (burst_count, n_exc, 2)
+    """
+    with tracer.span("measurement"):
+        raw = StartStopMeasurement_raw_usb_hs(COM_Sciospec)
+    with tracer.span("decode"):
+        return decode_raw_bursts(raw, ssms)
+
+
+def check_decoder_parity(
+    raw: Union[bytes, bytearray], ssms: ScioSpecMeasurementSetup
+) -> bool:
+    """
+    Compare `decode_raw_bursts` with the sciopy decoding path of
+    `sciospec_measurement` for a single message buffer.
+
+    Parameters
+    ----------
+    raw : Union[bytes, bytearray]
+        message buffer of `StartStopMeasurement_raw_usb_hs`
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+
+    Returns
+    -------
+    bool
+        True if potentials and excitation stages are identical
+    """
+    from .dataprocessing import get_frames_potential
+
+    potentials, exc_stgs = decode_raw_bursts(raw, ssms)
+
+    measurement_data = del_hex_in_list([hex(val) for val in raw])
+    split_measurement_data = reshape_full_message_in_bursts(measurement_data, ssms)
+    bursts = split_bursts_in_frames(split_measurement_data, ssms)
+    sciopy_potentials = np.array([get_frames_potential(frm, ssms) for frm in bursts])
+    sciopy_exc_stgs = np.array(
+        [
+            [frm.excitation_stgs for frm in burst[:: len(ssms.channel_group)]]
+            for burst in bursts
+        ]
+    )
+    return np.array_equal(potentials, sciopy_potentials) and np.array_equal(
+        exc_stgs, sciopy_exc_stgs
+    )
+
+
+def check_bursts(
+    exc_stgs: np.ndarray, ssms: ScioSpecMeasurementSetup, burst_count: int
+) -> None:
+    """
+    Check the decoded bursts of a measurement. A burst is incomplete if frames
+    are missing, e.g. after a lost USB packet, even though the decoders return
+    `burst_count` (padded or empty) bursts.
+
+    Parameters
+    ----------
+    exc_stgs : np.ndarray
+        excitation stages with shape (burst_count, n_exc, 2)
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    burst_count : int
+        expected number of bursts
+
+    Raises
+    ------
+    ValueError
+        if a burst is missing, empty or has unexpected excitation stages
+    """
+    el_inj = np.arange(1, ssms.n_el + 1)
+    expected = np.stack([el_inj, np.roll(el_inj, -(ssms.inj_skip + 1))], axis=1)
+    if len(exc_stgs) != burst_count:
+        raise ValueError(f"Received {len(exc_stgs)} of {burst_count} bursts.")
+    for burst, stgs in enumerate(exc_stgs):
+        stgs = np.asarray(stgs).reshape(-1, 2)
+        if stgs.shape != expected.shape:
+            raise ValueError(
+                f"Burst {burst} has {stgs.shape[0]} of {expected.shape[0]} "
+                "excitation stages."
+            )
+        if not np.array_equal(stgs, expected):
+            raise ValueError(f"Burst {burst} has unexpected excitation stages.")
+
+
+def frames_excitation_stages(data: np.ndarray, ssms: ScioSpecMeasurementSetup) -> list:
+    """
+    Excitation stages of the SingleFrames of every burst, see `check_bursts`.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        SingleFrames with shape (burst_count, n_frames)
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+
+    Returns
+    -------
+    list
+        excitation stages (n_exc, 2) of every burst
+
+    Raises
+    ------
+    ValueError
+        if the channel groups of a burst are out of order
+    """
+    n_grp = len(ssms.channel_group)
+    exc_stgs = list()
+    for burst, frames in enumerate(data):
+        groups = [frm.channel_group for frm in frames]
+        if groups != list(ssms.channel_group) * (len(groups) // n_grp):
+            raise ValueError(f"Burst {burst} has missing or misaligned frames.")
+        exc_stgs.append(np.array([frm.excitation_stgs for frm in frames[::n_grp]]))
+    return exc_stgs
+
+
+def software_reset_usb_hs(COM_Sciospec) -> None:
+    """
+    Restart the Sciospec device, the measurement configuration is lost.
+
+    Parameters
+    ----------
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+    """
+    COM_Sciospec.write_data(bytearray([0xA1, 0x00, 0xA1]))
+
+
+class _CommandRecorder:
+    """
+    Stand-in connection that records all written commands.
+    """
+
+    def __init__(self):
+        self.commands = list()
+
+    def write_data(self, data) -> int:
+        self.commands.append(bytes(data))
+        return len(data)
+
+
+class SciospecSupervisor:
+    """
+    Watchdog around the Sciospec connection.
+
+    A failed measurement is retried up to `retries` times per coordinate. Before
+    every retry the connection is recovered: the message buffer is flushed, the
+    cached measurement configuration is replayed and a health check (command
+    acknowledge) is done. If the device does not answer, it is reconnected with an
+    exponential backoff bounded by `backoff_max`. A software reset with a wait of
+    `reset_wait` is only the last resort. Failures, recoveries and the downtime are
+    counted in `stats` and added to the counters of earlier runs in the
+    'info.json' of the measurement.
+
+    Parameters
+    ----------
+    COM_Sciospec : _type_
+        serial connection to sciospec eit device
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    connect : Callable, optional
+        returns a new connection, by default connect_COM_port_usb_hs
+    retries : int, optional
+        retries per coordinate, by default 3
+    reconnects : int, optional
+        reconnect attempts per recovery, by default 4
+    backoff_start : float, optional
+        first reconnect delay [s], by default 0.5
+    backoff_max : float, optional
+        maximum reconnect delay [s], by default 8.0
+    reset_wait : float, optional
+        boot time after a software reset [s], by default 10.0
+    info_path : Union[None, str], optional
+        'info.json' that receives the stats, by default None
+    """
+
+    def __init__(
+        self,
+        COM_Sciospec,
+        ssms: ScioSpecMeasurementSetup,
+        connect: Callable = connect_COM_port_usb_hs,
+        retries: int = 3,
+        reconnects: int = 4,
+        backoff_start: float = 0.5,
+        backoff_max: float = 8.0,
+        reset_wait: float = 10.0,
+        info_path: Union[None, str] = None,
+    ):
+        self.COM_Sciospec = COM_Sciospec
+        self.ssms = ssms
+        self.connect = connect
+        self.retries = retries
+        self.reconnects = reconnects
+        self.backoff_start = backoff_start
+        self.backoff_max = backoff_max
+        self.reset_wait = reset_wait
+        self.info_path = info_path
+        recorder = _CommandRecorder()
+        set_measurement_config_usb_hs(recorder, ssms)
+        self.config_commands = recorder.commands
+        # burst count the device is set to, see `set_burst_count`
+        self.burst_count = ssms.burst_count
+        # counters of earlier runs in the 'info.json', read at the first save
+        self.stored_stats = None
+        self.stats = {
+            "failures": 0,
+            "recoveries": 0,
+            "reconnects": 0,
+            "software_resets": 0,
+            "downtime_s": 0.0,
+            "last_failure": None,
+        }
+
+    def replay_config(self) -> None:
+        """Send the cached measurement configuration."""
+        for cmd in self.config_commands:
+            self.COM_Sciospec.write_data(bytearray(cmd))
+        SystemMessageCallback_usb_hs(self.COM_Sciospec, prnt_msg=False)
+
+    def set_burst_count(self, burst_count: int) -> None:
+        """
+        Set the burst count of the device. It is kept by a recovery, a failed
+        command is recovered.
+
+        Parameters
+        ----------
+        burst_count : int
+            number of bursts between the start and stop command
+        """
+        self.burst_count = burst_count
+        try:
+            set_burst_count_usb_hs(self.COM_Sciospec, burst_count)
+            SystemMessageCallback_usb_hs(self.COM_Sciospec, prnt_msg=False)
+        except Exception:
+            self.recover()
+
+    def health_check(self) -> bool:
+        """
+        Check if the device acknowledges a command.
+
+        Returns
+        -------
+        bool
+            True if the device is responsive
+        """
+        try:
+            set_burst_count_usb_hs(self.COM_Sciospec, self.burst_count)
+            received = SystemMessageCallback_usb_hs(
+                self.COM_Sciospec, prnt_msg=False, ret_hex_int="int"
+            )
+        except Exception:
+            return False
+        return any(
+            list(received[idx : idx + 4]) == ACK for idx in range(len(received) - 3)
+        )
+
+    def _restore(self) -> bool:
+        try:
+            self.replay_config()
+        except Exception:
+            return False
+        return self.health_check()
+
+    def _reconnect(self) -> bool:
+        try:
+            self.COM_Sciospec = self.connect()
+        except Exception:
+            return False
+        self.stats["reconnects"] += 1
+        return self._restore()
+
+    def recover(self) -> None:
+        """
+        Restore a working connection with the measurement configuration.
+        """
+        t_start = time.perf_counter()
+        try:
+            # flush the message buffer of the aborted measurement
+            SystemMessageCallback_usb_hs(self.COM_Sciospec, prnt_msg=False)
+            recovered = self._restore()
+        except Exception:
+            recovered = False
+        delay = self.backoff_start
+        for _ in range(self.reconnects):
+            if recovered:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, self.backoff_max)
+            recovered = self._reconnect()
+        if not recovered:
+            try:
+                software_reset_usb_hs(self.COM_Sciospec)
+            except Exception:
+                pass
+            self.stats["software_resets"] += 1
+            time.sleep(self.reset_wait)
+            recovered = self._reconnect()
+        self.stats["downtime_s"] += time.perf_counter() - t_start
+        if not recovered:
+            self.save_stats()
+            raise ConnectionError("Sciospec device could not be recovered.")
+        self.stats["recoveries"] += 1
+        self.save_stats()
+
+    def _supervised(self, measure: Callable, tracer: Tracer):
+        for attempt in range(self.retries + 1):
+            try:
+                return measure()
+            except Exception as error:
+                self.stats["failures"] += 1
+                self.stats[
+                    "last_failure"
+                ] = f"{datetime.now().strftime('%d.%m.%Y %H:%M:%S')} {error!r}"
+                if attempt == self.retries:
+                    self.save_stats()
+                    raise RuntimeError(
+                        f"Sciospec measurement failed {attempt + 1} times."
+                    ) from error
+                with tracer.span("recovery", attempt=attempt):
+                    self.recover()
+
+    def measure(self, tracer: Tracer = NullTracer()) -> np.ndarray:
+        """
+        Run `sciospec_measurement` within the retry budget. Incomplete bursts
+        are retried like failed measurements, see `check_bursts`.
+
+        Parameters
+        ----------
+        tracer : Tracer, optional
+            records the timing of each stage, by default NullTracer()
+
+        Returns
+        -------
+        np.ndarray
+            SingleFrames with shape (burst_count, n_frames)
+        """
+
+        def measure():
+            data = sciospec_measurement(self.COM_Sciospec, self.ssms, tracer)
+            check_bursts(
+                frames_excitation_stages(data, self.ssms),
+                self.ssms,
+                self.ssms.burst_count,
+            )
+            return data
+
+        return self._supervised(measure, tracer)
+
+    def probe(self, tracer: Tracer = NullTracer()) -> np.ndarray:
+        """
+        Run `sciospec_measurement_raw` with the current burst count within the
+        retry budget, e.g. a single burst after `set_burst_count(1)`.
+
+        Parameters
+        ----------
+        tracer : Tracer, optional
+            records the timing of each stage, by default NullTracer()
+
+        Returns
+        -------
+        np.ndarray
+            complex potentials with shape (burst_count, n_exc, n_el)
+        """
+        probe_ssms = replace(self.ssms, burst_count=self.burst_count)
+
+        def measure():
+            potentials, exc_stgs = sciospec_measurement_raw(
+                self.COM_Sciospec, probe_ssms, tracer
+            )
+            check_bursts(exc_stgs, probe_ssms, self.burst_count)
+            return potentials
+
+        return self._supervised(measure, tracer)
+
+    def save_stats(self) -> None:
+        """
+        Write the stats into the 'info.json' as "SciospecSupervisor". The
+        counters of an interrupted run that is resumed are continued.
+        """
+        if self.info_path is None or not os.path.isfile(self.info_path):
+            return
+        with open(self.info_path, "r") as file:
+            info = json.load(file)
+        if self.stored_stats is None:
+            self.stored_stats = info.get("SciospecSupervisor", dict())
+        stats = dict(self.stats)
+        for key, value in self.stored_stats.items():
+            if key == "last_failure":
+                stats[key] = stats[key] or value
+            elif key in stats:
+                stats[key] += value
+        info["SciospecSupervisor"] = stats
+        tmp_path = self.info_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(json.dumps(info, indent=4))
+        os.replace(tmp_path, self.info_path)
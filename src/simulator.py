@@ -0,0 +1,706 @@
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Tuple, Union
+
+import numpy as np
+from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup, SingleFrame
+
+from .classes import (
+    BallAnomaly,
+    Ender5Stat,
+    MeasurementInformation,
+    TankProperties32x2,
+)
+
+
+def electrode_positions(
+    tank: TankProperties32x2 = TankProperties32x2(), n_el_per_channel: int = 16
+) -> np.ndarray:
+    """
+    Compute the electrode positions of the 32x2 tank, numbered like in the
+    injection pattern visualization.
+
+    Parameters
+    ----------
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    n_el_per_channel : int, optional
+        electrodes per channel group, by default 16
+
+    Returns
+    -------
+    np.ndarray
+        x,y,z electrode positions with shape (n_el, 3) [mm]
+    """
+    phi_ypos = np.linspace(0, np.pi, n_el_per_channel, endpoint=False)
+    phi_yneg = np.linspace(np.pi, 2 * np.pi, n_el_per_channel, endpoint=False)
+    phi = np.concatenate([phi_ypos, phi_yneg, phi_ypos, phi_yneg])
+    z = np.repeat([tank.E_zr1, tank.E_zr1, tank.E_zr2, tank.E_zr2], n_el_per_channel)
+    return np.vstack([tank.T_r * np.cos(phi), tank.T_r * np.sin(phi), z]).T
+
+
+def get_injection_pairs(ssms: ScioSpecMeasurementSetup) -> np.ndarray:
+    """
+    Injection and ground electrode of each excitation stage, like they are sent by
+    `set_measurement_config_usb_hs`.
+
+    Parameters
+    ----------
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+
+    Returns
+    -------
+    np.ndarray
+        injection electrode pairs with shape (n_el, 2), starting with 1
+    """
+    el_inj = np.arange(1, ssms.n_el + 1)
+    el_gnd = np.roll(el_inj, -(ssms.inj_skip + 1))
+    return np.vstack([el_inj, el_gnd]).T
+
+
+def simulate_potential_matrix(
+    ball: Union[None, BallAnomaly],
+    inj_pairs: np.ndarray,
+    tank: TankProperties32x2 = TankProperties32x2(),
+    amplitude: float = 0.01,
+    conductivity: float = 1e-3,
+    contrast: float = -0.5,
+    noise: float = 1e-7,
+    rng: Union[None, np.random.Generator] = None,
+) -> np.ndarray:
+    """
+    Simple analytical forward model for the single ended electrode potentials.
+    The injection is modelled as a point source and sink in a homogeneous medium,
+    the ball as the induced dipole of a sphere in the local excitation field.
+
+    Parameters
+    ----------
+    ball : Union[None, BallAnomaly]
+        anomaly property dataclass, None for the empty tank
+    inj_pairs : np.ndarray
+        injection electrode pairs with shape (n_exc, 2), starting with 1
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    amplitude : float, optional
+        excitation amplitude [A], by default 0.01
+    conductivity : float, optional
+        saline conductivity [S/mm], by default 1e-3
+    contrast : float, optional
+        dipole contrast factor (-0.5 := insulator, 1.0 := perfect conductor),
+        by default -0.5
+    noise : float, optional
+        standard deviation of the additive complex noise [V], by default 1e-7
+    rng : Union[None, np.random.Generator], optional
+        random generator, by default None
+
+    Returns
+    -------
+    np.ndarray
+        complex potentials with shape (n_exc, n_el)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    el_pos = electrode_positions(tank)
+    r_el = 5.0  # electrode radius, avoids the singularity at the electrode [mm]
+    k = amplitude / (4 * np.pi * conductivity)
+
+    src = el_pos[inj_pairs[:, 0] - 1]
+    snk = el_pos[inj_pairs[:, 1] - 1]
+    # (n_exc, n_el) distances of all electrodes to source and sink
+    d_src = np.linalg.norm(el_pos[None, :, :] - src[:, None, :], axis=2)
+    d_snk = np.linalg.norm(el_pos[None, :, :] - snk[:, None, :], axis=2)
+    pot = k * (1 / np.maximum(d_src, r_el) - 1 / np.maximum(d_snk, r_el))
+
+    if ball is not None:
+        b_pos = np.array([ball.x, ball.y, ball.z], dtype=float)
+        # excitation field at the ball center: E = -grad(u)
+        r_s = b_pos - src
+        r_k = b_pos - snk
+        e_field = k * (
+            r_s / np.linalg.norm(r_s, axis=1)[:, None] ** 3
+            - r_k / np.linalg.norm(r_k, axis=1)[:, None] ** 3
+        )
+        dipole = contrast * (ball.d / 2) ** 3 * e_field
+        r_b = el_pos - b_pos
+        d_b = np.maximum(np.linalg.norm(r_b, axis=1), ball.d / 2)
+        pot += (dipole @ r_b.T) / d_b[None, :] ** 3
+
+    pot = pot * np.exp(-0.01j)
+    pot += rng.normal(scale=noise, size=pot.shape) + 1j * rng.normal(
+        scale=noise, size=pot.shape
+    )
+    return pot
+
+
+def build_frame_bytes(
+    channel_group: int,
+    inj_pair: Tuple[int, int],
+    timestamp: int,
+    values: np.ndarray,
+) -> bytes:
+    """
+    Build a single 140 byte Sciospec measurement frame.
+
+    Parameters
+    ----------
+    channel_group : int
+        channel group (1-4)
+    inj_pair : Tuple[int, int]
+        injection and ground electrode
+    timestamp : int
+        frame timestamp [ms]
+    values : np.ndarray
+        16 complex channel values
+
+    Returns
+    -------
+    bytes
+        raw frame
+    """
+    channels = np.empty(32, dtype=">f4")
+    channels[0::2] = np.real(values)
+    channels[1::2] = np.imag(values)
+    return (
+        bytes([0xB4, 0x89, channel_group, inj_pair[0], inj_pair[1], 0x00, 0x00])
+        + struct.pack(">I", timestamp & 0xFFFFFFFF)
+        + channels.tobytes()
+        + bytes([0xB4])
+    )
+
+
+def potentials_to_frames(
+    potentials: np.ndarray,
+    inj_pairs: np.ndarray,
+    channel_group: list = [1, 2, 3, 4],
+    timestamp: int = 0,
+) -> np.ndarray:
+    """
+    Convert a potential matrix into the SingleFrames of a single burst, like they
+    are returned by `sciospec_measurement`.
+
+    Parameters
+    ----------
+    potentials : np.ndarray
+        complex potentials with shape (n_exc, n_el)
+    inj_pairs : np.ndarray
+        injection electrode pairs with shape (n_exc, 2), starting with 1
+    channel_group : list, optional
+        measured channel groups, by default [1, 2, 3, 4]
+    timestamp : int, optional
+        timestamp of the first frame [ms], by default 0
+
+    Returns
+    -------
+    np.ndarray
+        SingleFrames of a single burst
+    """
+    frames = list()
+    keys = [f"ch_{ch + 1}" for ch in range(16)]
+    rows = np.asarray(potentials, dtype=complex).tolist()
+    for exc, (inj, gnd) in enumerate(inj_pairs):
+        for group in channel_group:
+            channels = dict(zip(keys, rows[exc][(group - 1) * 16 : group * 16]))
+            frames.append(
+                SingleFrame(
+                    start_tag="b4",
+                    channel_group=group,
+                    excitation_stgs=np.array([inj, gnd]),
+                    frequency_row=np.array(["0", "0"]),
+                    timestamp=timestamp + exc,
+                    **channels,
+                    end_tag="b4",
+                )
+            )
+    return np.array(frames)
+
+
+class SimulatedEnder5:
+    """
+    Pyserial compatible simulation of the Ender 5 Marlin firmware.
+
+    Supported G-code: G0/G1, G28, M105, M106, M114, M155, M400.
+    Moves are planned with a trapezoidal velocity profile limited by the maximum
+    feedrate and acceleration of each axis. Like Marlin, moves are buffered and
+    acknowledged immediately, while G28 and M400 are acknowledged after all moves
+    are finished. The fixed waiting times of the `ender5` functions are scaled by
+    the same `time_scale`.
+    """
+
+    def __init__(
+        self,
+        position: Tuple[float, float, float] = (180.0, 180.0, 0.0),
+        home_position: Tuple[float, float, float] = (180.0, 180.0, 0.0),
+        max_feedrate: Tuple[float, float, float] = (500.0, 500.0, 5.0),
+        max_acceleration: Tuple[float, float, float] = (500.0, 500.0, 100.0),
+        homing_feedrate: Tuple[float, float, float] = (50.0, 50.0, 4.0),
+        bed_temperature: float = 21.0,
+        time_scale: float = 1.0,
+        timeout: float = 1.0,
+        seed: Union[None, int] = None,
+    ):
+        self.name = "SimulatedEnder5"
+        self.is_open = True
+        self.timeout = timeout
+        self.time_scale = time_scale
+        self.home_position = np.array(home_position, dtype=float)
+        self.max_feedrate = np.array(max_feedrate, dtype=float)
+        self.max_acceleration = np.array(max_acceleration, dtype=float)
+        self.homing_feedrate = np.array(homing_feedrate, dtype=float)
+        self.bed_temperature = bed_temperature
+        self.feedrate = 50.0  # [mm/s]
+        self.fan_speed = 255
+        self._rng = np.random.default_rng(seed)
+        self._in = b""
+        self._out = list()  # (available time, line)
+        # planned moves: (start time, duration, start position, end position)
+        self._moves = list()
+        self._position = np.array(position, dtype=float)
+        self._motion_end = time.monotonic()
+        self._report_interval = 0.0
+        self._next_report = None
+        self._lock = threading.Lock()
+
+    def move_duration(self, start: np.ndarray, end: np.ndarray, feedrate: float):
+        """
+        Duration of a single move with trapezoidal velocity profile [s].
+        """
+        delta = np.abs(end - start)
+        distance = np.linalg.norm(delta)
+        if distance == 0:
+            return 0.0
+        ratio = delta / distance
+        moving = ratio > 0
+        v = min(feedrate, np.min(self.max_feedrate[moving] / ratio[moving]))
+        a = np.min(self.max_acceleration[moving] / ratio[moving])
+        if distance >= v**2 / a:
+            return distance / v + v / a
+        return 2 * np.sqrt(distance / a)
+
+    def position(self, now: Union[None, float] = None) -> np.ndarray:
+        """
+        Current, interpolated position of the Ender 5 [mm].
+        """
+        if now is None:
+            now = time.monotonic()
+        pos = self._position
+        for t_start, duration, start, end in self._moves:
+            if now <= t_start:
+                break
+            if now >= t_start + duration:
+                pos = end
+                continue
+            pos = start + (end - start) * (now - t_start) / duration
+            break
+        return pos
+
+    def _queue_move(self, end: np.ndarray, feedrate: np.ndarray) -> None:
+        now = time.monotonic()
+        t_start = max(now, self._motion_end)
+        start = self._moves[-1][3] if self._moves else self._position
+        finished = [mv for mv in self._moves if mv[0] + mv[1] <= now]
+        if finished:
+            self._position = finished[-1][3]
+        self._moves = self._moves[len(finished) :]
+        duration = self.move_duration(start, end, feedrate) * self.time_scale
+        self._moves.append((t_start, duration, start, end))
+        self._motion_end = t_start + duration
+
+    def _respond(self, line: str, delay_until: Union[None, float] = None) -> None:
+        if delay_until is None:
+            delay_until = time.monotonic()
+        # keep the output sorted by availability, e.g. reports during a G28
+        idx = len(self._out)
+        while idx > 0 and self._out[idx - 1][0] > delay_until:
+            idx -= 1
+        self._out.insert(idx, (delay_until, line.encode()))
+
+    def _auto_report(self, now: float) -> None:
+        while self._next_report is not None and self._next_report <= now:
+            self._respond(f" {self._temperature_report()}\n", self._next_report)
+            self._next_report += self._report_interval
+
+    def _temperature(self) -> float:
+        self.bed_temperature += self._rng.normal(scale=0.01)
+        return self.bed_temperature
+
+    def _temperature_report(self) -> str:
+        return f"T:25.00 /0.00 B:{self._temperature():.2f} /0.00 @:0 B@:0"
+
+    def _handle(self, line: str) -> None:
+        gcode = line.split(";")[0].strip().upper()
+        if not gcode:
+            return
+        cmd = gcode.split()[0]
+        params = dict(re.findall(r"([XYZFS])(-?\d+\.?\d*)", gcode[len(cmd) :]))
+
+        if cmd in ("G0", "G1"):
+            end = self._moves[-1][3].copy() if self._moves else self.position().copy()
+            for ax, key in enumerate("XYZ"):
+                if key in params:
+                    end[ax] = float(params[key])
+            if "F" in params:
+                self.feedrate = float(params["F"]) / 60
+            self._queue_move(end, self.feedrate)
+            self._respond("ok\n")
+        elif cmd == "G28":
+            axes = [key for key in "XYZ" if key in gcode[len(cmd) :]] or list("XYZ")
+            end = self._moves[-1][3].copy() if self._moves else self.position().copy()
+            for key in axes:
+                ax = "XYZ".index(key)
+                end[ax] = self.home_position[ax]
+                single = end.copy()
+                self._queue_move(single, self.homing_feedrate[ax])
+            self._respond("ok\n", self._motion_end)
+        elif cmd == "M105":
+            self._respond(f"ok {self._temperature_report()}\n")
+        elif cmd == "M106":
+            self.fan_speed = int(float(params.get("S", 255)))
+            self._respond("ok\n")
+        elif cmd == "M107":
+            self.fan_speed = 0
+            self._respond("ok\n")
+        elif cmd == "M114":
+            x, y, z = self.position()
+            self._respond(f"X:{x:.2f} Y:{y:.2f} Z:{z:.2f} E:0.00 Count X:0 Y:0 Z:0\n")
+            self._respond("ok\n")
+        elif cmd == "M155":
+            self._report_interval = float(params.get("S", 1)) * self.time_scale
+            self._next_report = (
+                time.monotonic() + self._report_interval
+                if self._report_interval > 0
+                else None
+            )
+            self._respond("ok\n")
+        elif cmd == "M400":
+            self._respond("ok\n", self._motion_end)
+        else:
+            self._respond(f"echo:Unknown command: {line.strip()}\n")
+            self._respond("ok\n")
+
+    def write(self, data: bytes) -> int:
+        with self._lock:
+            self._in += bytes(data)
+            while b"\n" in self._in:
+                line, self._in = self._in.split(b"\n", 1)
+                self._handle(line.decode(errors="ignore"))
+        return len(data)
+
+    @property
+    def in_waiting(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._auto_report(now)
+            return sum(len(ln) for t, ln in self._out if t <= now)
+
+    def readline(self) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._auto_report(now)
+                if self._out and self._out[0][0] <= now:
+                    return self._out.pop(0)[1]
+                wake_up = [deadline]
+                if self._out:
+                    wake_up.append(self._out[0][0])
+                if self._next_report is not None:
+                    wake_up.append(self._next_report)
+            if now >= deadline:
+                return b""
+            time.sleep(max(0.0, min(wake_up) - now))
+
+    def read(self, size: int = 1) -> bytes:
+        data = b""
+        while len(data) < size:
+            line = self.readline()
+            if not line:
+                break
+            data += line
+        if len(data) > size:
+            with self._lock:
+                self._out.insert(0, (time.monotonic(), data[size:]))
+        return data[:size]
+
+    def reset_input_buffer(self) -> None:
+        with self._lock:
+            self._out = list()
+
+    def reset_output_buffer(self) -> None:
+        with self._lock:
+            self._in = b""
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+class SimulatedSciospec:
+    """
+    Simulation of the USB-HS (pyftdi) connection of the Sciospec EIT device.
+
+    The configuration commands sent by `set_measurement_config_usb_hs` are parsed,
+    so the start command returns `burst_count` framed bursts that can be decoded by
+    `sciospec_measurement`. The potentials are computed from the position of the
+    referenced `BallAnomaly` at the start of each measurement.
+    With a `fault_rate` a measurement randomly returns a truncated burst, like a
+    lost USB packet, to test the fault recovery.
+    """
+
+    PARITY_NONE = 0
+    SET_BITS_HIGH = 0x82
+    STOP_BIT_1 = 0
+
+    def __init__(
+        self,
+        ball: Union[None, BallAnomaly] = None,
+        tank: TankProperties32x2 = TankProperties32x2(),
+        channel_group: list = [1, 2, 3, 4],
+        noise: float = 1e-7,
+        time_scale: float = 1.0,
+        seed: Union[None, int] = None,
+        fault_rate: float = 0.0,
+    ):
+        self.ball = ball
+        self.tank = tank
+        self.channel_group = channel_group
+        self.noise = noise
+        self.time_scale = time_scale
+        self.fault_rate = fault_rate
+        self.burst_count = 1
+        self.framerate = 5.0
+        self.amplitude = 0.01
+        self.inj_pairs = list()
+        self._rng = np.random.default_rng(seed)
+        self._in = b""
+        self._out = list()  # (available time, bytes)
+        self._t_start = time.monotonic()
+
+    # pyftdi connection handling
+    def create_from_url(self, url: str = "ftdi://ftdi:232h/1"):
+        return self
+
+    def purge_buffers(self) -> None:
+        self._in = b""
+        self._out = list()
+
+    def set_bitmode(self, bitmask: int, mode) -> None:
+        pass
+
+    def set_baudrate(self, baudrate: int) -> int:
+        return baudrate
+
+    def close(self) -> None:
+        pass
+
+    def _ack(self, code: int = 0x83) -> None:
+        self._out.append((time.monotonic(), bytes([0x18, 0x01, code, 0x18])))
+
+    def _start_measurement(self) -> None:
+        self._ack()
+        now = time.monotonic()
+        inj_pairs = np.array(self.inj_pairs)
+        t_ms = int((now - self._t_start) * 1000)
+        for burst in range(self.burst_count):
+            pot = simulate_potential_matrix(
+                self.ball,
+                inj_pairs,
+                self.tank,
+                amplitude=self.amplitude,
+                noise=self.noise,
+                rng=self._rng,
+            )
+            chunk = b"".join(
+                build_frame_bytes(group, pair, t_ms + burst, pot[exc, sl])
+                for exc, pair in enumerate(inj_pairs)
+                for group, sl in (
+                    (g, slice((g - 1) * 16, g * 16)) for g in self.channel_group
+                )
+            )
+            if self._rng.random() < self.fault_rate:
+                chunk = chunk[: -self._rng.integers(1, len(chunk))]
+            t_available = now + (burst + 1) / self.framerate * self.time_scale
+            self._out.append((t_available, chunk))
+
+    def _handle(self, cmd: bytes) -> None:
+        ct, payload = cmd[0], cmd[2:-1]
+        if ct == 0xB0 and payload[:1] == b"\x01":
+            # reset measurement setup
+            self.inj_pairs = list()
+        elif ct == 0xB0 and payload[:1] == b"\x02":
+            self.burst_count = int.from_bytes(payload[1:3], "big")
+        elif ct == 0xB0 and payload[:1] == b"\x05":
+            self.amplitude = struct.unpack(">d", payload[1:9])[0]
+        elif ct == 0xB0 and payload[:1] == b"\x03":
+            self.framerate = struct.unpack(">f", payload[1:5])[0]
+        elif ct == 0xB0 and payload[:1] == b"\x06":
+            self.inj_pairs.append((payload[1], payload[2]))
+        elif ct == 0xB4 and payload == b"\x01":
+            self._start_measurement()
+            return
+        elif ct == 0xB4 and payload == b"\x00":
+            # stop: drop bursts that have not been read
+            self._out = [(t, data) for t, data in self._out if data[:1] == b"\x18"]
+        elif ct == 0xA1:
+            # software reset: drop the configuration and send the wake-up message
+            self.burst_count = 1
+            self.framerate = 5.0
+            self.amplitude = 0.01
+            self.inj_pairs = list()
+            self._out = list()
+            self._ack(0x04)
+            return
+        self._ack()
+
+    def write_data(self, data: bytes) -> int:
+        self._in += bytes(data)
+        while len(self._in) >= 3 and len(self._in) >= self._in[1] + 3:
+            length = self._in[1] + 3
+            cmd, self._in = self._in[:length], self._in[length:]
+            self._handle(cmd)
+        return len(data)
+
+    def read_data_bytes(self, size: int, attempt: int = 1) -> bytearray:
+        if not self._out:
+            return bytearray()
+        t_available, data = self._out[0]
+        wait = t_available - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._out.pop(0)
+        if len(data) > size:
+            self._out.insert(0, (t_available, data[size:]))
+        return bytearray(data[:size])
+
+
+def connect_simulated_rig(
+    ball: BallAnomaly,
+    tank: TankProperties32x2 = TankProperties32x2(),
+    time_scale: float = 1.0,
+    noise: float = 1e-7,
+    seed: Union[None, int] = None,
+    fault_rate: float = 0.0,
+) -> Tuple[SimulatedEnder5, SimulatedSciospec]:
+    """
+    Create simulated serial connections of the Ender 5 and the Sciospec device.
+    Use them instead of `connect_COM_port` and `connect_COM_port_usb_hs`.
+
+    Parameters
+    ----------
+    ball : BallAnomaly
+        anomaly property dataclass, moved by the measurement loop
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    time_scale : float, optional
+        scaling of all simulated device durations and of the waiting times of the
+        `ender5` functions, by default 1.0
+    noise : float, optional
+        standard deviation of the potential noise [V], by default 1e-7
+    seed : Union[None, int], optional
+        random seed, by default None
+    fault_rate : float, optional
+        probability of a truncated burst, by default 0.0
+
+    Returns
+    -------
+    Tuple[SimulatedEnder5, SimulatedSciospec]
+        simulated serial connection to 3d printer and sciospec eit device
+    """
+    COM_Ender = SimulatedEnder5(time_scale=time_scale, seed=seed)
+    COM_Sciospec = SimulatedSciospec(
+        ball, tank, noise=noise, time_scale=time_scale, seed=seed, fault_rate=fault_rate
+    )
+    return COM_Ender, COM_Sciospec
+
+
+def run_simulated_measurement(
+    s_path: str,
+    coordinates: np.ndarray,
+    ssms: ScioSpecMeasurementSetup,
+    ball: BallAnomaly,
+    tank: TankProperties32x2 = TankProperties32x2(),
+    settle_time: float = 3.0,
+    time_scale: float = 1.0,
+    settle_threshold: Union[None, float] = None,
+    online=None,
+) -> dict:
+    """
+    Run the full measurement loop against the simulated devices and report the
+    throughput of the pipeline.
+
+    Parameters
+    ----------
+    s_path : str
+        save path, e.g. created by `create_measurement_directory`
+    coordinates : np.ndarray
+        computed absolute measurement coordinates [mm]
+    ssms : ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    ball : BallAnomaly
+        anomaly property dataclass
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    settle_time : float, optional
+        waiting time after each movement [s], by default 3.0
+    time_scale : float, optional
+        scaling of all simulated device durations, by default 1.0
+    settle_threshold : Union[None, float], optional
+        relative potential change for the adaptive settle time, by default None
+    online : Union[None, OnlineReconstructor], optional
+        started online reconstructor, stopped by the caller, by default None
+
+    Returns
+    -------
+    dict
+        total duration [s], seconds per coordinate and samples per hour
+    """
+    from sciopy import SystemMessageCallback_usb_hs, set_measurement_config_usb_hs
+
+    from .acquisition import measurement_loop
+    from .ender5 import init_ender5
+
+    COM_Ender, COM_Sciospec = connect_simulated_rig(ball, tank, time_scale)
+    enderstat = Ender5Stat(
+        abs_x_pos=None,
+        abs_y_pos=None,
+        abs_z_pos=None,
+        tank_architecture=tank,
+        motion_speed=180,
+    )
+    init_ender5(COM_Ender, enderstat)
+    enderstat.motion_speed = 1500
+    set_measurement_config_usb_hs(COM_Sciospec, ssms)
+    SystemMessageCallback_usb_hs(COM_Sciospec, prnt_msg=False)
+    documentation = MeasurementInformation(
+        saline=(10.0, "[ppt]"),
+        saline_height=(138.0, "[mm]"),
+        temperature=(21.0, "[°C]"),
+        timestamp=datetime.now().strftime("%d_%m_%Y_%Hh_%Mm"),
+    )
+    t_start = time.perf_counter()
+    measurement_loop(
+        COM_Ender,
+        enderstat,
+        COM_Sciospec,
+        ssms,
+        s_path,
+        coordinates,
+        ball,
+        tank,
+        documentation,
+        settle_time=settle_time,
+        settle_threshold=settle_threshold,
+        online=online,
+    )
+    duration = time.perf_counter() - t_start
+    n_samples = coordinates.shape[0] * ssms.burst_count
+    return {
+        "duration": duration,
+        "seconds_per_coordinate": duration / coordinates.shape[0],
+        "samples_per_hour": n_samples / duration * 3600,
+    }
@@ -0,0 +1,280 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Union
+
+import numpy as np
+from sciopy.sciopy_dataclasses import ScioSpecMeasurementSetup
+
+from .acquisition import save_sample
+from .classes import BallAnomaly, MeasurementInformation, TankProperties32x2
+from .functions import (
+    compute_hitbox,
+    create_meas_coordinates,
+    save_parameters_to_json_file,
+)
+from .journal import get_coordinates_path
+from .simulator import (
+    get_injection_pairs,
+    potentials_to_frames,
+    simulate_potential_matrix,
+)
+
+
+def default_setup(
+    burst_count: int = 3, total_meas_num: int = 0
+) -> ScioSpecMeasurementSetup:
+    """
+    Sciospec configuration of the 64 electrode measurements with four channel
+    groups.
+
+    Parameters
+    ----------
+    burst_count : int, optional
+        samples per position, by default 3
+    total_meas_num : int, optional
+        total number of samples, by default 0
+
+    Returns
+    -------
+    ScioSpecMeasurementSetup
+        sciospec configuration dataclass
+    """
+    return ScioSpecMeasurementSetup(
+        burst_count=burst_count,
+        total_meas_num=total_meas_num,
+        n_el=64,
+        channel_group=[1, 2, 3, 4],
+        exc_freq=10000,
+        framerate=5,
+        amplitude=0.01,
+        inj_skip=0,
+        gain=1,
+        adc_range=1,
+        notes="synthetic measurement",
+        configured=True,
+    )
+
+
+def _synthetic_documentation(
+    time: datetime, temperature: float
+) -> MeasurementInformation:
+    return MeasurementInformation(
+        saline=(10.0, "[ppt]"),
+        saline_height=(138.0, "[mm]"),
+        temperature=(round(temperature, 2), "[°C]"),
+        timestamp=time.strftime("%d_%m_%Y_%Hh_%Mm"),
+    )
+
+
+def _write_synthetic_chunk(job: dict) -> int:
+    """Write the samples of a chunk of coordinates, returns the sample count."""
+    rng = np.random.default_rng(job["seed"])
+    ssms, tank = job["ssms"], job["tank"]
+    inj_pairs = get_injection_pairs(ssms)
+    n_written = 0
+    for offset, (x, y, z) in enumerate(job["coordinates"]):
+        coordinate_idx = job["first_coordinate"] + offset
+        # a copy per coordinate, the template ball of the job stays unchanged
+        ball = replace(job["ball"], x=x, y=y, z=z)
+        for burst in range(ssms.burst_count):
+            elapsed = (coordinate_idx * ssms.burst_count + burst) * job[
+                "seconds_per_sample"
+            ]
+            temperature = job["temperature"] + job["temperature_drift"] * elapsed / 3600
+            temperature += rng.normal(0, job["temperature_noise"])
+            potentials = simulate_potential_matrix(
+                ball, inj_pairs, tank, noise=job["noise"], rng=rng
+            )
+            save_sample(
+                job["l_path"]
+                + "data/sample_{0:06d}.npz".format(
+                    coordinate_idx * ssms.burst_count + burst
+                ),
+                potentials_to_frames(
+                    potentials, inj_pairs, ssms.channel_group, int(elapsed * 1000)
+                ),
+                ball,
+                ssms,
+                tank,
+                _synthetic_documentation(
+                    job["start_time"] + timedelta(seconds=elapsed), temperature
+                ),
+                sync=False,
+            )
+            n_written += 1
+    return n_written
+
+
+def _write_empty_tank(
+    l_path: str,
+    preamble: str,
+    ssms: ScioSpecMeasurementSetup,
+    tank: TankProperties32x2,
+    ball: BallAnomaly,
+    n_bursts: int,
+    time: datetime,
+    temperature: float,
+    noise: float,
+    rng: np.random.Generator,
+) -> None:
+    inj_pairs = get_injection_pairs(ssms)
+    for idx in range(n_bursts):
+        potentials = simulate_potential_matrix(
+            None, inj_pairs, tank, noise=noise, rng=rng
+        )
+        save_sample(
+            l_path + "empty_tank/" + preamble + "_{0:06d}.npz".format(idx),
+            potentials_to_frames(potentials, inj_pairs, ssms.channel_group),
+            ball,
+            ssms,
+            tank,
+            _synthetic_documentation(time, temperature),
+            sync=False,
+        )
+
+
+def generate_measurement_directory(
+    l_path: str,
+    x_pts: int = 10,
+    y_pts: int = 10,
+    z_pts: int = 10,
+    burst_count: int = 3,
+    ball: Union[None, BallAnomaly] = None,
+    tank: TankProperties32x2 = TankProperties32x2(),
+    coordinates: Union[None, np.ndarray] = None,
+    n_empty_tank: int = 3,
+    noise: float = 1e-7,
+    seconds_per_coordinate: float = 10.0,
+    temperature: float = 21.0,
+    temperature_drift: float = 0.2,
+    temperature_noise: float = 0.02,
+    start_time: Union[None, datetime] = None,
+    seed: int = 0,
+    n_workers: Union[None, int] = None,
+    chunk_size: int = 64,
+) -> np.ndarray:
+    """
+    Write a complete synthetic measurement directory: 'info.json',
+    'coordinates.npy', 'data/sample_*.npz' and 'empty_tank/before_*.npz' /
+    'after_*.npz'. The samples have the same structure as measured ones, the
+    potentials come from `simulate_potential_matrix` with noise, the timestamps
+    advance with `seconds_per_coordinate` and the temperature drifts linearly.
+
+    The coordinates are written in chunks by a process pool. Every chunk has its
+    own random stream derived from `seed`, so the result does not depend on the
+    number of workers.
+
+    Parameters
+    ----------
+    l_path : str
+        measurement directory, created if it does not exist
+    x_pts : int, optional
+        measurement points on the x-axis, by default 10
+    y_pts : int, optional
+        measurement points on the y-axis, by default 10
+    z_pts : int, optional
+        measurement points on the z-axis, by default 10
+    burst_count : int, optional
+        samples per position, by default 3
+    ball : Union[None, BallAnomaly], optional
+        anomaly property dataclass, by default a 40 mm acryl-glass ball
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    coordinates : Union[None, np.ndarray], optional
+        ball positions (n, 3) [mm] instead of `create_meas_coordinates`,
+        by default None
+    n_empty_tank : int, optional
+        empty tank samples before and after the measurement, by default 3
+    noise : float, optional
+        standard deviation of the potential noise [V], by default 1e-7
+    seconds_per_coordinate : float, optional
+        simulated measurement time per position [s], by default 10.0
+    temperature : float, optional
+        start temperature [°C], by default 21.0
+    temperature_drift : float, optional
+        temperature drift [°C/h], by default 0.2
+    temperature_noise : float, optional
+        standard deviation of the temperature reading [°C], by default 0.02
+    start_time : Union[None, datetime], optional
+        timestamp of the first sample, by default now
+    seed : int, optional
+        random seed, by default 0
+    n_workers : Union[None, int], optional
+        number of processes, 1 writes in this process, by default os.cpu_count()
+    chunk_size : int, optional
+        coordinates per task, by default 64
+
+    Returns
+    -------
+    np.ndarray
+        ball positions (n, 3) [mm]
+    """
+    os.makedirs(l_path + "data/", exist_ok=True)
+    os.makedirs(l_path + "empty_tank/", exist_ok=True)
+    if ball is None:
+        ball = BallAnomaly(x=0, y=0, z=0, d=40, perm=1, material="acryl-glass")
+    if start_time is None:
+        start_time = datetime.now()
+    hitbox = compute_hitbox(tank, ball)
+    if coordinates is None:
+        coordinates = create_meas_coordinates(hitbox, x_pts, y_pts, z_pts)
+    coordinates = np.asarray(coordinates, dtype=float)
+    ssms = default_setup(burst_count, coordinates.shape[0] * burst_count)
+    save_parameters_to_json_file(
+        l_path + "data/",
+        os.path.basename(os.path.normpath(l_path)),
+        ssms,
+        tank,
+        ball,
+        hitbox,
+    )
+    np.save(get_coordinates_path(l_path + "data/"), coordinates)
+
+    seeds = np.random.SeedSequence(seed).spawn(
+        -(-coordinates.shape[0] // chunk_size) + 1
+    )
+    seconds_per_sample = seconds_per_coordinate / burst_count
+    jobs = [
+        {
+            "l_path": l_path,
+            "first_coordinate": first,
+            "coordinates": coordinates[first : first + chunk_size],
+            "ssms": ssms,
+            "tank": tank,
+            "ball": ball,
+            "noise": noise,
+            "seconds_per_sample": seconds_per_sample,
+            "temperature": temperature,
+            "temperature_drift": temperature_drift,
+            "temperature_noise": temperature_noise,
+            "start_time": start_time,
+            "seed": seeds[idx + 1],
+        }
+        for idx, first in enumerate(range(0, coordinates.shape[0], chunk_size))
+    ]
+    if n_workers == 1:
+        n_samples = sum(map(_write_synthetic_chunk, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            n_samples = sum(executor.map(_write_synthetic_chunk, jobs))
+
+    # empty tank before and after, with the ball out of the saline
+    rng = np.random.default_rng(seeds[0])
+    duration = coordinates.shape[0] * seconds_per_coordinate
+    for preamble, elapsed in (("before", -60.0), ("after", duration + 60.0)):
+        _write_empty_tank(
+            l_path,
+            preamble,
+            ssms,
+            tank,
+            ball,
+            n_empty_tank,
+            start_time + timedelta(seconds=elapsed),
+            temperature + temperature_drift * elapsed / 3600,
+            noise,
+            rng,
+        )
+    print(f"Wrote {n_samples} synthetic samples to: {l_path}")
+    return coordinates
@@ -0,0 +1,219 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Union
+
+import numpy as np
+
+
+def get_trace_path(s_path: str) -> str:
+    """
+    Path of the timing trace, placed next to the 'info.json'.
+
+    Parameters
+    ----------
+    s_path : str
+        save path of the measurement data (".../data/")
+
+    Returns
+    -------
+    str
+        trace path
+    """
+    return s_path[:-5] + "trace.jsonl"
+
+
+class Tracer:
+    """
+    Records timing spans of the acquisition stages in a JSON-lines trace.
+
+    Every span carries its stage name, the unix start time and the duration in
+    milliseconds. Durations are measured with the monotonic clock, so they are not
+    affected by clock adjustments. Spans can be nested, every span also carries
+    its nesting depth and its self time, the duration without the nested spans.
+    Additional tags, like the coordinate index, are stored with the span.
+
+    Parameters
+    ----------
+    path : Union[None, str], optional
+        trace file, by default None (keep the spans in memory only)
+    """
+
+    def __init__(self, path: Union[None, str] = None):
+        self.path = path
+        self.spans = list()
+        self.tags = dict()
+        # summed durations of the nested spans of every open span
+        self._children = list()
+        self._file = open(path, "a") if path is not None else None
+
+    @contextmanager
+    def span(self, stage: str, **tags):
+        t_start = time.time()
+        t_mono = time.perf_counter()
+        self._children.append(0.0)
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - t_mono
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += duration
+            self.record(stage, t_start, duration, duration - children, **tags)
+
+    def record(
+        self,
+        stage: str,
+        t_start: float,
+        duration: float,
+        self_duration: Union[None, float] = None,
+        **tags,
+    ) -> None:
+        """
+        Record a span that has been measured elsewhere.
+
+        Parameters
+        ----------
+        stage : str
+            stage name
+        t_start : float
+            unix start time [s]
+        duration : float
+            duration [s]
+        self_duration : Union[None, float], optional
+            duration without the nested spans [s], by default `duration`
+        """
+        if self_duration is None:
+            self_duration = duration
+        span = {
+            "stage": stage,
+            "start_ms": round(t_start * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            "self_ms": round(self_duration * 1000, 3),
+            "depth": len(self._children),
+            **self.tags,
+            **tags,
+        }
+        self.spans.append(span)
+        if self._file is not None:
+            self._file.write(json.dumps(span) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class NullTracer(Tracer):
+    """
+    Tracer that records nothing.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+
+    @contextmanager
+    def span(self, stage: str, **tags):
+        yield
+
+    def record(
+        self,
+        stage: str,
+        t_start: float,
+        duration: float,
+        self_duration: Union[None, float] = None,
+        **tags,
+    ) -> None:
+        pass
+
+
+def read_trace(path: str) -> list:
+    """
+    Read all spans of a trace file.
+
+    Parameters
+    ----------
+    path : str
+        trace file
+
+    Returns
+    -------
+    list
+        spans
+    """
+    spans = list()
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def summarize_trace(path: str, print_report: bool = True) -> dict:
+    """
+    Break down the time of a measurement per stage and per coordinate.
+    The shares and the per coordinate durations use the self time of the spans,
+    so the time of nested spans, e.g. the measurement within a settle probe, is
+    counted once.
+
+    Parameters
+    ----------
+    path : str
+        trace file
+    print_report : bool, optional
+        print the summary, by default True
+
+    Returns
+    -------
+    dict
+        per stage statistics [ms] and per coordinate self times [ms]
+    """
+    spans = read_trace(path)
+    stage_durations = defaultdict(list)
+    stage_self = defaultdict(float)
+    coordinates = defaultdict(lambda: defaultdict(float))
+    for span in spans:
+        # traces without nesting information count every span as top level
+        self_ms = span.get("self_ms", span["duration_ms"])
+        stage_durations[span["stage"]].append(span["duration_ms"])
+        stage_self[span["stage"]] += self_ms
+        if "coordinate_idx" in span:
+            coordinates[span["coordinate_idx"]][span["stage"]] += self_ms
+
+    total = sum(stage_self.values())
+    stages = dict()
+    for stage, dur in stage_durations.items():
+        dur = np.array(dur)
+        stages[stage] = {
+            "count": int(dur.shape[0]),
+            "total_ms": float(np.sum(dur)),
+            "self_ms": stage_self[stage],
+            "mean_ms": float(np.mean(dur)),
+            "p50_ms": float(np.percentile(dur, 50)),
+            "p95_ms": float(np.percentile(dur, 95)),
+            "share": float(stage_self[stage] / total) if total > 0 else 0.0,
+        }
+    coordinates = {
+        idx: {**dict(stg), "total_ms": float(sum(stg.values()))}
+        for idx, stg in coordinates.items()
+    }
+
+    if print_report:
+        print(f"{'stage':<20}{'count':>8}{'mean ms':>12}{'p95 ms':>12}{'share':>8}")
+        for stage, st in sorted(stages.items(), key=lambda kv: -kv[1]["self_ms"]):
+            print(
+                f"{stage:<20}{st['count']:>8}{st['mean_ms']:>12.1f}"
+                f"{st['p95_ms']:>12.1f}{st['share']:>8.1%}"
+            )
+        if coordinates:
+            per_coordinate = np.array([c["total_ms"] for c in coordinates.values()])
+            print(
+                f"\n{len(coordinates)} coordinates, "
+                f"mean {np.mean(per_coordinate) / 1000:.2f} s, "
+                f"max {np.max(per_coordinate) / 1000:.2f} s per coordinate"
+            )
+    return {"stages": stages, "coordinates": coordinates}
@@ -30,6 +30,7 @@ paddings = ["same", "same", "same", "same"]
 latent_dim = 8
 
 
+@tf.keras.utils.register_keras_serializable(package="vae_model")
 class Sampling(Layer):
     def call(self, inputs):
         z_mean, z_log_var = inputs
@@ -39,6 +40,7 @@ class Sampling(Layer):
         return z_mean + tf.exp(0.5 * z_log_var) * epsilon
 
 
+@tf.keras.utils.register_keras_serializable(package="vae_model")
 class VAE(Model):
     def __init__(self, encoder, decoder, beta=1.0, **kwargs):
         super(VAE, self).__init__(**kwargs)
@@ -94,6 +96,12 @@ class VAE(Model):
         )
         return config
 
+    @classmethod
+    def from_config(cls, config):
+        config["encoder"] = tf.keras.utils.deserialize_keras_object(config["encoder"])
+        config["decoder"] = tf.keras.utils.deserialize_keras_object(config["decoder"])
+        return cls(**config)
+
 
 def encoder_model(
     input_shape=(32, 32, 32, 1),
@@ -1,7 +1,6 @@
 import matplotlib.pyplot as plt
 from .classes import TankProperties32x2, BallAnomaly, PyEIT3DMesh
 import numpy as np
-from sklearn.manifold import TSNE
 from typing import Union
 
 
@@ -201,6 +200,120 @@ def plot_rball(
     plt.show()
 
 
+def mesh_lattice(mesh: PyEIT3DMesh) -> tuple:
+    """
+    Recover the regular lattice of a mesh created by `create_mesh`.
+
+    Parameters
+    ----------
+    mesh : PyEIT3DMesh
+        3D point cloud dataclass
+
+    Returns
+    -------
+    tuple
+        lattice axes (x, y, z) and the lattice indices (ix, iy, iz) of every node
+    """
+    axes, indices = list(), list()
+    for nodes in (mesh.x_nodes, mesh.y_nodes, mesh.z_nodes):
+        axis, idx = np.unique(nodes, return_inverse=True)
+        axes.append(axis)
+        indices.append(idx.ravel())
+    return tuple(axes), tuple(indices)
+
+
+def mesh_surface_nodes(mesh: PyEIT3DMesh, node_mask: np.ndarray) -> np.ndarray:
+    """
+    Select the nodes of a masked region that have at least one of their six
+    lattice neighbours outside of the region.
+
+    Parameters
+    ----------
+    mesh : PyEIT3DMesh
+        3D point cloud dataclass
+    node_mask : np.ndarray
+        boolean mask of the region nodes
+
+    Returns
+    -------
+    np.ndarray
+        boolean mask of the surface nodes
+    """
+    axes, (ix, iy, iz) = mesh_lattice(mesh)
+    volume = np.zeros([axis.shape[0] + 2 for axis in axes], dtype=bool)
+    volume[ix[node_mask] + 1, iy[node_mask] + 1, iz[node_mask] + 1] = True
+    inner = volume[1:-1, 1:-1, 1:-1].copy()
+    for dim in range(3):
+        for shift in (0, 2):
+            sl = [slice(1, -1)] * 3
+            sl[dim] = slice(shift, volume.shape[dim] - 2 + shift)
+            inner &= volume[tuple(sl)]
+    return node_mask & ~inner[ix, iy, iz]
+
+
+def voxel_downsample(
+    points: np.ndarray, values: np.ndarray, voxel_size: float
+) -> tuple:
+    """
+    Replace all points inside a cubic voxel by their mean.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        point coordinates (n, 3)
+    values : np.ndarray
+        point values (n,)
+    voxel_size : float
+        edge length of the voxels
+
+    Returns
+    -------
+    tuple
+        mean points (m, 3) and mean values (m,) of the occupied voxels
+    """
+    cells = np.floor((points - np.min(points, axis=0)) / voxel_size).astype(np.int64)
+    n_cells = np.max(cells, axis=0) + 1
+    keys = (cells[:, 0] * n_cells[1] + cells[:, 1]) * n_cells[2] + cells[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    mean_points = np.stack(
+        [np.bincount(inverse, points[:, dim]) / counts for dim in range(3)], axis=1
+    )
+    return mean_points, np.bincount(inverse, values) / counts
+
+
+def budget_downsample(points: np.ndarray, values: np.ndarray, max_points: int) -> tuple:
+    """
+    Voxel downsampling with the smallest voxel size that keeps at most
+    `max_points` points.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        point coordinates (n, 3)
+    values : np.ndarray
+        point values (n,)
+    max_points : int
+        point budget
+
+    Returns
+    -------
+    tuple
+        downsampled points (m, 3) and values (m,)
+    """
+    if points.shape[0] <= max_points:
+        return points, values
+    if max_points < 1:
+        return points[:0], values[:0]
+    extent = np.ptp(points, axis=0)
+    volume = np.prod(np.maximum(extent, np.max(extent) * 1e-3))
+    voxel_size = (volume / max_points) ** (1 / 3)
+    while True:
+        ds_points, ds_values = voxel_downsample(points, values, voxel_size)
+        if ds_points.shape[0] <= max_points:
+            return ds_points, ds_values
+        voxel_size *= 1.25
+
+
 def plot_mesh(
     mesh: PyEIT3DMesh,
     tank: TankProperties32x2 = TankProperties32x2(),
@@ -209,7 +322,38 @@ def plot_mesh(
     elev: int = 10,
     azim: int = 30,
     show_tank_brdr: bool = True,
+    lod: bool = False,
+    max_points: int = 20000,
 ) -> None:
+    """
+    Scatter plot of the mesh nodes.
+
+    With `lod` the anomaly is drawn by its surface nodes only and the background
+    nodes are voxel downsampled, so at most `max_points` points are drawn. The
+    anomaly surface has priority, it is downsampled only if it alone exceeds the
+    budget.
+
+    Parameters
+    ----------
+    mesh : PyEIT3DMesh
+        3D point cloud dataclass
+    tank : TankProperties32x2, optional
+        tank properties [mm], by default TankProperties32x2()
+    obj_only : bool, optional
+        only plot the anomaly nodes, by default True
+    bg : int, optional
+        background permittivity, by default 1
+    elev : int, optional
+        elevation angle of plot, by default 10
+    azim : int, optional
+        azimut angle of plot, by default 30
+    show_tank_brdr : bool, optional
+        plot the tank border, by default True
+    lod : bool, optional
+        level of detail rendering, by default False
+    max_points : int, optional
+        point budget of the level of detail rendering, by default 20000
+    """
     fig = plt.figure(figsize=(6, 6))
     ax = fig.add_subplot(111, projection="3d")
     # phantom-tank border
@@ -223,7 +367,31 @@ def plot_mesh(
         ax.plot_surface(X, Y, Z, color="C7", alpha=0.2)
 
     # plot mesh
-    if obj_only:
+    if lod:
+        points = np.stack([mesh.x_nodes, mesh.y_nodes, mesh.z_nodes], axis=1)
+        obj_mask = mesh.perm_array > bg
+        surface = mesh_surface_nodes(mesh, obj_mask)
+        obj_points, obj_perm = budget_downsample(
+            points[surface], mesh.perm_array[surface], max_points
+        )
+        if obj_only:
+            ax.scatter(*obj_points.T, marker="o", s=25, alpha=1)
+        else:
+            bg_points, bg_perm = budget_downsample(
+                points[~obj_mask],
+                mesh.perm_array[~obj_mask],
+                max_points - obj_points.shape[0],
+            )
+            ax.scatter(
+                *np.concatenate([bg_points, obj_points]).T,
+                c=np.concatenate([bg_perm, obj_perm]),
+                vmin=np.min(mesh.perm_array),
+                vmax=np.max(mesh.perm_array),
+                marker="o",
+                s=25,
+                alpha=0.3,
+            )
+    elif obj_only:
         ax.scatter(
             mesh.x_nodes[np.where(mesh.perm_array > bg)],
             mesh.y_nodes[np.where(mesh.perm_array > bg)],
@@ -267,11 +435,186 @@ def plot_loss_history(history):
     plt.show()
 
 
+def _merge_rectangles(mask: np.ndarray) -> list:
+    """Greedy cover of a 2D boolean mask with rectangles (r0, c0, r1, c1)."""
+    mask = mask.copy()
+    rects = list()
+    for r in np.flatnonzero(np.any(mask, axis=1)):
+        for c in np.flatnonzero(mask[r]):
+            if not mask[r, c]:
+                continue
+            c1 = c + 1
+            while c1 < mask.shape[1] and mask[r, c1]:
+                c1 += 1
+            r1 = r + 1
+            while r1 < mask.shape[0] and np.all(mask[r1, c:c1]):
+                r1 += 1
+            mask[r:r1, c:c1] = False
+            rects.append((r, c, r1, c1))
+    return rects
+
+
+def voxel_faces(
+    voxelarray: np.ndarray, threshold: Union[None, float] = None
+) -> np.ndarray:
+    """
+    Merged-face surface of a voxel array. Only the faces between filled and empty
+    voxels are kept, and the coplanar faces of every slice are merged into
+    rectangles. Voxel (i, j, k) spans [i, i + 1] x [j, j + 1] x [k, k + 1] like
+    in `ax.voxels`.
+
+    Parameters
+    ----------
+    voxelarray : np.ndarray
+        voxel array (nx, ny, nz)
+    threshold : Union[None, float], optional
+        voxels above the threshold are filled, by default None for all non-zero
+        voxels like `ax.voxels`
+
+    Returns
+    -------
+    np.ndarray
+        quads (n_faces, 4, 3), counter-clockwise seen from outside
+    """
+    voxelarray = np.asarray(voxelarray)
+    if threshold is None:
+        filled = np.pad(voxelarray != 0, 1)
+    else:
+        filled = np.pad(voxelarray > threshold, 1)
+    quads = list()
+    for axis in range(3):
+        u_axis, v_axis = [dim for dim in range(3) if dim != axis]
+        for direction in (-1, 1):
+            exposed = filled & ~np.roll(filled, -direction, axis=axis)
+            exposed = exposed[1:-1, 1:-1, 1:-1]
+            for idx in np.flatnonzero(np.any(exposed, axis=(u_axis, v_axis))):
+                plane = idx + (direction > 0)
+                for u0, v0, u1, v1 in _merge_rectangles(exposed.take(idx, axis)):
+                    quad = np.zeros((4, 3))
+                    quad[:, axis] = plane
+                    corners = [(u0, v0), (u1, v0), (u1, v1), (u0, v1)]
+                    if direction * (1 if (v_axis - u_axis) % 3 == 1 else -1) < 0:
+                        corners = corners[::-1]
+                    quad[:, u_axis], quad[:, v_axis] = np.array(corners).T
+                    quads.append(quad)
+    return np.array(quads).reshape(-1, 4, 3)
+
+
+def voxel_isosurface(
+    voxelarray: np.ndarray, threshold: Union[None, float] = None
+) -> np.ndarray:
+    """
+    Marching cubes isosurface of a voxel array, needs `scikit-image`. The voxel
+    centers are placed at i + 0.5 like in `ax.voxels`.
+
+    Parameters
+    ----------
+    voxelarray : np.ndarray
+        voxel array (nx, ny, nz)
+    threshold : Union[None, float], optional
+        iso level, by default None for 0.5
+
+    Returns
+    -------
+    np.ndarray
+        triangles (n_faces, 3, 3)
+    """
+    try:
+        from skimage.measure import marching_cubes
+    except ImportError:
+        raise ImportError(
+            "The isosurface needs scikit-image, use method='faces' without it."
+        )
+    if threshold is None:
+        threshold = 0.5
+    volume = np.pad(np.asarray(voxelarray, dtype=float), 1)
+    if not np.any(volume > threshold):
+        return np.zeros((0, 3, 3))
+    verts, faces, _, _ = marching_cubes(volume, level=threshold)
+    return verts[faces] - 0.5
+
+
+def _shade(polygons: np.ndarray, color) -> np.ndarray:
+    """Face colors lit from the default `LightSource` direction of matplotlib."""
+    from matplotlib.colors import LightSource, to_rgba
+
+    normals = np.cross(polygons[:, 1] - polygons[:, 0], polygons[:, 2] - polygons[:, 0])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    light = LightSource(azdeg=225, altdeg=19.4712)
+    az, alt = np.radians(90 - light.azdeg), np.radians(light.altdeg)
+    direction = np.array(
+        [np.cos(az) * np.cos(alt), np.sin(az) * np.cos(alt), np.sin(alt)]
+    )
+    intensity = 0.3 + 0.7 * (normals @ direction + 1) / 2
+    rgba = np.tile(to_rgba(color), (polygons.shape[0], 1))
+    rgba[:, :3] *= intensity[:, None]
+    return rgba
+
+
+def draw_voxel_surface(
+    ax,
+    voxelarray: np.ndarray,
+    threshold: Union[None, float] = None,
+    method: str = "faces",
+    color="C0",
+    alpha: float = 1.0,
+):
+    """
+    Draw the surface of a voxel array as a single `Poly3DCollection`, a fast
+    replacement of `ax.voxels`.
+
+    Parameters
+    ----------
+    ax : Axes3D
+        3D axes
+    voxelarray : np.ndarray
+        voxel array (nx, ny, nz)
+    threshold : Union[None, float], optional
+        voxels above the threshold are filled, by default None for all non-zero
+        voxels like `ax.voxels`
+    method : str, optional
+        "faces" for merged voxel faces, "marching_cubes" for an isosurface,
+        by default "faces"
+    color : optional
+        face color, by default "C0"
+    alpha : float, optional
+        face transparency, by default 1.0
+
+    Returns
+    -------
+    Poly3DCollection
+        drawn surface
+    """
+    from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+    if method == "faces":
+        polygons = voxel_faces(voxelarray, threshold)
+    elif method == "marching_cubes":
+        polygons = voxel_isosurface(voxelarray, threshold)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    surface = Poly3DCollection(
+        polygons, facecolors=_shade(polygons, color), edgecolors="none", alpha=alpha
+    )
+    ax.add_collection3d(surface)
+    shape = np.shape(voxelarray)
+    ax.set_xlim([0, shape[0]])
+    ax.set_ylim([0, shape[1]])
+    ax.set_zlim([0, shape[2]])
+    return surface
+
+
 def plot_voxel(
-    voxelarray, elev=20, azim=10, save_img=False, s_name="images/voxels.png"
+    voxelarray,
+    elev=20,
+    azim=10,
+    save_img=False,
+    s_name="images/voxels.png",
+    threshold=None,
+    method="faces",
 ):
     ax = plt.figure(figsize=(6, 6)).add_subplot(projection="3d")
-    ax.voxels(voxelarray)
+    draw_voxel_surface(ax, voxelarray, threshold, method)
     ax.view_init(azim=azim, elev=elev)
     ax.set_xlabel("x")
     ax.set_ylabel("y")
@@ -282,7 +625,112 @@ def plot_voxel(
     plt.show()
 
 
+def _export_voxel_pairs(args: tuple) -> list:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    pairs, s_names, threshold, method, elev, azim, dpi = args
+    fig = Figure(figsize=(8, 4))
+    FigureCanvasAgg(fig)
+    for (gamma_true, gamma_pred), s_name in zip(pairs, s_names):
+        fig.clear()
+        for col, (gamma, title) in enumerate(
+            [(gamma_true, "True"), (gamma_pred, "Prediction")]
+        ):
+            ax = fig.add_subplot(1, 2, col + 1, projection="3d")
+            draw_voxel_surface(ax, gamma, threshold, method)
+            ax.view_init(azim=azim, elev=elev)
+            ax.set_title(title)
+            ax.set_xlabel("x")
+            ax.set_ylabel("y")
+            ax.set_zlabel("z")
+        fig.tight_layout()
+        fig.savefig(s_name, dpi=dpi)
+    return s_names
+
+
+def export_voxel_comparisons(
+    gamma_true: np.ndarray,
+    gamma_pred: np.ndarray,
+    s_path: str = "images/voxel_comparison/",
+    threshold: Union[None, float] = None,
+    method: str = "faces",
+    elev: int = 20,
+    azim: int = 10,
+    dpi: int = 150,
+    n_workers: Union[None, int] = None,
+    chunk_size: int = 16,
+) -> list:
+    """
+    Headless export of ground truth and prediction voxel pairs side by side,
+    rendered by a process pool.
+
+    Parameters
+    ----------
+    gamma_true : np.ndarray
+        ground truth voxels (n, nx, ny, nz)
+    gamma_pred : np.ndarray
+        predicted voxels (n, nx, ny, nz), a trailing channel axis is removed
+    s_path : str, optional
+        save directory, by default "images/voxel_comparison/"
+    threshold : Union[None, float], optional
+        voxels above the threshold are filled, by default None for all non-zero
+        voxels like `ax.voxels`
+    method : str, optional
+        "faces" or "marching_cubes", by default "faces"
+    elev : int, optional
+        elevation angle of plot, by default 20
+    azim : int, optional
+        azimut angle of plot, by default 10
+    dpi : int, optional
+        resolution of the images, by default 150
+    n_workers : Union[None, int], optional
+        number of processes, by default os.cpu_count()
+    chunk_size : int, optional
+        pairs per task, by default 16
+
+    Returns
+    -------
+    list
+        saved image paths
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    gamma_true = np.asarray(gamma_true).reshape(np.shape(gamma_true)[:4])
+    gamma_pred = np.asarray(gamma_pred).reshape(np.shape(gamma_true))
+    os.makedirs(s_path, exist_ok=True)
+    s_names = [
+        s_path + "voxel_{0:06d}.png".format(idx) for idx in range(len(gamma_true))
+    ]
+    chunks = [
+        (
+            list(
+                zip(
+                    gamma_true[idx : idx + chunk_size],
+                    gamma_pred[idx : idx + chunk_size],
+                )
+            ),
+            s_names[idx : idx + chunk_size],
+            threshold,
+            method,
+            elev,
+            azim,
+            dpi,
+        )
+        for idx in range(0, len(s_names), chunk_size)
+    ]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return [
+            name
+            for names in executor.map(_export_voxel_pairs, chunks)
+            for name in names
+        ]
+
+
 def plot_latent_space_with_tsne(latent_space):
+    from sklearn.manifold import TSNE
+
     tsne = TSNE(n_components=2, random_state=42)
     latent_space_2d = tsne.fit_transform(latent_space)
 
@@ -1,5 +1,6 @@
 import numpy as np
 import json
+from .profiling import profile_module
 
 
 def substitute_true_false(arr, true_value=1, false_value=0):
@@ -99,3 +100,19 @@ def read_json_file(file_path):
         print(f"Error decoding JSON in file {file_path}: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+
+
+def scale_intdomain_to_realworld(coordinate, hitbox, new_min=0, new_max=32, d=3):
+    y_s, x_s, z_s = coordinate
+    new_min += d
+    new_max -= d
+
+    y_r = (y_s - new_min) / (new_max - new_min) * (hitbox.y_max * 2) - hitbox.y_max
+    x_r = (x_s - new_min) / (new_max - new_min) * (hitbox.x_max * 2) - hitbox.x_max
+    z_r = (z_s - new_min) / (new_max - new_min) * (
+        hitbox.z_max - hitbox.z_min
+    ) + hitbox.z_min
+    return y_r, x_r, z_r
+
+
+profile_module(globals())
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from src.baseline import load_baseline
+from src.dataprocessing import load_run
+from src.retrain import (
+    build_mapper,
+    get_normalization,
+    load_mapper,
+    merge_moments,
+    retrain_mapper,
+)
+from src.synthetic import generate_measurement_directory
+from src.vae_model import vae_model
+from src.voxel_util import gen_voxel_ball_data
+
+
+def phi_of(l_path: str) -> np.ndarray:
+    run = load_run(l_path)
+    return (np.abs(run["potentials"]) - load_baseline(l_path)["mean"]).astype(
+        np.float32
+    )
+
+
+def test_base_mapper_cycle(tmp_path):
+    """Base mapper -> v1 -> v2, the normalization covers all samples."""
+    runs = [str(tmp_path / f"run_{idx}") + "/" for idx in range(3)]
+    for idx, l_path in enumerate(runs):
+        generate_measurement_directory(
+            l_path, x_pts=4, y_pts=4, z_pts=2, burst_count=2, seed=idx, n_workers=1
+        )
+    tf.random.set_seed(0)
+    vae = vae_model()
+    vae.compile(optimizer=tf.keras.optimizers.Adam())
+    vae.train_on_batch(gen_voxel_ball_data(4).astype(np.float32))
+    vae_path = str(tmp_path / "vae.keras")
+    vae.save(vae_path)
+
+    # base mapper of the notebook, adapted on the first run
+    phi_base = phi_of(runs[0])
+    base = build_mapper(phi_base.shape[1], 8)
+    base.layers[1].adapt(phi_base)
+    base_path = str(tmp_path / "base_mapper.keras")
+    base.save(base_path)
+
+    s_path = str(tmp_path / "mapper") + "/"
+    kwargs = {"vae_path": vae_path, "epochs": 1, "batch_size": 16}
+    retrain_mapper(
+        s_path, [runs[1]], base_mapper=base_path, base_runs=[runs[0]], **kwargs
+    )
+    record = retrain_mapper(s_path, runs, **kwargs)
+    assert record["version"] == 2
+    assert record["new_samples"] == {"run_2": phi_base.shape[0]}
+
+    count, mean, var = 0, None, None
+    for l_path in runs:
+        count, mean, var = merge_moments(count, mean, var, phi_of(l_path))
+    norm_count, norm_mean, norm_var = get_normalization(load_mapper(s_path))
+    assert norm_count == count
+    np.testing.assert_allclose(norm_mean, mean, rtol=1e-5, atol=1e-9)
+    np.testing.assert_allclose(norm_var, var, rtol=1e-5)
+    # no new samples, no new version
+    assert retrain_mapper(s_path, runs, **kwargs)["version"] == 2
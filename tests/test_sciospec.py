@@ -0,0 +1,204 @@
+import numpy as np
+import pytest
+from sciopy import (
+    del_hex_in_list,
+    reshape_full_message_in_bursts,
+    set_measurement_config_usb_hs,
+    split_bursts_in_frames,
+)
+
+from src.classes import BallAnomaly, TankProperties32x2
+from src.dataprocessing import get_frames_potential
+from src.sciospec import (
+    FRAME_DTYPE,
+    SciospecSupervisor,
+    StartStopMeasurement_raw_usb_hs,
+    check_bursts,
+    check_decoder_parity,
+    decode_raw_bursts,
+    frames_excitation_stages,
+)
+from src.simulator import (
+    SimulatedSciospec,
+    build_frame_bytes,
+    get_injection_pairs,
+    simulate_potential_matrix,
+)
+from src.synthetic import default_setup
+
+ACK = bytes([0x18, 0x01, 0x83, 0x18])
+HOLDUP = bytes([0x18, 0x11, 0x92, 0x18])
+FRAME = FRAME_DTYPE.itemsize
+
+
+def sciopy_decode(raw: bytes, ssms) -> tuple:
+    """Decoding path of `sciospec_measurement` and `get_frames_potential`."""
+    measurement_data = del_hex_in_list([hex(val) for val in raw])
+    split_measurement_data = reshape_full_message_in_bursts(measurement_data, ssms)
+    bursts = split_bursts_in_frames(split_measurement_data, ssms)
+    potentials = np.array([get_frames_potential(frm, ssms) for frm in bursts])
+    exc_stgs = np.array(
+        [
+            [frm.excitation_stgs for frm in burst[:: len(ssms.channel_group)]]
+            for burst in bursts
+        ]
+    )
+    return potentials, exc_stgs
+
+
+def raw_bursts(ssms, seed: int = 0) -> bytes:
+    """Acknowledge message followed by the frames of all bursts."""
+    rng = np.random.default_rng(seed)
+    ball = BallAnomaly(x=10, y=-20, z=60, d=40, perm=1, material="acryl-glass")
+    inj_pairs = get_injection_pairs(ssms)
+    raw = ACK
+    for burst in range(ssms.burst_count):
+        pot = simulate_potential_matrix(
+            ball, inj_pairs, TankProperties32x2(), noise=1e-7, rng=rng
+        )
+        for exc, pair in enumerate(inj_pairs):
+            for group in ssms.channel_group:
+                raw += build_frame_bytes(
+                    group, pair, burst, pot[exc, (group - 1) * 16 : group * 16]
+                )
+    return raw
+
+
+def insert(raw: bytes, positions: list, message: bytes = HOLDUP) -> bytes:
+    for pos in sorted(positions, reverse=True):
+        raw = raw[:pos] + message + raw[pos:]
+    return raw
+
+
+def assert_parity(raw: bytes, ssms) -> None:
+    potentials, exc_stgs = decode_raw_bursts(raw, ssms)
+    sciopy_potentials, sciopy_exc_stgs = sciopy_decode(raw, ssms)
+    np.testing.assert_array_equal(potentials, sciopy_potentials)
+    np.testing.assert_array_equal(exc_stgs, sciopy_exc_stgs)
+    assert check_decoder_parity(raw, ssms)
+
+
+@pytest.fixture
+def ssms():
+    return default_setup(3)
+
+
+def test_parity_plain(ssms):
+    assert_parity(raw_bursts(ssms), ssms)
+
+
+def test_parity_holdup_between_frames(ssms):
+    raw = raw_bursts(ssms)
+    # after the 1st, 100th and last frame
+    positions = [4 + FRAME, 4 + 100 * FRAME, len(raw)]
+    assert_parity(insert(raw, positions), ssms)
+
+
+def test_parity_holdup_within_frames(ssms):
+    raw = raw_bursts(ssms, seed=1)
+    positions = [4 + 7, 4 + 300 * FRAME + 60, 4 + 500 * FRAME + 139]
+    # the byte before a holdup must not start a holdup itself, see below
+    assert all(raw[pos - 1] != 0x18 for pos in positions)
+    assert_parity(insert(raw, positions), ssms)
+
+
+def test_parity_simulated_device(ssms):
+    device = SimulatedSciospec(
+        BallAnomaly(x=0, y=0, z=50, d=40, perm=1, material="acryl-glass"),
+        time_scale=1e-3,
+        seed=0,
+    )
+    set_measurement_config_usb_hs(device, ssms)
+    device._out.clear()
+    raw = StartStopMeasurement_raw_usb_hs(device)
+    assert len(raw) == 4 + ssms.burst_count * len(ssms.channel_group) * 64 * FRAME
+    assert_parity(bytes(raw), ssms)
+
+
+@pytest.mark.parametrize("prefix", [bytes([0x18]), bytes([0x18, 0x21])])
+def test_overlapping_holdup(ssms, prefix):
+    """
+    A holdup message that follows a byte sequence that starts a holdup itself,
+    e.g. 18 18 11 92 18, differs between both decoders.
+
+    sciopy's `length_correction` matches "18", "1", "92", "18" as substrings
+    byte by byte and does not re-check a byte after a mismatch: the second 18 is
+    taken as the "1" of the first 18, 11 then fails the "92" and the holdup is
+    kept, so the bursts are shifted by four bytes. `decode_raw_bursts` removes
+    every exact 4 byte window 18 x1 92 18 and decodes the frames unchanged.
+    """
+    ssms.burst_count = 1
+    clean = raw_bursts(ssms, seed=2)
+    # a frame that ends with the prefix instead of the end tag
+    pos = 4 + 10 * FRAME
+    raw = clean[: pos - len(prefix)] + prefix + HOLDUP + clean[pos:]
+    expected = clean[: pos - len(prefix)] + prefix + clean[pos:]
+
+    for decoded, target in zip(
+        decode_raw_bursts(raw, ssms), decode_raw_bursts(expected, ssms)
+    ):
+        np.testing.assert_array_equal(decoded, target)
+    # sciopy only removes the acknowledge message and keeps the holdup
+    sciopy_bursts = reshape_full_message_in_bursts(
+        del_hex_in_list([hex(val) for val in raw]), ssms
+    )
+    assert sciopy_bursts.shape[1] == len(raw) - len(ACK)
+
+
+def test_holdup_after_acknowledge(ssms):
+    """
+    The acknowledge message ends with 18, so a holdup right after it is the
+    overlapping case above: sciopy keeps it and fails to split the bursts.
+    """
+    raw = raw_bursts(ssms)
+    with pytest.raises(ValueError):
+        sciopy_decode(insert(raw, [4]), ssms)
+    for decoded, expected in zip(
+        decode_raw_bursts(insert(raw, [4]), ssms), decode_raw_bursts(raw, ssms)
+    ):
+        np.testing.assert_array_equal(decoded, expected)
+
+
+def test_missing_burst(ssms):
+    """
+    Without the last burst both decoders still return `burst_count` bursts, the
+    frames are spread over them.
+    """
+    ssms.burst_count = 2
+    raw = raw_bursts(ssms)
+    raw = raw[: len(ACK) + (len(raw) - len(ACK)) // 2]
+    sciopy_bursts = split_bursts_in_frames(
+        reshape_full_message_in_bursts(
+            del_hex_in_list([hex(val) for val in raw]), ssms
+        ),
+        ssms,
+    )
+    assert len(sciopy_bursts) == ssms.burst_count
+    with pytest.raises(ValueError):
+        check_bursts(frames_excitation_stages(sciopy_bursts, ssms), ssms, 2)
+    with pytest.raises(ValueError):
+        check_bursts(decode_raw_bursts(raw, ssms)[1], ssms, 2)
+
+
+class DroppingSciospec(SimulatedSciospec):
+    """Simulated device that loses the last burst of the first measurement."""
+
+    dropped = False
+
+    def _start_measurement(self) -> None:
+        super()._start_measurement()
+        if not self.dropped:
+            self.dropped = True
+            self._out.pop()
+
+
+def test_supervisor_retries_missing_burst(ssms):
+    ssms.burst_count = 2
+    device = DroppingSciospec(time_scale=1e-3, seed=0)
+    set_measurement_config_usb_hs(device, ssms)
+    device._out.clear()
+    supervisor = SciospecSupervisor(device, ssms, connect=lambda: device)
+    data = supervisor.measure()
+    assert data.shape == (2, 64 * len(ssms.channel_group))
+    assert supervisor.stats["failures"] == 1
+    assert supervisor.stats["recoveries"] == 1